@@ -0,0 +1,178 @@
+"""
+Admission control for the Degen Force backend.
+
+Requests are grouped into route classes, each with its own limit. A limit admits
+up to `max_concurrent` requests at a time; the next `max_queue` wait in FIFO
+order for at most `queue_timeout` seconds. Everything beyond that is answered
+immediately with 503 and Retry-After. When MongoDB slows down, the work waiting
+on the connection pool stays bounded: callers get a fast, retryable error instead
+of a timeout, and the worker keeps serving what it can.
+
+Fallback routes never wait. When their limit is full the request goes ahead
+without a slot, flagged with scope["state"]["admission_fallback"], so the
+handler can answer from cache instead of going to the database.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional
+
+
+class Overloaded(Exception):
+    """No slot within the limit's budget"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason  # "queue_full" or "deadline"
+
+
+class AdmissionLimit:
+    """Concurrency limit with a bounded FIFO wait queue and a queue-time deadline"""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters = deque()
+        self.stats = {"admitted": 0, "waited": 0, "shed_queue_full": 0, "shed_deadline": 0, "fallbacks": 0, "max_queue_ms": 0.0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def try_acquire(self) -> bool:
+        """Take a free slot without waiting (never ahead of requests already in line)"""
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.stats["admitted"] += 1
+            return True
+        return False
+
+    async def acquire(self) -> float:
+        """Take a slot, waiting in line if needed; returns the seconds spent queued
+        Raises Overloaded if the queue is full or the deadline passes first."""
+        if self.try_acquire():
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self.stats["shed_queue_full"] += 1
+            raise Overloaded("queue_full")
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.stats["waited"] += 1
+        started = time.perf_counter()
+        try:
+            done, _ = await asyncio.wait((future,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+        if not done:
+            self._abandon(future)
+            self.stats["shed_deadline"] += 1
+            raise Overloaded("deadline")
+        waited = time.perf_counter() - started
+        self.stats["max_queue_ms"] = round(max(self.stats["max_queue_ms"], waited * 1000), 3)
+        return waited
+
+    def _abandon(self, future: asyncio.Future):
+        if future.done() and not future.cancelled():
+            self.release()  # A slot was handed over just as we gave up: pass it on
+            return
+        future.cancel()
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+
+    def release(self):
+        """Free a slot, handing it straight to the next request in line"""
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self.stats["admitted"] += 1
+                return
+        self.active -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout_ms": self.queue_timeout * 1000,
+            **self.stats
+        }
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying one AdmissionLimit per route class
+    classify(path) names the class (None: never limited, e.g. health checks)."""
+
+    def __init__(
+        self,
+        app,
+        limits: Dict[str, AdmissionLimit],
+        classify: Callable[[str], Optional[str]],
+        fallback_routes: Iterable[str] = (),
+        retry_after: int = 1,
+        on_shed: Optional[Callable[[str, str], None]] = None,
+        on_admit: Optional[Callable[[str, float], None]] = None
+    ):
+        self.app = app
+        self.limits = limits
+        self.classify = classify
+        self.fallback_routes = set(fallback_routes)
+        self.retry_after = retry_after
+        self.on_shed = on_shed
+        self.on_admit = on_admit
+        self._body = json.dumps({"detail": "Server busy, please retry shortly"}).encode("utf-8")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = self.classify(scope["path"])
+        limit = self.limits.get(name) if name is not None else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        if name in self.fallback_routes:
+            if not limit.try_acquire():
+                limit.stats["fallbacks"] += 1
+                if self.on_shed is not None:
+                    self.on_shed(name, "fallback")
+                scope.setdefault("state", {})["admission_fallback"] = True
+                await self.app(scope, receive, send)
+                return
+            waited = 0.0
+        else:
+            try:
+                waited = await limit.acquire()
+            except Overloaded as e:
+                if self.on_shed is not None:
+                    self.on_shed(name, e.reason)
+                scope.setdefault("state", {})["admission_shed"] = name  # Never routed: outer middleware labels it by class
+                await self._reject(send)
+                return
+        if self.on_admit is not None:
+            self.on_admit(name, waited)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
+
+    async def _reject(self, send):
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(self._body)).encode("ascii")),
+                (b"retry-after", str(self.retry_after).encode("ascii"))
+            ]
+        })
+        await send({"type": "http.response.body", "body": self._body})
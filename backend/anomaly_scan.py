@@ -0,0 +1,283 @@
+"""
+Batch anomaly scan over the per-run history.
+
+Submissions are only checked against static caps on the request path. This job
+looks at the whole population instead: it pulls runs in columnar batches,
+computes per-run rates with NumPy (score per second, kills per second) and
+scores every run against its (difficulty, biome) cohort with a robust z-score:
+
+    z = 0.6745 * (x - median) / MAD
+
+Median and MAD barely move when a minority of runs is farmed, so those runs
+stand out instead of dragging the cohort's baseline up with them. Only the high
+tail counts. A wallet with at least `min_flagged_runs` outlying runs is written
+to the "review" table with status "flagged", and the leaderboard read hides
+flagged wallets. A reviewer clears a wallet by setting its status to "cleared";
+later scans update the evidence but never the status.
+
+Run it as a job (cron / CronJob), with the server's storage settings:
+
+    python anomaly_scan.py --days 7 [--dry-run]
+
+or through POST /api/admin/anomalies/scan.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from storage import DIFFICULTIES
+
+RUN_FIELDS = ("wallet_address", "score", "survival_time_seconds", "enemies_killed", "difficulty", "biome_reached")
+RATES = ("score_per_second", "kills_per_second")
+
+DEFAULT_Z_THRESHOLD = 6.0  # Far out: a false flag hides a real player
+DEFAULT_MIN_COHORT = 30  # Smaller (difficulty, biome) cohorts are not scored
+DEFAULT_MIN_FLAGGED_RUNS = 3  # One lucky run never flags a wallet
+MAD_SCALE = 0.6745  # Makes MAD comparable to a standard deviation for normal data
+REVIEW_WRITE_BATCH = 1000
+
+
+async def load_run_columns(storage, since: Optional[datetime] = None, batch_size: int = 50000) -> Dict[str, np.ndarray]:
+    """Read runs into NumPy columns
+    Wallets and biomes are dictionary-encoded to integer codes as batches arrive
+    (code -> value in the "wallets" / "biomes" lists)"""
+    wallet_codes: Dict[str, int] = {}
+    biome_codes: Dict[str, int] = {}
+    difficulty_codes = {difficulty: code for code, difficulty in enumerate(DIFFICULTIES)}
+    unknown_difficulty = len(DIFFICULTIES)
+    chunks = {field: [] for field in ("wallet", "score", "survival", "kills", "difficulty", "biome")}
+
+    async for batch in storage.scan_runs(RUN_FIELDS, since=since, batch_size=batch_size):
+        count = len(batch["wallet_address"])
+        chunks["wallet"].append(np.fromiter(
+            (wallet_codes.setdefault(wallet, len(wallet_codes)) for wallet in batch["wallet_address"]), np.int64, count
+        ))
+        chunks["biome"].append(np.fromiter(
+            (biome_codes.setdefault(biome or "", len(biome_codes)) for biome in batch["biome_reached"]), np.int64, count
+        ))
+        chunks["difficulty"].append(np.fromiter(
+            (difficulty_codes.get(difficulty, unknown_difficulty) for difficulty in batch["difficulty"]), np.int64, count
+        ))
+        chunks["score"].append(np.array(batch["score"], dtype=np.float64))
+        chunks["survival"].append(np.array(batch["survival_time_seconds"], dtype=np.float64))
+        chunks["kills"].append(np.array(batch["enemies_killed"], dtype=np.float64))
+
+    columns = {
+        field: np.concatenate(parts) if parts else np.empty(0, dtype=np.float64 if field in ("score", "survival", "kills") else np.int64)
+        for field, parts in chunks.items()
+    }
+    columns["wallets"] = list(wallet_codes)
+    columns["biomes"] = list(biome_codes)
+    return columns
+
+
+def group_slices(groups: np.ndarray, group_count: int):
+    """Row order that makes every group contiguous, plus each group's start and size"""
+    counts = np.bincount(groups, minlength=group_count)
+    # A stable sort of 16-bit keys is a radix sort: linear in the number of rows
+    keys = groups.astype(np.uint16) if group_count <= np.iinfo(np.uint16).max else groups
+    return np.argsort(keys, kind="stable"), np.cumsum(counts) - counts, counts
+
+
+def group_median(values: np.ndarray, slices) -> np.ndarray:
+    """Median of `values` per group (NaN for empty groups)
+    Linear-time selection within each group's slice instead of one sort over every row"""
+    order, starts, counts = slices
+    grouped = values[order]
+    medians = np.full(len(counts), np.nan)
+    for group in np.flatnonzero(counts):
+        medians[group] = np.median(grouped[starts[group]:starts[group] + counts[group]])
+    return medians
+
+
+def robust_z(values: np.ndarray, groups: np.ndarray, slices, min_cohort: int):
+    """Robust z-score of each value within its group, plus the group medians
+    Runs in cohorts smaller than min_cohort, or with no spread at all, get 0"""
+    counts = slices[2]
+    medians = group_median(values, slices)
+    deviations = np.abs(values - medians[groups])
+    mad = group_median(deviations, slices)
+    # MAD is 0 when over half of a cohort shares one value; fall back to the mean deviation
+    flat = mad == 0
+    if flat.any():
+        mean_deviation = np.bincount(groups, weights=deviations, minlength=len(counts)) / np.maximum(counts, 1)
+        # Modified z-score with MeanAD: z = (x - median) / (1.253314 * MeanAD)
+        mad[flat] = MAD_SCALE * 1.253314 * mean_deviation[flat]
+    usable = (counts >= min_cohort) & (mad > 0)
+    scale = np.where(usable, mad, 1.0)
+    z = MAD_SCALE * (values - medians[groups]) / scale[groups]
+    z[~usable[groups]] = 0.0
+    return z, medians
+
+
+def score_runs(columns: Dict[str, np.ndarray], z_threshold: float, min_cohort: int) -> Dict[str, np.ndarray]:
+    """Per-run rates, their cohort z-scores and the outlier mask"""
+    seconds = np.maximum(columns["survival"], 1.0)
+    rates = {
+        "score_per_second": columns["score"] / seconds,
+        "kills_per_second": columns["kills"] / seconds
+    }
+    biome_count = max(len(columns["biomes"]), 1)
+    groups = columns["difficulty"] * biome_count + columns["biome"]
+    slices = group_slices(groups, (len(DIFFICULTIES) + 1) * biome_count)  # Shared by every rate
+    scored = {"groups": groups}
+    outlier = np.zeros(len(groups), dtype=bool)
+    for rate, values in rates.items():
+        z, medians = robust_z(values, groups, slices, min_cohort)
+        scored[rate] = values
+        scored[f"{rate}_z"] = z
+        scored[f"{rate}_median"] = medians[groups]
+        outlier |= z > z_threshold
+    scored["outlier"] = outlier
+    return scored
+
+
+def flag_wallets(columns: Dict[str, np.ndarray], scored: Dict[str, np.ndarray], min_flagged_runs: int) -> List[dict]:
+    """Review entries for wallets with at least min_flagged_runs outlying runs"""
+    if min_flagged_runs < 1:
+        raise ValueError("min_flagged_runs must be at least 1")  # 0 would flag every wallet, outliers or not
+    wallets = columns["wallet"]
+    wallet_count = len(columns["wallets"])
+    runs = np.bincount(wallets, minlength=wallet_count)
+    flagged_runs = np.bincount(wallets, weights=scored["outlier"], minlength=wallet_count).astype(np.int64)
+    flagged = np.flatnonzero(flagged_runs >= min_flagged_runs)
+    if not len(flagged):
+        return []
+
+    # Each flagged wallet's most extreme run (by either rate), as evidence for the reviewer.
+    # That run is always one of its outliers, so only those rows are sorted.
+    z = np.maximum(scored["score_per_second_z"], scored["kills_per_second_z"])
+    is_flagged = np.zeros(wallet_count, dtype=bool)
+    is_flagged[flagged] = True
+    candidates = np.flatnonzero(scored["outlier"] & is_flagged[wallets])
+    order = candidates[np.lexsort((-z[candidates], wallets[candidates]))]
+    worst_runs = order[np.searchsorted(wallets[order], flagged)]
+
+    difficulties = (*DIFFICULTIES, "unknown")
+    entries = []
+    for wallet, worst in zip(flagged.tolist(), worst_runs.tolist()):
+        entries.append({
+            "wallet_address": columns["wallets"][wallet],
+            "runs": int(runs[wallet]),
+            "flagged_runs": int(flagged_runs[wallet]),
+            "max_z": round(float(z[worst]), 2),
+            "worst_run": {
+                "difficulty": difficulties[columns["difficulty"][worst]],
+                "biome_reached": columns["biomes"][columns["biome"][worst]],
+                "score": int(columns["score"][worst]),
+                "survival_time_seconds": int(columns["survival"][worst]),
+                "enemies_killed": int(columns["kills"][worst]),
+                **{
+                    field: round(float(scored[field][worst]), 3)
+                    for rate in RATES for field in (rate, f"{rate}_median")
+                }
+            }
+        })
+    return entries
+
+
+async def write_review(storage, entries: List[dict], now: datetime):
+    """Upsert flagged wallets into the review table; an existing status is never overwritten"""
+    for start in range(0, len(entries), REVIEW_WRITE_BATCH):
+        ops = [
+            ({"wallet_address": entry["wallet_address"]}, {
+                "$set": {**entry, "last_flagged_at": now},
+                "$setOnInsert": {"status": "flagged", "first_flagged_at": now}
+            })
+            for entry in entries[start:start + REVIEW_WRITE_BATCH]
+        ]
+        _, errors = await storage.bulk_upsert("review", ops)
+        if errors:
+            raise next(iter(errors.values()))
+
+
+async def load_flagged_wallets(storage) -> Set[str]:
+    """Wallets currently flagged (not cleared) in the review table"""
+    return {
+        doc["wallet_address"]
+        async for doc in storage.scan("review", {"_id": 0, "wallet_address": 1, "status": 1})
+        if doc.get("status") == "flagged"
+    }
+
+
+async def run_scan(
+    storage,
+    days: Optional[float] = 7,
+    z_threshold: float = DEFAULT_Z_THRESHOLD,
+    min_cohort: int = DEFAULT_MIN_COHORT,
+    min_flagged_runs: int = DEFAULT_MIN_FLAGGED_RUNS,
+    batch_size: int = 50000,
+    dry_run: bool = False
+) -> dict:
+    """Scan runs from the last `days` days (None: all retained runs) and record flagged wallets
+    Returns a summary with the flagged entries and per-phase timings"""
+    now = datetime.utcnow()
+    since = now - timedelta(days=days) if days else None
+    started = time.perf_counter()
+    columns = await load_run_columns(storage, since, batch_size)
+    loaded = time.perf_counter()
+    # The NumPy passes release the GIL for most of their work; keep them off the event loop
+    scored = await asyncio.to_thread(score_runs, columns, z_threshold, min_cohort)
+    entries = await asyncio.to_thread(flag_wallets, columns, scored, min_flagged_runs)
+    computed = time.perf_counter()
+    if entries and not dry_run:
+        await write_review(storage, entries, now)
+    finished = time.perf_counter()
+    return {
+        "runs": int(len(columns["wallet"])),
+        "wallets": len(columns["wallets"]),
+        "outlier_runs": int(scored["outlier"].sum()),
+        "flagged_wallets": len(entries),
+        "flagged": entries,
+        "since": since,
+        "dry_run": dry_run,
+        "timings_ms": {
+            "load": round((loaded - started) * 1000, 3),
+            "compute": round((computed - loaded) * 1000, 3),
+            "write": round((finished - computed) * 1000, 3)
+        }
+    }
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from storage import create_storage, json_default
+
+    parser = argparse.ArgumentParser(description="Flag wallets with statistically implausible runs")
+    parser.add_argument("--days", type=float, default=7, help="scan runs from the last N days (0: all retained runs)")
+    parser.add_argument("--z-threshold", type=float, default=DEFAULT_Z_THRESHOLD)
+    parser.add_argument("--min-cohort", type=int, default=DEFAULT_MIN_COHORT)
+    parser.add_argument("--min-flagged-runs", type=int, default=DEFAULT_MIN_FLAGGED_RUNS)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--dry-run", action="store_true", help="report without writing to the review table")
+    args = parser.parse_args()
+    if args.min_flagged_runs < 1:
+        parser.error("--min-flagged-runs must be at least 1")
+
+    engine = os.environ.get("STORAGE_ENGINE", "mongo")
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017")) if engine == "mongo" else None
+    storage = create_storage(
+        engine,
+        db=client[os.environ.get("DB_NAME", "degen_force")] if client else None,
+        sqlite_path=os.environ.get("SQLITE_PATH", "leaderboard.db"),
+        runs_retention=timedelta(days=int(os.environ.get("RUNS_RETENTION_DAYS", "90")))
+    )
+    try:
+        await storage.setup()
+        summary = await run_scan(
+            storage, args.days or None, args.z_threshold, args.min_cohort, args.min_flagged_runs,
+            args.batch_size, args.dry_run
+        )
+    finally:
+        await storage.close()
+    print(json.dumps(summary, default=json_default, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,302 @@
+"""
+Cross-worker coherence for multi-process deployments (uvicorn/gunicorn --workers N).
+
+Workers on one host talk to a small broker over a Unix domain socket. The first
+worker to take the lock file hosts the broker inside its own event loop; the
+others connect as clients, and one of them takes over if the host exits.
+
+The broker:
+- owns the rate-limit counters, so a limit holds across all workers instead of
+  being multiplied by the worker count
+- keeps recently built snapshots (DB-backed views) so one worker per TTL queries
+- relays events (applied score updates, season switches) to every other worker
+
+Messages are newline-delimited JSON. If the broker is unreachable, callers get
+None back and fall back to their local state until the connection is restored.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from storage import json_default, json_object_hook
+
+logger = logging.getLogger("degen_force.coherence")
+
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024  # A full 1000-row snapshot is ~300KB
+MAX_CLIENT_BUFFER_BYTES = 8 * 1024 * 1024  # Drop (and resync) a worker that stops reading
+
+
+def encode_message(message: dict) -> bytes:
+    return json.dumps(message, default=json_default, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def decode_message(line: bytes) -> dict:
+    return json.loads(line, object_hook=json_object_hook)
+
+
+class SharedStateBroker:
+    """Host-wide state, served by whichever worker holds the lock"""
+
+    def __init__(self, limiters: dict, deliver: Callable[[dict], None]):
+        self.limiters = limiters  # name -> limiter with .hit(key)
+        self.deliver = deliver  # Hands events from other workers to the hosting worker
+        self.snapshots: Dict[str, tuple] = {}  # key -> (built_at, rows)
+        self.connections = set()
+        self.stats = {"hits": 0, "events_relayed": 0, "snapshot_hits": 0, "snapshot_misses": 0, "dropped_clients": 0}
+
+    def hit(self, name: str, key: str) -> bool:
+        limiter = self.limiters.get(name)
+        self.stats["hits"] += 1
+        return True if limiter is None else limiter.hit(key)
+
+    def get_snapshot(self, key: str, max_age: float):
+        entry = self.snapshots.get(key)
+        if entry is None or time.time() - entry[0] >= max_age:
+            self.stats["snapshot_misses"] += 1
+            return None
+        self.stats["snapshot_hits"] += 1
+        return entry[1]
+
+    def put_snapshot(self, key: str, rows):
+        self.snapshots[key] = (time.time(), rows)
+
+    def broadcast(self, event: dict, sender=None):
+        """Send an event to every worker except the one it came from (sender None: the host)"""
+        if event.get("type") == "season":
+            self.snapshots.clear()
+        line = encode_message({"event": event})
+        for writer in list(self.connections):
+            if writer is sender:
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER_BYTES:
+                self.stats["dropped_clients"] += 1
+                self.connections.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+        if sender is not None:
+            self.deliver(event)
+        self.stats["events_relayed"] += 1
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = decode_message(line)
+                op = message.get("op")
+                if op == "hit":
+                    result = self.hit(message["limiter"], message["key"])
+                elif op == "get_snapshot":
+                    result = self.get_snapshot(message["key"], message["max_age"])
+                elif op == "put_snapshot":
+                    self.put_snapshot(message["key"], message["rows"])
+                    continue
+                elif op == "publish":
+                    self.broadcast(message["event"], sender=writer)
+                    continue
+                else:
+                    continue
+                writer.write(encode_message({"id": message["id"], "result": result}))
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+
+class SharedState:
+    """A worker's handle on the host-wide broker (hosting it, or connected to it)"""
+
+    def __init__(
+        self,
+        path: str,
+        limiters: dict,
+        on_event: Callable[[dict], Awaitable[None]],
+        on_resync: Optional[Callable[[], Awaitable[None]]] = None,
+        timeout: float = 0.25
+    ):
+        self.path = path
+        self.limiters = limiters
+        self.on_event = on_event  # Applies another worker's event locally
+        self.on_resync = on_resync  # Rebuilds local state after events may have been missed
+        self.timeout = timeout
+        self.broker: Optional[SharedStateBroker] = None
+        self._server = None
+        self._lock_fd = None
+        self._reader = None
+        self._writer = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._tasks = set()
+        self._closing = False
+        self.stats = {"requests": 0, "fallbacks": 0, "events_received": 0, "events_published": 0, "reconnects": 0}
+
+    @property
+    def role(self) -> str:
+        if self.broker is not None:
+            return "broker"
+        return "client" if self._writer is not None else "disconnected"
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def start(self):
+        self._spawn(self._consume_events())
+        await self._connect_or_host()
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd  # Held for the life of the process; released by the OS if it dies
+        return True
+
+    async def _connect_or_host(self):
+        while not self._closing:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_MESSAGE_BYTES)
+                self._reader, self._writer = reader, writer
+                self._spawn(self._read_loop())
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                pass
+            if self._try_lock():
+                if os.path.exists(self.path):
+                    os.unlink(self.path)  # Left behind by a host that exited
+                self.broker = SharedStateBroker(self.limiters, self._events.put_nowait)
+                self._server = await asyncio.start_unix_server(self.broker.handle, path=self.path, limit=MAX_MESSAGE_BYTES)
+                os.chmod(self.path, 0o600)
+                return
+            # Another worker holds the lock and is about to listen
+            await asyncio.sleep(0.05 + random.random() * 0.05)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                message = decode_message(line)
+                if "event" in message:
+                    self._events.put_nowait(message["event"])
+                    continue
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message.get("result"))
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writer = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_result(None)
+            self._pending.clear()
+            if not self._closing:
+                self._spawn(self._reconnect())
+
+    async def _reconnect(self):
+        await self._connect_or_host()
+        if self._closing:
+            return
+        self.stats["reconnects"] += 1
+        if self.on_resync is not None:
+            await self.on_resync()
+
+    async def _consume_events(self):
+        # One at a time and in order, so updates for the same wallet never interleave
+        while True:
+            event = await self._events.get()
+            self.stats["events_received"] += 1
+            try:
+                await self.on_event(event)
+            except Exception as e:
+                logger.warning("Failed to apply shared event %s", event.get("type"), exc_info=e)
+
+    def _send(self, message: dict) -> bool:
+        if self._writer is None:
+            self.stats["fallbacks"] += 1
+            return False
+        self._writer.write(encode_message(message))
+        return True
+
+    async def _request(self, op: str, **fields):
+        """Round trip to the broker; None if it is unreachable or too slow"""
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.stats["requests"] += 1
+        if not self._send({"id": request_id, "op": op, **fields}):
+            self._pending.pop(request_id, None)
+            return None
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(request_id, None)
+            self.stats["fallbacks"] += 1
+            return None
+
+    async def rate_limit_hit(self, name: str, key: str) -> Optional[bool]:
+        """Count a hit on the host-wide limiter; None if the broker is unavailable"""
+        if self.broker is not None:
+            return self.broker.hit(name, key)
+        return await self._request("hit", limiter=name, key=key)
+
+    async def get_snapshot(self, key: str, max_age: float):
+        """Rows another worker built less than max_age seconds ago, or None"""
+        if self.broker is not None:
+            return self.broker.get_snapshot(key, max_age)
+        return await self._request("get_snapshot", key=key, max_age=max_age)
+
+    def put_snapshot(self, key: str, rows):
+        if self.broker is not None:
+            self.broker.put_snapshot(key, rows)
+        else:
+            self._send({"op": "put_snapshot", "key": key, "rows": rows})
+
+    def publish(self, event: dict):
+        """Send an event to every other worker (fire and forget)"""
+        self.stats["events_published"] += 1
+        if self.broker is not None:
+            self.broker.broadcast(event)
+        else:
+            self._send({"op": "publish", "event": event})
+
+    def snapshot(self) -> dict:
+        stats = {"enabled": True, "role": self.role, "socket": self.path, **self.stats}
+        if self.broker is not None:
+            stats["workers_connected"] = len(self.broker.connections)
+            stats["broker"] = dict(self.broker.stats)
+        return stats
+
+    async def close(self):
+        self._closing = True
+        if self._writer is not None:
+            self._writer.close()
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self.broker.connections):
+                writer.close()
+            await asyncio.sleep(0)  # Let connection handlers see the close and finish
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        for task in list(self._tasks):
+            task.cancel()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
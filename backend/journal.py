@@ -0,0 +1,292 @@
+"""
+Local write-ahead journal for submissions the store could not take.
+
+When the database is unreachable, the submit endpoints append a submission's
+write ops to an append-only file on local disk and acknowledge it as queued.
+Appends are group-committed: everything appended within one fsync interval is
+written and fsync'ed together, so a burst of submissions costs one fsync, and
+no submission is acknowledged before it is on disk.
+
+The journal is a directory of segment files named
+journal-<created ns>-<pid>.log, one record per JSON line (datetimes encoded
+like the SQLite engine's documents). Appends go to the worker's open segment.
+replay() seals it and drains sealed segments oldest first, deleting each one
+once every record in it was applied. A torn line left by a crash mid-append is
+skipped. Segments of workers that are gone are claimed by the next worker to
+start, so a restart never strands queued submissions.
+
+Each replayed record carries "op_id": {"s": segment created ns, "n": line
+number}. A claim keeps the created ns and lines are never rewritten, so a record
+keeps its op id across restarts, and a store can skip ops at or below the last
+one of the segment it applied (see storage.bulk_upsert_once). A record of a
+live write that failed with its outcome unknown keeps that write's own op id
+instead, so it is skipped if the write did land.
+
+CircuitBreaker tracks whether the store is reachable. After
+`failure_threshold` consecutive failures, callers stop trying it, and a probe
+is due every `reset_timeout` seconds until one succeeds.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from storage import json_default, json_object_hook
+
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".log"
+
+
+def _parse_name(name: str):
+    """(created ns, pid) of a segment file name; ValueError if it isn't one"""
+    if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+        raise ValueError(name)
+    created_ns, pid = (int(part) for part in name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)].split("-"))
+    return created_ns, pid
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SubmissionJournal:
+    """Append-only, fsync-batched journal of pending write records"""
+
+    def __init__(self, directory: str, fsync_interval_ms: float):
+        self.directory = directory
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.pid = os.getpid()
+        self._file = None
+        self._open_path: Optional[str] = None
+        self._open_records = 0
+        self._sealed: List[dict] = []  # {"path", "records", "replayed"}, oldest first
+        self._pending = []  # (encoded lines, record count, future) waiting for the next fsync
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self._replay_lock = asyncio.Lock()
+        self.stats = {
+            "appended": 0,
+            "replayed": 0,
+            "fsyncs": 0,
+            "write_errors": 0,
+            "corrupt_records": 0,
+            "segments_claimed": 0,
+            "last_fsync_ms": 0.0,
+            "max_fsync_ms": 0.0
+        }
+
+    @property
+    def depth(self) -> int:
+        """Records journaled and not yet replayed"""
+        return self._open_records + sum(segment["records"] - segment["replayed"] for segment in self._sealed)
+
+    async def open(self) -> int:
+        """Create the directory, claim segments left by exited workers and count their records
+        Returns the number of records found"""
+        self._sealed = await asyncio.to_thread(self._load_segments)
+        return self.depth
+
+    def _segment_path(self, created_ns: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{created_ns:020d}-{self.pid}{SEGMENT_SUFFIX}")
+
+    def _load_segments(self) -> List[dict]:
+        os.makedirs(self.directory, exist_ok=True)
+        segments = []
+        for name in sorted(os.listdir(self.directory)):
+            try:
+                created_ns, pid = _parse_name(name)
+            except ValueError:
+                continue
+            path = os.path.join(self.directory, name)
+            if pid != self.pid:
+                if _process_alive(pid):
+                    continue  # Another live worker's journal
+                claimed = self._segment_path(created_ns)
+                try:
+                    os.rename(path, claimed)  # Atomic: exactly one starting worker wins
+                except FileNotFoundError:
+                    continue
+                self.stats["segments_claimed"] += 1
+                path = claimed
+            records, corrupt = self._read(path)
+            self.stats["corrupt_records"] += corrupt
+            segments.append({"path": path, "records": len(records), "replayed": 0})
+        segments.sort(key=lambda segment: os.path.basename(segment["path"]))
+        return segments
+
+    async def append(self, records: List[dict]):
+        """Append records; returns once they are fsync'ed (raises OSError if the write failed)"""
+        data = b"".join(
+            json.dumps(record, default=json_default, separators=(",", ":")).encode("utf-8") + b"\n"
+            for record in records
+        )
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((data, len(records), future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after(self.fsync_interval))
+        await future
+
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        async with self._write_lock:
+            self._flush_task = None
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, b"".join(data for data, _, _ in batch))
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                await self._close_segment()  # Never append after a possibly torn write
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            count = sum(records for _, records, _ in batch)
+            self._open_records += count
+            self.stats["appended"] += count
+            self.stats["fsyncs"] += 1
+            self.stats["last_fsync_ms"] = round(elapsed_ms, 3)
+            self.stats["max_fsync_ms"] = round(max(self.stats["max_fsync_ms"], elapsed_ms), 3)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    def _write(self, data: bytes):
+        if self._file is None:
+            path = self._segment_path(time.time_ns())
+            self._file = open(path, "ab")
+            self._open_path = path
+            # Make the new directory entry durable too
+            directory = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def _close_segment(self):
+        """Seal the open segment (call with the write lock held)"""
+        if self._file is None:
+            return
+        file, path, records = self._file, self._open_path, self._open_records
+        self._file, self._open_path, self._open_records = None, None, 0
+        await asyncio.to_thread(file.close)
+        self._sealed.append({"path": path, "records": records, "replayed": 0})
+
+    def _read(self, path: str):
+        records, corrupt = [], 0
+        source, _ = _parse_name(os.path.basename(path))
+        with open(path, "rb") as file:
+            for number, line in enumerate(file):
+                try:
+                    record = json.loads(line, object_hook=json_object_hook)
+                except ValueError:
+                    corrupt += 1  # Torn write from a crash mid-append
+                    continue
+                record.setdefault("op_id", {"s": source, "n": number})
+                records.append(record)
+        return records, corrupt
+
+    async def replay(self, apply: Callable[[List[dict]], Awaitable[None]], batch_size: int) -> int:
+        """Drain sealed segments (the open one is sealed first) through `apply`, oldest first
+        Records reach apply in op_id order. If apply raises, replay stops and the next call resumes at the failed batch.
+        Returns the number of records replayed."""
+        async with self._write_lock:
+            await self._close_segment()
+        replayed = 0
+        async with self._replay_lock:
+            while self._sealed:
+                segment = self._sealed[0]
+                records, corrupt = await asyncio.to_thread(self._read, segment["path"])
+                if len(records) != segment["records"]:
+                    self.stats["corrupt_records"] += corrupt
+                    segment["records"] = len(records)
+                for offset in range(segment["replayed"], len(records), batch_size):
+                    batch = records[offset:offset + batch_size]
+                    await apply(batch)
+                    segment["replayed"] = offset + len(batch)
+                    self.stats["replayed"] += len(batch)
+                    replayed += len(batch)
+                await asyncio.to_thread(os.remove, segment["path"])
+                self._sealed.pop(0)
+        return replayed
+
+    async def close(self):
+        """Write anything still pending and close the open segment"""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._flush_after(0)
+        async with self._write_lock:
+            await self._close_segment()
+
+    def snapshot(self) -> dict:
+        return {
+            "depth": self.depth,
+            "segments": len(self._sealed) + (1 if self._file is not None else 0),
+            "directory": self.directory,
+            "fsync_interval_ms": self.fsync_interval * 1000,
+            **self.stats
+        }
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for the store
+    Closed: calls go through. Open: callers skip the store; probe_due() turns true
+    every `reset_timeout` seconds, and the first recorded success closes it."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.stats = {"opened": 0, "closed": 0}
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def probe_due(self) -> bool:
+        return self.opened_at is None or time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True if this opened the breaker"""
+        self.failures += 1
+        if self.opened_at is not None:
+            self.opened_at = time.monotonic()  # Failed probe: wait another reset_timeout
+            return False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.stats["opened"] += 1
+            return True
+        return False
+
+    def record_success(self) -> bool:
+        """Count a success; returns True if this closed the breaker"""
+        self.failures = 0
+        if self.opened_at is None:
+            return False
+        self.opened_at = None
+        self.stats["closed"] += 1
+        return True
+
+    def snapshot(self) -> dict:
+        return {
+            "state": "open" if self.is_open else "closed",
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+            "open_for": round(time.monotonic() - self.opened_at, 3) if self.opened_at is not None else 0.0,
+            **self.stats
+        }
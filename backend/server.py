@@ -2,18 +2,118 @@
 FastAPI backend for Phaser game with leaderboard support.
 Optimized for high traffic and concurrent users.
 """
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, Field, validator
-from typing import Optional, Dict
+from pymongo import monitoring
+from pymongo.errors import DuplicateKeyError
+from pydantic import BaseModel, Field, ValidationError, validator
+from typing import Any, Dict, List, Optional
 from datetime import datetime, timedelta
 import os
 import asyncio
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager, contextmanager
+import base64
+import bisect
+import csv
+import io
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
 import time
+import uuid
+import zlib
 
-app = FastAPI(title="Degen Force Game API")
+try:
+    import brotli
+except ImportError:  # Optional: leaderboard bodies are then pre-compressed with gzip only
+    brotli = None
+
+from admission import AdmissionLimit, AdmissionMiddleware
+from anomaly_scan import load_flagged_wallets, run_scan
+from coherence import SharedState
+from journal import CircuitBreaker, SubmissionJournal
+from metrics import Registry
+from storage import (
+    SCHEMA_VERSION, SeasonArchived, apply_update_to_doc, create_storage, get_field, mark_applied_op, new_op_id, season_stats_id,
+    season_window_prefix, set_field
+)
+from structured_logging import log_event, logging_stats, setup_logging
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Worker lifecycle: startup before the first request is accepted, shutdown after the last"""
+    await startup_event()
+    try:
+        yield
+    finally:
+        await shutdown_event()
+
+app = FastAPI(title="Degen Force Game API", lifespan=lifespan)
+
+# Structured logging: JSON lines written by a background thread, never on the request path
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1"))  # fraction of per-request success lines kept
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+logger = setup_logging(LOG_LEVEL, LOG_SAMPLE_RATE, LOG_QUEUE_SIZE)
+
+# Admission control: per-route concurrency limits with a bounded, deadline-limited wait queue.
+# Over budget, requests get an immediate 503 + Retry-After instead of piling up on the
+# MongoDB pool; leaderboard reads never queue and fall back to the last cached snapshot
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_MS", "1000"))
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "1"))  # seconds
+ADMISSION_LIMITS = {
+    # route: (max concurrent, max queued)
+    "submit": (int(os.environ.get("ADMISSION_SUBMIT_CONCURRENCY", "32")), int(os.environ.get("ADMISSION_SUBMIT_QUEUE", "256"))),
+    "leaderboard": (int(os.environ.get("ADMISSION_LEADERBOARD_CONCURRENCY", "64")), 0),
+    "player": (int(os.environ.get("ADMISSION_PLAYER_CONCURRENCY", "16")), int(os.environ.get("ADMISSION_PLAYER_QUEUE", "64"))),
+    "admin": (int(os.environ.get("ADMISSION_ADMIN_CONCURRENCY", "4")), int(os.environ.get("ADMISSION_ADMIN_QUEUE", "8"))),
+    "default": (int(os.environ.get("ADMISSION_DEFAULT_CONCURRENCY", "16")), int(os.environ.get("ADMISSION_DEFAULT_QUEUE", "64"))),
+}
+ADMISSION_FALLBACK_ROUTES = ("leaderboard",)
+
+admission_limits = {
+    name: AdmissionLimit(name, concurrency, queue, ADMISSION_QUEUE_TIMEOUT_MS / 1000)
+    for name, (concurrency, queue) in ADMISSION_LIMITS.items()
+}
+
+def admission_route(path: str) -> Optional[str]:
+    """Admission limit for a request path (None: never limited, e.g. health checks and /metrics)"""
+    if not path.startswith("/api/") or path == "/api/health":
+        return None
+    if path.startswith("/api/leaderboard/submit"):
+        return "submit"
+    if path == "/api/leaderboard":
+        return "leaderboard"
+    if path.startswith("/api/player/"):
+        return "player"
+    if path.startswith("/api/admin/"):
+        return "admin"
+    return "default"
+
+def record_admission_shed(route: str, reason: str):
+    admission_shed.labels(route, reason).inc()
+
+def record_admission_wait(route: str, waited: float):
+    admission_queue_wait.labels(route).observe(waited)
+
+# Added before CORS so it runs inside it: shed responses still carry CORS headers
+if ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        limits=admission_limits,
+        classify=admission_route,
+        fallback_routes=ADMISSION_FALLBACK_ROUTES,
+        retry_after=ADMISSION_RETRY_AFTER,
+        on_shed=record_admission_shed,
+        on_admit=record_admission_wait,
+    )
 
 # CORS middleware
 app.add_middleware(
@@ -24,6 +124,144 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics (Prometheus text format at /metrics)
+ENABLE_METRICS = os.environ.get("ENABLE_METRICS", "true").lower() == "true"
+EVENT_LOOP_LAG_INTERVAL = 0.5  # seconds between event-loop lag probes
+
+metrics_registry = Registry()
+http_request_duration = metrics_registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and status", ("method", "route", "status")
+)
+mongo_operation_duration = metrics_registry.histogram(
+    "mongo_operation_duration_seconds", "MongoDB command latency by command", ("operation", "outcome")
+)
+mongo_pool_checkout_wait = metrics_registry.histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled MongoDB connection"
+)
+event_loop_lag = metrics_registry.histogram(
+    "event_loop_lag_seconds", "Delay between when a timer was due and when the event loop ran it",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+leaderboard_cache_events = metrics_registry.counter(
+    "leaderboard_cache_events_total", "Leaderboard snapshot cache lookups by outcome", ("view", "event")
+)
+leaderboard_cache_invalidations = metrics_registry.counter(
+    "leaderboard_cache_invalidations_total", "Full leaderboard cache invalidations"
+)
+rate_limit_events = metrics_registry.counter(
+    "rate_limit_events_total", "Rate limiter decisions and key-table evictions", ("scope", "event")
+)
+rate_limit_keys = metrics_registry.gauge("rate_limit_keys", "Keys tracked by the rate limiter", ("scope",))
+write_behind_stats = metrics_registry.gauge("write_behind", "Write-behind batcher statistics", ("batcher", "stat"))
+rank_index_size = metrics_registry.gauge("rank_index_wallets", "Wallets in the in-memory rank index")
+player_cache_events = metrics_registry.counter(
+    "player_cache_events_total", "Player profile cache lookups, evictions and invalidations", ("event",)
+)
+leaderboard_response_bytes = metrics_registry.counter(
+    "leaderboard_response_bytes_total", "Leaderboard body bytes sent and saved by content encoding", ("encoding", "kind")
+)
+admission_shed = metrics_registry.counter(
+    "admission_shed_total", "Requests shed by admission control (503, or stale-cache fallback)", ("route", "reason")
+)
+admission_queue_wait = metrics_registry.histogram(
+    "admission_queue_wait_seconds", "Time admitted requests spent waiting for a concurrency slot", ("route",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+admission_requests = metrics_registry.gauge("admission_requests", "Requests holding or waiting for a slot", ("route", "state"))
+submission_journal_stats = metrics_registry.gauge(
+    "submission_journal", "Local submission journal statistics (depth = records waiting for replay)", ("stat",)
+)
+store_breaker_open = metrics_registry.gauge("store_breaker_open", "1 while submissions bypass the unreachable store")
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command (update, find, count, aggregate, ...)"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_operation_duration.labels(event.command_name, "success").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongo_operation_duration.labels(event.command_name, "failure").observe(event.duration_micros / 1e6)
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Measures how long operations wait to check out a pooled connection
+    Check-out runs synchronously on one executor thread, so the start time is keyed by thread"""
+
+    def __init__(self):
+        self._checkout_started: Dict[int, float] = {}
+
+    def _finish_checkout(self):
+        started = self._checkout_started.pop(threading.get_ident(), None)
+        if started is not None:
+            mongo_pool_checkout_wait.observe(time.perf_counter() - started)
+
+    def connection_check_out_started(self, event):
+        self._checkout_started[threading.get_ident()] = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        self._finish_checkout()
+
+    def connection_check_out_failed(self, event):
+        self._finish_checkout()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency per route template, method and status"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+        
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope, so labels stay low-cardinality.
+            # Requests shed by admission control never reach it: they are labelled by admission class.
+            route = getattr(scope.get("route"), "path", None)
+            if route is None:
+                shed = scope.get("state", {}).get("admission_shed")
+                route = f"admission:{shed}" if shed else "unmatched"
+            http_request_duration.labels(scope["method"], route, status[0]).observe(time.perf_counter() - started)
+
+if ENABLE_METRICS:
+    app.add_middleware(MetricsMiddleware)
+
 # MongoDB connection with connection pooling
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.environ.get("DB_NAME", "degen_force")
@@ -32,15 +270,79 @@ client = AsyncIOMotorClient(
     maxPoolSize=50,  # Connection pool for high concurrency
     minPoolSize=10,
     maxIdleTimeMS=30000,
-    serverSelectionTimeoutMS=5000
+    serverSelectionTimeoutMS=5000,
+    event_listeners=[MongoCommandMetrics(), MongoPoolMetrics()] if ENABLE_METRICS else []
 )
 db = client[DB_NAME]
-leaderboard_collection = db["leaderboard"]
 
-# Rate limiting storage (in-memory for simplicity, use Redis in production)
-rate_limit_store: Dict[str, list] = defaultdict(list)
+# Storage engine: "mongo" (default), or "memory" / "sqlite" to run the API without MongoDB
+# (benchmarks, profiling). Holds the leaderboard, window buckets and stats counters.
+STORAGE_ENGINE = os.environ.get("STORAGE_ENGINE", "mongo")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "leaderboard.db")
+RUNS_RETENTION_DAYS = int(os.environ.get("RUNS_RETENTION_DAYS", "90"))  # per-run history kept this long
+storage = create_storage(
+    STORAGE_ENGINE, db=db, sqlite_path=SQLITE_PATH, runs_retention=timedelta(days=RUNS_RETENTION_DAYS)
+)
+
+# Rate limiting (in-memory for simplicity, use Redis in production)
 RATE_LIMIT_WINDOW = 60  # seconds
 RATE_LIMIT_MAX_REQUESTS = 10  # max score submissions per minute per wallet
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))  # bounded key table
+RATE_LIMIT_IP_MAX_REQUESTS = int(os.environ.get("RATE_LIMIT_IP_MAX_REQUESTS", "0"))  # per-IP limit, 0 disables
+
+# Batch submission (runs queued by the client while offline)
+SUBMIT_BATCH_MAX = int(os.environ.get("SUBMIT_BATCH_MAX", "50"))  # max runs per request
+
+# Write-behind batching of score submissions (opt-in)
+WRITE_BEHIND_ENABLED = os.environ.get("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+WRITE_BEHIND_MAX_BATCH = int(os.environ.get("WRITE_BEHIND_MAX_BATCH", "500"))  # flush every N ops
+WRITE_BEHIND_MAX_DELAY_MS = float(os.environ.get("WRITE_BEHIND_MAX_DELAY_MS", "5"))  # or every N ms
+
+# Admin endpoints: requests must send ADMIN_API_KEY as X-Admin-Key (unset: admin endpoints are disabled)
+ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY")
+# Deprecated: keep DELETE /api/leaderboard/reset open without the admin key while callers migrate
+RESET_ALLOW_UNAUTHENTICATED = os.environ.get("RESET_ALLOW_UNAUTHENTICATED", "false").lower() == "true"
+
+# Streaming export
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))  # Mongo cursor batch / rows per chunk
+EXPORT_FIELDS = (
+    "wallet_address", "score", "total_games", "best_survival_time_seconds", "best_enemies_killed",
+    "last_biome_reached", "last_difficulty", "last_played", "timestamp", "scores", "games"
+)
+
+# Write-time stats counters (buffered in memory, flushed as one $inc)
+STATS_FLUSH_INTERVAL = float(os.environ.get("STATS_FLUSH_INTERVAL", "1"))  # seconds
+STATS_CACHE_TTL = float(os.environ.get("STATS_CACHE_TTL", "5"))  # seconds
+
+# Seasons: a rollover builds the next season's collection, swaps writes over to it and keeps
+# the previous one as a read-only archive (GET /api/leaderboard?season=N)
+SEASON_CHECK_INTERVAL = float(os.environ.get("SEASON_CHECK_INTERVAL", "5"))  # seconds; how fast other pods follow, 0 disables
+SEASON_FOLLOW_TIMEOUT = float(os.environ.get("SEASON_FOLLOW_TIMEOUT", "2"))  # seconds a write rejected by an archived season waits for the switch
+
+# Degraded mode: submissions the store can't take are appended to a local fsync'ed journal and
+# acknowledged as queued; a background replayer applies them once the store is reachable again.
+# Off unless JOURNAL_DIR is set: an absolute path on a volume that outlives the container
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR", "")
+if JOURNAL_DIR and not os.path.isabs(JOURNAL_DIR):
+    raise ValueError(f"JOURNAL_DIR must be an absolute path, got {JOURNAL_DIR!r}")
+JOURNAL_FSYNC_INTERVAL_MS = float(os.environ.get("JOURNAL_FSYNC_INTERVAL_MS", "5"))  # group commit window
+JOURNAL_REPLAY_INTERVAL = float(os.environ.get("JOURNAL_REPLAY_INTERVAL", "1"))  # seconds between replay attempts
+JOURNAL_REPLAY_BATCH = int(os.environ.get("JOURNAL_REPLAY_BATCH", "500"))  # records per idempotent bulk write
+STORE_BREAKER_FAILURES = int(os.environ.get("STORE_BREAKER_FAILURES", "5"))  # consecutive unreachable-store errors to open
+STORE_BREAKER_RESET = float(os.environ.get("STORE_BREAKER_RESET", "5"))  # seconds between probes while open
+
+# Multi-worker coherence: workers on one host share rate limits, window snapshots and
+# applied updates through a broker on a local Unix socket (hosted by one of the workers)
+SHARED_STATE_ENABLED = os.environ.get("SHARED_STATE_ENABLED", "false").lower() == "true"
+SHARED_STATE_SOCKET = os.environ.get("SHARED_STATE_SOCKET", "/tmp/degen_force_shared.sock")
+SHARED_STATE_TIMEOUT_MS = float(os.environ.get("SHARED_STATE_TIMEOUT_MS", "250"))  # then fall back to local state
+
+# Startup: build every leaderboard snapshot before the worker serves (first requests hit the cache)
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "false").lower() == "true"
+startup_state = {"total_ms": 0.0, "phases_ms": {}, "schema_migrations": []}
+
+# Health checks: how long the readiness probe's store read may take before the store counts as unreachable
+HEALTH_STORE_TIMEOUT = float(os.environ.get("HEALTH_STORE_TIMEOUT", "1"))
 
 # Cache for leaderboard (reduces DB load)
 leaderboard_cache = {
@@ -49,6 +351,85 @@ leaderboard_cache = {
     "ttl": 30  # Cache for 30 seconds
 }
 
+# Max page size for keyset pagination over the full leaderboard
+LEADERBOARD_PAGE_MAX = 1000
+
+# Limits whose response bodies are pre-encoded with every snapshot
+LEADERBOARD_PRECOMPUTED_LIMITS = (10, 100, 1000)
+
+# Pre-compressed variants of those bodies, built once per snapshot off the event loop
+# (brotli only when the package is installed)
+LEADERBOARD_COMPRESSION = os.environ.get("LEADERBOARD_COMPRESSION", "true").lower() == "true"
+LEADERBOARD_COMPRESS_MIN_BYTES = int(os.environ.get("LEADERBOARD_COMPRESS_MIN_BYTES", "1024"))
+LEADERBOARD_GZIP_LEVEL = int(os.environ.get("LEADERBOARD_GZIP_LEVEL", "6"))
+LEADERBOARD_BROTLI_QUALITY = int(os.environ.get("LEADERBOARD_BROTLI_QUALITY", "5"))
+LEADERBOARD_ENCODINGS = ((("br",) if brotli is not None else ()) + ("gzip",)) if LEADERBOARD_COMPRESSION else ()
+LEADERBOARD_CACHED_TAILS = (b"true}", b"false}")  # The response's trailing "cached" flag
+leaderboard_compression_stats = {
+    "snapshots_compressed": 0,
+    "snapshots": defaultdict(lambda: {"bytes": 0, "compressed_bytes": 0, "compress_ms": 0.0, "last_ratio": 0.0}),
+    "responses": defaultdict(lambda: {"count": 0, "bytes_sent": 0, "bytes_saved": 0})
+}
+
+# Leaderboard cache tuning: serve stale data up to the soft TTL while one task revalidates,
+# never serve data older than the hard TTL
+LEADERBOARD_CACHE_SOFT_TTL = float(os.environ.get("LEADERBOARD_CACHE_SOFT_TTL", "5"))
+LEADERBOARD_CACHE_HARD_TTL = float(os.environ.get("LEADERBOARD_CACHE_HARD_TTL", "30"))
+LEADERBOARD_STALE_WHILE_REVALIDATE = os.environ.get("LEADERBOARD_STALE_WHILE_REVALIDATE", "true").lower() == "true"
+
+# Rank index reconciliation: each worker patches its index only with submissions it sees (its own,
+# plus its host's with shared state), so writes from other pods are picked up by a periodic rebuild
+RANK_INDEX_RECONCILE_INTERVAL = float(os.environ.get("RANK_INDEX_RECONCILE_INTERVAL", "60"))  # seconds, 0 disables (single instance)
+# Live top-K views are reloaded from storage on the same grounds (cheap: one indexed top-K read per view)
+LEADERBOARD_VIEW_RECONCILE_INTERVAL = float(
+    os.environ.get("LEADERBOARD_VIEW_RECONCILE_INTERVAL", str(LEADERBOARD_CACHE_HARD_TTL))
+)  # seconds, 0 disables (single instance)
+
+# Anomaly review: wallets flagged by the batch scan (anomaly_scan.py) are hidden from leaderboard reads
+ANOMALY_EXCLUDE = os.environ.get("ANOMALY_EXCLUDE", "true").lower() == "true"
+ANOMALY_REFRESH_INTERVAL = float(os.environ.get("ANOMALY_REFRESH_INTERVAL", "60"))  # seconds between review reloads, 0 disables
+ANOMALY_SCAN_DAYS = float(os.environ.get("ANOMALY_SCAN_DAYS", "7"))  # default scan window for the admin endpoint
+flagged_wallets: set = set()
+anomaly_state = {"flagged_wallets": 0, "refreshed_at": None, "last_scan": None}
+
+# Player profile cache: per-wallet LRU, invalidated only for the wallet that submits
+PLAYER_CACHE_SIZE = int(os.environ.get("PLAYER_CACHE_SIZE", "10000"))  # wallets
+PLAYER_CACHE_TTL = float(os.environ.get("PLAYER_CACHE_TTL", "60"))  # seconds
+
+# In-flight snapshot builds (single-flight) and per-key cache counters
+leaderboard_inflight: Dict[str, asyncio.Task] = {}
+leaderboard_cache_stats: Dict[str, Dict[str, int]] = defaultdict(
+    lambda: {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "errors": 0, "fallbacks": 0}
+)
+
+# Live top-K leaderboard views (patched in place on every submission)
+LEADERBOARD_TOP_K = 1000
+
+# Difficulties with their own accumulated totals (scores.<difficulty>, games.<difficulty>)
+DIFFICULTIES = ("easy", "hard", "cursed")
+
+# Time-windowed leaderboards: bucket length and how long a finished bucket is kept
+LEADERBOARD_WINDOWS = {
+    "daily": {"length": timedelta(days=1), "retention": timedelta(days=7)},
+    "weekly": {"length": timedelta(weeks=1), "retention": timedelta(weeks=5)}
+}
+
+# Fields needed to render a leaderboard row
+LEADERBOARD_PROJECTION = {
+    "_id": 0,
+    "wallet_address": 1,
+    "score": 1,
+    "total_games": 1,
+    "best_survival_time_seconds": 1,
+    "best_enemies_killed": 1,
+    "last_biome_reached": 1,
+    "last_difficulty": 1,
+    "last_played": 1,
+    "timestamp": 1,
+    "scores": 1,
+    "games": 1
+}
+
 # Pydantic models with validation
 class LeaderboardEntry(BaseModel):
     wallet_address: str = Field(..., min_length=10, max_length=100)
@@ -72,6 +453,10 @@ class LeaderboardEntry(BaseModel):
             raise ValueError('Value must be non-negative')
         return v
 
+class LeaderboardBatch(BaseModel):
+    # Entries are validated one by one in the handler, so one bad run doesn't reject the batch
+    entries: List[Dict[str, Any]] = Field(..., min_length=1, max_length=SUBMIT_BATCH_MAX)
+
 class LeaderboardResponse(BaseModel):
     wallet_address: str
     score: int
@@ -82,65 +467,1592 @@ class LeaderboardResponse(BaseModel):
     timestamp: str
     rank: int
 
+# Rate limiting
+class SlidingWindowRateLimiter:
+    """Sliding-window counter rate limiter with O(1) time and fixed state per key.
+    The estimate weights the previous window's count by how much of it still
+    overlaps the sliding window. Keys live in an LRU table bounded by max_keys;
+    keys idle for two windows are expired. Checks never await, so concurrent
+    coroutines hitting the same key can't interleave inside a check."""
+
+    def __init__(self, limit: int, window: float, max_keys: int):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        # key -> [window_start, previous_count, current_count]
+        self._keys: "OrderedDict[str, list]" = OrderedDict()
+        self.stats = {"allowed": 0, "rejected": 0, "evicted": 0, "expired": 0}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _expire(self, now: float):
+        horizon = now - 2 * self.window
+        while self._keys:
+            key, state = next(iter(self._keys.items()))
+            if state[0] >= horizon:
+                break
+            self._keys.popitem(last=False)
+            self.stats["expired"] += 1
+
+    def hit(self, key: str, now: Optional[float] = None) -> bool:
+        """Count one request for key; returns False if it is over the limit"""
+        now = time.time() if now is None else now
+        window_start = now - (now % self.window)
+        self._expire(now)
+        
+        state = self._keys.get(key)
+        if state is None:
+            state = [window_start, 0, 0]
+            self._keys[key] = state
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+                self.stats["evicted"] += 1
+        else:
+            self._keys.move_to_end(key)
+            if state[0] != window_start:
+                # Roll the windows forward; anything older than one window no longer counts
+                state[1] = state[2] if window_start - state[0] <= self.window else 0
+                state[2] = 0
+                state[0] = window_start
+        
+        overlap = (self.window - (now - window_start)) / self.window
+        if state[1] * overlap + state[2] >= self.limit:
+            self.stats["rejected"] += 1
+            return False
+        state[2] += 1
+        self.stats["allowed"] += 1
+        return True
+
+    def snapshot(self) -> dict:
+        return {"keys": len(self._keys), "max_keys": self.max_keys, "limit": self.limit, "window": self.window, **self.stats}
+
+rate_limit_store = SlidingWindowRateLimiter(RATE_LIMIT_MAX_REQUESTS, RATE_LIMIT_WINDOW, RATE_LIMIT_MAX_KEYS)
+ip_rate_limit_store = (
+    SlidingWindowRateLimiter(RATE_LIMIT_IP_MAX_REQUESTS, RATE_LIMIT_WINDOW, RATE_LIMIT_MAX_KEYS)
+    if RATE_LIMIT_IP_MAX_REQUESTS > 0 else None
+)
+
 # Rate limiting function
-async def check_rate_limit(wallet_address: str) -> bool:
-    """Check if wallet has exceeded rate limit"""
-    now = time.time()
-    # Clean old entries
-    rate_limit_store[wallet_address] = [
-        ts for ts in rate_limit_store[wallet_address] 
-        if now - ts < RATE_LIMIT_WINDOW
-    ]
-    
-    # Check limit
-    if len(rate_limit_store[wallet_address]) >= RATE_LIMIT_MAX_REQUESTS:
+async def check_rate_limit(wallet_address: str, ip_address: Optional[str] = None) -> bool:
+    """Check if wallet (and optionally its IP) has exceeded rate limit"""
+    if ip_address and ip_rate_limit_store is not None and not await rate_limit_hit("ip", ip_rate_limit_store, ip_address):
         return False
-    
-    # Add new request
-    rate_limit_store[wallet_address].append(now)
-    return True
+    return await rate_limit_hit("wallet", rate_limit_store, wallet_address)
+
+async def rate_limit_hit(name: str, limiter: SlidingWindowRateLimiter, key: str) -> bool:
+    """Count a hit on the host-wide limiter in shared mode, else (or if the broker is unreachable) locally"""
+    if shared_state is not None:
+        allowed = await shared_state.rate_limit_hit(name, key)
+        if allowed is not None:
+            return allowed
+    return limiter.hit(key)
 
 # Cache management
-def get_cached_leaderboard(difficulty: Optional[str] = None):
-    """Get leaderboard from cache if valid"""
-    cache_key = f"leaderboard_{difficulty or 'all'}"
-    now = time.time()
-    
-    if cache_key in leaderboard_cache:
-        cache_data = leaderboard_cache[cache_key]
-        if now - cache_data["timestamp"] < cache_data["ttl"]:
-            return cache_data["data"]
+def get_cached_leaderboard(view_key: str = "all", version: Optional[int] = None):
+    """Get leaderboard from cache
+    Returns (data, fresh). Entries past the soft TTL, invalidated, or built from an
+    older top-K view version are returned as stale until the hard TTL expires."""
+    cache_key = f"leaderboard_{view_key}"
+    cache_data = leaderboard_cache.get(cache_key)
+    if not isinstance(cache_data, dict):
+        return None, False
     
-    return None
+    age = time.time() - cache_data["timestamp"]
+    if age >= cache_data["ttl"]:
+        return None, False
+    fresh = (
+        age < LEADERBOARD_CACHE_SOFT_TTL
+        and not cache_data["invalidated"]
+        and cache_data["version"] == version
+    )
+    return cache_data["data"], fresh
 
-def set_cached_leaderboard(data, difficulty: Optional[str] = None):
+def get_fallback_leaderboard(view_key: str = "all"):
+    """Last snapshot built for a view regardless of age (admission fallback when the DB is saturated)"""
+    cache_data = leaderboard_cache.get(f"leaderboard_{view_key}")
+    return cache_data["data"] if isinstance(cache_data, dict) else None
+
+def set_cached_leaderboard(data, view_key: str = "all", version: Optional[int] = None):
     """Cache leaderboard data"""
-    cache_key = f"leaderboard_{difficulty or 'all'}"
+    cache_key = f"leaderboard_{view_key}"
     leaderboard_cache[cache_key] = {
         "data": data,
         "timestamp": time.time(),
-        "ttl": 30  # 30 seconds cache
+        "ttl": LEADERBOARD_CACHE_HARD_TTL,
+        "version": version,
+        "invalidated": False
     }
 
 def invalidate_leaderboard_cache():
-    """Clear all leaderboard caches after new score submission"""
+    """Clear all leaderboard caches (live views are versioned, so only resets need this)"""
     leaderboard_cache.clear()
+    leaderboard_cache_invalidations.inc()
+
+class PlayerProfileCache:
+    """LRU cache of player documents keyed by wallet, bounded by max_entries.
+    Entries expire after ttl seconds and are dropped one wallet at a time when
+    that wallet submits. A load that raced with an invalidation is not stored."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # wallet -> (loaded_at, document)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._loading: Dict[str, object] = {}  # wallet -> token of the load in flight
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidations": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, wallet_address: str):
+        """Cached document for wallet, or None"""
+        entry = self._entries.get(wallet_address)
+        if entry is not None:
+            if time.time() - entry[0] < self.ttl:
+                self._entries.move_to_end(wallet_address)
+                self.stats["hits"] += 1
+                return entry[1]
+            del self._entries[wallet_address]
+            self.stats["expired"] += 1
+        self.stats["misses"] += 1
+        return None
+
+    def begin_load(self, wallet_address: str) -> object:
+        token = object()
+        self._loading[wallet_address] = token
+        return token
+
+    def finish_load(self, wallet_address: str, token: object, document: dict):
+        """Store a loaded document unless the wallet was invalidated meanwhile"""
+        if self._loading.get(wallet_address) is not token:
+            return
+        del self._loading[wallet_address]
+        self._entries[wallet_address] = (time.time(), document)
+        self._entries.move_to_end(wallet_address)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def abandon_load(self, wallet_address: str, token: object):
+        """Forget a load that stored nothing (no-op once finished or superseded)"""
+        if self._loading.get(wallet_address) is token:
+            del self._loading[wallet_address]
+
+    def invalidate(self, wallet_address: str):
+        self._loading.pop(wallet_address, None)
+        if self._entries.pop(wallet_address, None) is not None:
+            self.stats["invalidations"] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._loading.clear()
+
+    def snapshot(self) -> dict:
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl, **self.stats}
+
+player_cache = PlayerProfileCache(PLAYER_CACHE_SIZE, PLAYER_CACHE_TTL)
+
+# Score update construction and write-behind batching
+def build_score_update(entry: LeaderboardEntry, current_time: datetime, ip_address: str) -> dict:
+    """Build the atomic accumulate-upsert for one finished game"""
+    return {
+        "$inc": {
+            "score": entry.score,  # Atomically increment score
+            "total_games": 1,  # Atomically increment game count
+            f"scores.{entry.difficulty}": entry.score,  # Per-difficulty total
+            f"games.{entry.difficulty}": 1
+        },
+        "$set": {
+            "last_survival_time_seconds": entry.survival_time_seconds,
+            "last_enemies_killed": entry.enemies_killed,
+            "last_biome_reached": entry.biome_reached,
+            "last_difficulty": entry.difficulty,
+            "last_played": current_time,
+            "ip_address": ip_address
+        },
+        "$max": {
+            "best_survival_time_seconds": entry.survival_time_seconds,
+            "best_enemies_killed": entry.enemies_killed
+        },
+        "$setOnInsert": {
+            "timestamp": current_time,  # Only set on first insert
+            "wallet_address": entry.wallet_address
+        }
+    }
+
+def merge_score_updates(base: dict, extra: dict) -> dict:
+    """Merge two upserts for the same document into one equivalent update.
+    $inc deltas add up, $max keeps the larger value, the later $set wins,
+    the earlier $setOnInsert wins and $push lists are joined."""
+    merged = {op: dict(fields) for op, fields in base.items()}
+    for op, fields in extra.items():
+        target = merged.setdefault(op, {})
+        for field, value in fields.items():
+            if field not in target:
+                target[field] = value
+            elif op == "$inc":
+                target[field] += value
+            elif op == "$max":
+                target[field] = max(target[field], value)
+            elif op == "$min":
+                target[field] = min(target[field], value)
+            elif op == "$push":
+                target[field] = {**value, "$each": target[field]["$each"] + value["$each"]}
+            elif op != "$setOnInsert":
+                target[field] = value
+    return merged
+
+class WriteBehindBatcher:
+    """Collects pending upserts per key and flushes them as one unordered bulk upsert.
+    Repeated submissions for the same key are merged into a single operation.
+    Callers await their submission, so it is only acknowledged once the batch
+    containing it is durable."""
+
+    def __init__(self, storage, table: str, max_batch: int, max_delay_ms: float):
+        self.storage = storage
+        self.table = table
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._pending: Dict[str, dict] = {}
+        self._pending_ops = 0
+        self._timer = None
+        self._flush_lock = asyncio.Lock()
+        self._flush_tasks = set()
+        self.stats = {
+            "flushes": 0,
+            "submissions": 0,
+            "operations_written": 0,
+            "failed_operations": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "last_batch_size": 0
+        }
+
+    async def submit(self, key: str, filter: dict, update: dict) -> bool:
+        """Queue an upsert and wait until it is written.
+        Returns True if this submission created the document."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.get(key)
+        if pending:
+            pending["update"] = merge_score_updates(pending["update"], update)
+            pending["futures"].append(future)
+        else:
+            self._pending[key] = {"filter": filter, "update": update, "futures": [future]}
+        self._pending_ops += 1
+        self.stats["submissions"] += 1
+
+        if self._pending_ops >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_ops = self._pending, {}, 0
+        task = asyncio.ensure_future(self._flush(batch))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self, batch: Dict[str, dict]):
+        # Flushes are serialized so later $set values never land before earlier ones
+        async with self._flush_lock:
+            items = list(batch.values())
+            ops = [(item["filter"], item["update"]) for item in items]
+            started = time.perf_counter()
+            try:
+                upserted, errors = await self.storage.bulk_upsert(self.table, ops)
+            except Exception as e:
+                errors = {index: e for index in range(len(items))}
+                upserted = set()
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.stats["flushes"] += 1
+            self.stats["operations_written"] += len(items) - len(errors)
+            self.stats["failed_operations"] += len(errors)
+            self.stats["last_flush_ms"] = round(elapsed_ms, 3)
+            self.stats["max_flush_ms"] = round(max(self.stats["max_flush_ms"], elapsed_ms), 3)
+            self.stats["last_batch_size"] = len(items)
+
+            for index, item in enumerate(items):
+                error = errors.get(index)
+                for position, future in enumerate(item["futures"]):
+                    if future.done():
+                        continue
+                    if error is None:
+                        # Only the first merged submission can have created the document
+                        future.set_result(index in upserted and position == 0)
+                    else:
+                        future.set_exception(error)
+
+    async def close(self):
+        """Flush anything still pending and wait for in-flight batches"""
+        self._start_flush()
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        stats = {"enabled": True, **self.stats}
+        written = stats["operations_written"]
+        stats["pending"] = self._pending_ops
+        stats["max_batch"] = self.max_batch
+        stats["max_delay_ms"] = self.max_delay * 1000
+        stats["merge_ratio"] = round(stats["submissions"] / written, 3) if written else 0.0
+        stats["avg_batch_size"] = round(written / stats["flushes"], 3) if stats["flushes"] else 0.0
+        return stats
+
+score_batcher = (
+    WriteBehindBatcher(storage, "leaderboard", WRITE_BEHIND_MAX_BATCH, WRITE_BEHIND_MAX_DELAY_MS)
+    if WRITE_BEHIND_ENABLED else None
+)
+
+async def persist_score_update(wallet_address: str, update: dict, op_id: dict) -> bool:
+    """Durably apply one accumulate-upsert; returns True if the player was created"""
+    update = mark_applied_op(update, op_id)
+    if score_batcher is not None:
+        return await score_batcher.submit(wallet_address, {"wallet_address": wallet_address}, update)
+    return await storage.upsert_accumulate("leaderboard", {"wallet_address": wallet_address}, update)
+
+# Time-windowed buckets
+def current_window(window: str, now: datetime):
+    """Return (window_id, start, end) of the bucket containing `now`
+    Buckets belong to the active season (a rollover starts them from zero)"""
+    start = datetime(now.year, now.month, now.day)
+    if window == "daily":
+        window_id = f"daily:{start:%Y-%m-%d}"
+    else:
+        start -= timedelta(days=start.weekday())  # Weeks start on Monday (ISO)
+        iso = start.isocalendar()
+        window_id = f"weekly:{iso[0]}-W{iso[1]:02d}"
+    return season_window_prefix(storage.active_season) + window_id, start, start + LEADERBOARD_WINDOWS[window]["length"]
+
+def build_window_updates(entry: LeaderboardEntry, current_time: datetime):
+    """Build the accumulate-upserts for every window bucket this game falls into
+    Returns a list of (window_id, filter, update)"""
+    updates = []
+    for window, config in LEADERBOARD_WINDOWS.items():
+        window_id, _, ends = current_window(window, current_time)
+        updates.append((window_id, {"window_id": window_id, "wallet_address": entry.wallet_address}, {
+            "$inc": {"score": entry.score, "total_games": 1},
+            "$set": {
+                "last_biome_reached": entry.biome_reached,
+                "last_difficulty": entry.difficulty,
+                "last_played": current_time
+            },
+            "$max": {
+                "best_survival_time_seconds": entry.survival_time_seconds,
+                "best_enemies_killed": entry.enemies_killed
+            },
+            "$setOnInsert": {
+                "window_id": window_id,
+                "wallet_address": entry.wallet_address,
+                "timestamp": current_time,
+                "expires_at": ends + config["retention"]  # TTL index removes old buckets
+            }
+        }))
+    return updates
+
+window_batcher = (
+    WriteBehindBatcher(storage, "windows", WRITE_BEHIND_MAX_BATCH, WRITE_BEHIND_MAX_DELAY_MS)
+    if WRITE_BEHIND_ENABLED else None
+)
+
+async def persist_window_updates(window_updates, op_ids: Dict[str, dict]):
+    """Durably apply the per-window bucket upserts (one round trip, or via write-behind)
+    op_ids: wallet -> op id of the submission the buckets belong to"""
+    window_updates = [
+        (window_id, filter, mark_applied_op(update, op_ids[filter["wallet_address"]]))
+        for window_id, filter, update in window_updates
+    ]
+    if window_batcher is not None:
+        await asyncio.gather(*[
+            window_batcher.submit(f"{window_id}|{filter['wallet_address']}", filter, update)
+            for window_id, filter, update in window_updates
+        ])
+        return
+    _, errors = await storage.bulk_upsert("windows", [(filter, update) for _, filter, update in window_updates])
+    if errors:
+        raise next(iter(errors.values()))
+
+async def persist_score_updates(updates: Dict[str, dict], op_ids: Dict[str, dict]) -> Dict[str, object]:
+    """Durably apply one accumulate-upsert per wallet in a single bulk write
+    Returns wallet -> created (bool), or the exception for a wallet that failed"""
+    wallets = list(updates)
+    updates = {wallet_address: mark_applied_op(updates[wallet_address], op_ids[wallet_address]) for wallet_address in wallets}
+    if score_batcher is not None:
+        results = await asyncio.gather(*[
+            score_batcher.submit(wallet_address, {"wallet_address": wallet_address}, updates[wallet_address])
+            for wallet_address in wallets
+        ], return_exceptions=True)
+        return dict(zip(wallets, results))
+    upserted, errors = await storage.bulk_upsert(
+        "leaderboard", [({"wallet_address": wallet_address}, updates[wallet_address]) for wallet_address in wallets]
+    )
+    return {wallet_address: errors.get(index, index in upserted) for index, wallet_address in enumerate(wallets)}
+
+# Stats counters
+def stats_doc_id() -> str:
+    """Counters document of the active season"""
+    return season_stats_id(storage.active_season)
+
+pending_stats = {"unique_players": 0, "total_games": 0, "total_score": 0}
+stats_cache = {"data": None, "timestamp": 0}
+stats_flush_task: Optional[asyncio.Task] = None
+
+def record_submission_stats(created: bool, games: int, score: int):
+    """Count a durable submission; flushed to the stats document in the background"""
+    if created:
+        pending_stats["unique_players"] += 1
+    pending_stats["total_games"] += games
+    pending_stats["total_score"] += score
+
+async def flush_stats_counters():
+    """Write buffered counter deltas as a single $inc"""
+    delta = {field: value for field, value in pending_stats.items() if value}
+    if not delta:
+        return
+    for field in delta:
+        pending_stats[field] -= delta[field]
+    try:
+        await storage.upsert_accumulate("stats", {"_id": stats_doc_id()}, {"$inc": delta})
+    except Exception:
+        # Put the deltas back so the next flush retries them
+        for field, value in delta.items():
+            pending_stats[field] += value
+        raise
+
+async def stats_flush_loop():
+    while True:
+        await asyncio.sleep(STATS_FLUSH_INTERVAL)
+        try:
+            await flush_stats_counters()
+        except Exception as e:
+            log_event(logger, logging.WARNING, "Failed to flush stats counters", error=str(e))
+
+async def seed_stats_counters():
+    """Create the stats document from the collection once (first boot after upgrade)
+    Any failure other than losing the race to another worker is raised to the caller, which logs it"""
+    if await storage.find_one("stats", {"_id": stats_doc_id()}, {"_id": 1}):
+        return
+    totals = await storage.stats()
+    try:
+        await storage.upsert_accumulate("stats", {"_id": stats_doc_id()}, {"$setOnInsert": {
+            "unique_players": totals["players"],
+            "total_games": totals["games"],
+            "total_score": totals["score"]
+        }})
+    except DuplicateKeyError:
+        pass  # Another worker seeded it first (only Mongo can race here; the other engines serialize writes)
+
+# Per-run history (append-only, written off the request path)
+RUNS_BATCH_SIZE = int(os.environ.get("RUNS_BATCH_SIZE", "1000"))  # records per unordered insert
+RUNS_FLUSH_INTERVAL = float(os.environ.get("RUNS_FLUSH_INTERVAL", "0.5"))  # seconds between flushes
+RUNS_BUFFER_MAX = int(os.environ.get("RUNS_BUFFER_MAX", "100000"))  # oldest records dropped beyond this
+RUNS_PAGE_MAX = 100
+
+class RunHistoryWriter:
+    """Buffers run records in memory and appends them in unordered batches.
+    Submitting never waits on the insert: history is best-effort, and when the
+    store falls behind the buffer is bounded by dropping the oldest records."""
+
+    def __init__(self, storage, batch_size: int, flush_interval: float, max_buffer: int):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = deque(maxlen=max_buffer)
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._flush_lock = asyncio.Lock()
+        self.stats = {
+            "records": 0,
+            "written": 0,
+            "rejected": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0
+        }
+
+    def add(self, record: dict):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.stats["dropped"] += 1
+        self._buffer.append(record)
+        self.stats["records"] += 1
+        if len(self._buffer) >= self.batch_size:
+            self._ready.set()
+
+    def start(self):
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def _wait(self):
+        """Until a batch is ready, close() is called or flush_interval passes"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), self.flush_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._ready.clear()
+
+    async def _run(self):
+        while not self._closing:
+            await self._wait()
+            if self._closing:
+                return  # close() writes what is left
+            try:
+                await self.flush()
+            except Exception as e:
+                log_event(logger, logging.WARNING, "Failed to write run history", error=str(e), buffered=len(self._buffer))
+                await self._wait()  # Back off; the batch is back in the buffer
+
+    async def flush(self):
+        """Write everything buffered, one batch at a time"""
+        async with self._flush_lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                started = time.perf_counter()
+                try:
+                    rejected = await self.storage.insert_runs(batch)
+                except Exception:
+                    # Nothing was written: put the batch back (ahead of newer records) for the next attempt
+                    self.stats["failed_flushes"] += 1
+                    keep = batch[max(0, len(batch) - (self._buffer.maxlen - len(self._buffer))):]
+                    self.stats["dropped"] += len(batch) - len(keep)
+                    self._buffer.extendleft(reversed(keep))
+                    raise
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.stats["flushes"] += 1
+                self.stats["written"] += len(batch) - rejected
+                self.stats["rejected"] += rejected  # Individually invalid records are not retried
+                self.stats["last_flush_ms"] = round(elapsed_ms, 3)
+                self.stats["max_flush_ms"] = round(max(self.stats["max_flush_ms"], elapsed_ms), 3)
+
+    async def close(self):
+        """Stop the background loop and write what is left
+        A batch being written is finished (or put back) first, rather than cut off mid-insert."""
+        if self._task is not None:
+            self._closing = True
+            self._ready.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "buffered": len(self._buffer),
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "max_buffer": self._buffer.maxlen
+        }
+
+run_history = RunHistoryWriter(storage, RUNS_BATCH_SIZE, RUNS_FLUSH_INTERVAL, RUNS_BUFFER_MAX)
+
+def build_run_record(entry: LeaderboardEntry, current_time: datetime, ip_address: str) -> dict:
+    """One immutable history record per submitted game"""
+    return {
+        "run_id": uuid.uuid4().hex,
+        "wallet_address": entry.wallet_address,
+        "played_at": current_time,
+        "season": storage.active_season,
+        "score": entry.score,
+        "survival_time_seconds": entry.survival_time_seconds,
+        "enemies_killed": entry.enemies_killed,
+        "biome_reached": entry.biome_reached,
+        "difficulty": entry.difficulty,
+        "client_timestamp": entry.timestamp,
+        "ip_address": ip_address
+    }
+
+# Degraded mode: local journal for submissions the store can't take
+submission_journal = SubmissionJournal(JOURNAL_DIR, JOURNAL_FSYNC_INTERVAL_MS) if JOURNAL_DIR else None
+store_breaker = CircuitBreaker(STORE_BREAKER_FAILURES, STORE_BREAKER_RESET)
+journal_state = {"duplicates": 0, "rejected": 0, "replay_errors": 0, "last_replay_ms": 0.0, "last_error": None}
+journal_replay_task: Optional[asyncio.Task] = None
+
+def store_unavailable(error: BaseException) -> bool:
+    """The store could not be reached (as opposed to rejecting the write); the write
+    may still have landed, which its op marker tells the replay"""
+    return storage.is_unavailable(error)
+
+def can_journal(error: BaseException) -> bool:
+    return submission_journal is not None and store_unavailable(error)
+
+def record_store_failure(error: BaseException):
+    if store_breaker.record_failure():
+        log_event(
+            logger, logging.WARNING, "Store unreachable, journaling submissions",
+            error=str(error), failures=store_breaker.failures
+        )
+
+def record_store_success():
+    if store_breaker.record_success():
+        log_event(logger, logging.INFO, "Store reachable again", journal_depth=submission_journal.depth if submission_journal else 0)
+
+def submissions_journaled() -> bool:
+    """Journal new submissions without trying the store: it is down, or earlier
+    submissions are still queued (they must be applied first, in order)"""
+    return submission_journal is not None and (store_breaker.is_open or submission_journal.depth > 0)
+
+def journal_record(wallet_address: str, update: Optional[dict] = None, window_updates=(), runs=(), op_id=None) -> dict:
+    """One journaled submission: the write ops still to apply, plus its run records
+    op_id: the marker of a live write that failed, which may have landed all the same"""
+    ops = []
+    if update is not None:
+        ops.append(["leaderboard", {"wallet_address": wallet_address}, update])
+    ops.extend(["windows", filter, window_update] for _, filter, window_update in window_updates)
+    record = {
+        "wallet_address": wallet_address,
+        "ops": ops,
+        "runs": list(runs)
+    }
+    if op_id is not None:
+        record["op_id"] = op_id
+        record["live_write"] = True
+    return record
+
+async def apply_journal_records(records: List[dict]):
+    """Write a batch of journaled submissions, then update in-memory state as a live submit would
+    Ops already applied, by an interrupted earlier replay or by the live write that failed
+    with its outcome unknown, are skipped (by the record's op_id), so replays are idempotent.
+    Runs queued before a rollover count toward the season they are applied in, like a live
+    write held back by the switch (the ended season's table is read-only)."""
+    # Each bulk write takes at most one op per document, in journal order: a document's later
+    # op applied first would raise its high-water mark past the earlier one, which then looks applied
+    passes_by_table: Dict[str, List[list]] = defaultdict(list)  # table -> passes of (position, key, update)
+    document_ops: Dict[tuple, int] = defaultdict(int)
+    for position, record in enumerate(records):
+        for table, key, update in record["ops"]:
+            document = (table, tuple(sorted(key.items())))
+            passes = passes_by_table[table]
+            if document_ops[document] == len(passes):
+                passes.append([])
+            passes[document_ops[document]].append((position, key, update))
+            document_ops[document] += 1
+
+    # Score ops go last: a batch failing midway has then only written buckets (no in-memory state)
+    applied = {}  # record position -> created, for score ops applied by this call
+    landed = []  # Record positions whose live write landed after all (it failed on its way back)
+    passes = [
+        (table, ops)
+        for table in sorted(passes_by_table, key=lambda table: table != "windows")
+        for ops in passes_by_table[table]
+    ]
+    for table, ops in passes:
+        upserted, duplicates, errors = await storage.bulk_upsert_once(
+            table, [(key, update, records[position]["op_id"]) for position, key, update in ops]
+        )
+        for error in errors.values():
+            if store_unavailable(error) or isinstance(error, SeasonArchived):
+                raise error  # Replay resumes at this batch (after following the switch)
+        for index, (position, _, _) in enumerate(ops):
+            if index in errors:
+                journal_state["rejected"] += 1
+                log_event(
+                    logger, logging.WARNING, "Dropped journaled write",
+                    table=table, wallet=records[position]["wallet_address"][:8], error=str(errors[index])
+                )
+            elif index in duplicates:
+                journal_state["duplicates"] += 1
+                if table != "windows" and records[position].get("live_write"):
+                    landed.append(position)
+            elif table != "windows":
+                applied[position] = index in upserted
+
+    for position in sorted(applied):
+        created = applied[position]
+        record = records[position]
+        for run in record["runs"]:
+            run_history.add(run)
+        wallet_address = record["wallet_address"]
+        update = next(update for table, _, update in record["ops"] if table == "leaderboard")
+        apply_update_to_rank_indexes(wallet_address, update)
+        record_submission_stats(created, update["$inc"]["total_games"], update["$inc"]["score"])
+        player_cache.invalidate(wallet_address)
+        await apply_update_to_views(wallet_address, update, created)
+        if shared_state is not None:
+            shared_state.publish({
+                "type": "update", "wallet_address": wallet_address, "update": update, "created": created,
+                "season": storage.active_season
+            })
+
+    # The store has these; in-memory state doesn't, as their request failed. The totals are
+    # re-read rather than incremented, as a restart has already loaded them from the store.
+    for position in landed:
+        record = records[position]
+        for run in record["runs"]:
+            run_history.add(run)
+        wallet_address = record["wallet_address"]
+        update = next(update for table, _, update in record["ops"] if table == "leaderboard")
+        if rank_index_touched is not None:
+            rank_index_touched.add(wallet_address)
+        set_rank_index_scores(wallet_address, await storage.find_one("leaderboard", {"wallet_address": wallet_address}))
+        record_submission_stats(False, update["$inc"]["total_games"], update["$inc"]["score"])  # Whether it created the player is unknown
+        player_cache.invalidate(wallet_address)
+        if shared_state is not None:
+            shared_state.publish({
+                "type": "update", "wallet_address": wallet_address, "update": update, "created": False,
+                "season": storage.active_season
+            })
+    if landed:
+        unload_leaderboard_views()
+
+async def replay_journal() -> int:
+    """Drain the journal into the store; returns the number of records replayed
+    The last round runs with the write gate closed: new submissions go back to
+    direct writes only once everything queued before them has been applied."""
+    replayed = await submission_journal.replay(apply_journal_records, JOURNAL_REPLAY_BATCH)
+    async with write_gate.closed():
+        replayed += await submission_journal.replay(apply_journal_records, JOURNAL_REPLAY_BATCH)
+    return replayed
+
+async def journal_replay_loop():
+    while True:
+        await asyncio.sleep(JOURNAL_REPLAY_INTERVAL)
+        if not store_breaker.probe_due() or not (submission_journal.depth or store_breaker.is_open):
+            continue
+        started = time.perf_counter()
+        try:
+            if submission_journal.depth:
+                replayed = await replay_journal()
+                journal_state["last_replay_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                log_event(
+                    logger, logging.INFO, "Journal replayed",
+                    records=replayed, replay_ms=journal_state["last_replay_ms"], depth=submission_journal.depth
+                )
+            else:
+                await storage.find_one("stats", {"_id": stats_doc_id()}, {"_id": 1})  # Probe only
+        except SeasonArchived:
+            # Another process rolled over: follow it and replay into the new season next round
+            try:
+                await follow_season_switch()
+            except Exception as e:
+                log_event(logger, logging.WARNING, "Failed to check season", error=str(e))
+            continue
+        except Exception as e:
+            if store_unavailable(e):
+                record_store_failure(e)
+            else:
+                journal_state["replay_errors"] += 1
+            journal_state["last_error"] = str(e)
+            log_event(logger, logging.WARNING, "Failed to replay journal", error=str(e), depth=submission_journal.depth)
+            continue
+        record_store_success()
+
+def journal_snapshot() -> dict:
+    if submission_journal is None:
+        return {"enabled": False}
+    return {**submission_journal.snapshot(), **journal_state, "breaker": store_breaker.snapshot()}
+
+# Rank index (order-statistic structure over accumulated scores)
+RANK_INDEX_MAX_LEVEL = 32  # Enough levels for 2^32 wallets
+RANK_AROUND_MAX = 50  # Max neighbours returned on each side of a wallet
+
+class _SkipNode:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next = [None] * level
+        # width[i] = number of level-0 steps to reach next[i]
+        self.width = [1] * level
+
+class RankIndex:
+    """Indexable skiplist of wallets ordered by (score desc, wallet asc).
+    Insert, remove, rank-of and rank-at lookups are all O(log n)."""
+
+    def __init__(self):
+        self.scores: Dict[str, int] = {}
+        self._head = _SkipNode(None, RANK_INDEX_MAX_LEVEL)
+
+    def __len__(self):
+        return len(self.scores)
+
+    @staticmethod
+    def _random_level() -> int:
+        level = 1
+        while level < RANK_INDEX_MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def _insert(self, key):
+        chain = [None] * RANK_INDEX_MAX_LEVEL
+        steps_at_level = [0] * RANK_INDEX_MAX_LEVEL
+        node = self._head
+        for level in reversed(range(RANK_INDEX_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        depth = self._random_level()
+        new_node = _SkipNode(key, depth)
+        steps = 0
+        for level in range(depth):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(depth, RANK_INDEX_MAX_LEVEL):
+            chain[level].width[level] += 1
+
+    def _remove(self, key):
+        chain = [None] * RANK_INDEX_MAX_LEVEL
+        node = self._head
+        for level in reversed(range(RANK_INDEX_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), RANK_INDEX_MAX_LEVEL):
+            chain[level].width[level] -= 1
+
+    def load(self, items):
+        """Bulk-build the index from (wallet, score) pairs in O(n log n)"""
+        self.scores = {wallet: score for wallet, score in items}
+        self._head = _SkipNode(None, RANK_INDEX_MAX_LEVEL)
+        last = [self._head] * RANK_INDEX_MAX_LEVEL
+        last_pos = [0] * RANK_INDEX_MAX_LEVEL
+        keys = sorted((-score, wallet) for wallet, score in self.scores.items())
+        for pos, key in enumerate(keys, start=1):
+            node = _SkipNode(key, self._random_level())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = pos - last_pos[level]
+                last[level] = node
+                last_pos[level] = pos
+        for level in range(RANK_INDEX_MAX_LEVEL):
+            last[level].width[level] = len(keys) + 1 - last_pos[level]
+
+    def clear(self):
+        self.load([])
+
+    def set(self, wallet_address: str, score: int):
+        """Insert a wallet or move it to its new score"""
+        old_score = self.scores.get(wallet_address)
+        if old_score == score:
+            return
+        if old_score is not None:
+            self._remove((-old_score, wallet_address))
+        self._insert((-score, wallet_address))
+        self.scores[wallet_address] = score
+
+    def increment(self, wallet_address: str, delta: int) -> int:
+        """Apply a $inc to a wallet's score and return the new total"""
+        score = self.scores.get(wallet_address, 0) + delta
+        self.set(wallet_address, score)
+        return score
+
+    def discard(self, wallet_address: str):
+        score = self.scores.pop(wallet_address, None)
+        if score is not None:
+            self._remove((-score, wallet_address))
+
+    def rank(self, wallet_address: str) -> Optional[int]:
+        """1-based rank of a wallet, or None if unknown"""
+        score = self.scores.get(wallet_address)
+        if score is None:
+            return None
+        key = (-score, wallet_address)
+        node = self._head
+        position = 0
+        for level in reversed(range(RANK_INDEX_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position + 1
+
+    def window(self, start: int, count: int):
+        """Return up to `count` (rank, wallet, score) rows from 0-based position `start`"""
+        if start < 0 or start >= len(self.scores) or count <= 0:
+            return []
+        node = self._head
+        remaining = start + 1
+        for level in reversed(range(RANK_INDEX_MAX_LEVEL)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        rows = []
+        rank = start + 1
+        while node is not None and len(rows) < count:
+            rows.append((rank, node.key[1], -node.key[0]))
+            node = node.next[0]
+            rank += 1
+        return rows
+
+    def around(self, wallet_address: str, neighbours: int):
+        """Return the wallet's row plus up to N neighbours on each side"""
+        rank = self.rank(wallet_address)
+        if rank is None:
+            return []
+        start = max(0, rank - 1 - neighbours)
+        return self.window(start, (rank - 1 - start) + 1 + neighbours)
+
+rank_index = RankIndex()
+
+# Per-difficulty rank indexes (only wallets with a positive total on that difficulty)
+difficulty_rank_indexes: Dict[str, RankIndex] = {difficulty: RankIndex() for difficulty in DIFFICULTIES}
+
+rank_index_lock = asyncio.Lock()
+rank_index_touched: Optional[set] = None  # Wallets updated while a rebuild is scanning storage
+rank_index_state = {"rebuilds": 0, "last_rebuild_ms": 0.0, "last_drifted": 0, "rebuilt_at": None}
+rank_index_reconcile_task: Optional[asyncio.Task] = None
+view_reconcile_task: Optional[asyncio.Task] = None
+
+def apply_update_to_rank_indexes(wallet_address: str, update: dict) -> int:
+    """Mirror an upsert's $inc into the rank indexes; returns the new total score"""
+    if rank_index_touched is not None:
+        rank_index_touched.add(wallet_address)
+    increments = update.get("$inc", {})
+    for difficulty, index in difficulty_rank_indexes.items():
+        delta = increments.get(f"scores.{difficulty}", 0)
+        if delta > 0:
+            index.increment(wallet_address, delta)
+    return rank_index.increment(wallet_address, increments.get("score", 0))
+
+# Live top-K views
+class TopKLeaderboard:
+    """The top K documents of one leaderboard view, ordered by (score desc, wallet asc).
+    Each upsert patches the view in place, so reads never need the sorted DB query."""
+
+    def __init__(self, k: int, score_field: str, score_index: RankIndex, positive_only: bool = False):
+        self.k = k
+        self.score_field = score_field
+        self.score_index = score_index  # Authoritative in-process totals for score_field
+        self.positive_only = positive_only  # Only wallets with score_field > 0
+        self.docs: Dict[str, dict] = {}
+        self._keys = []
+        self.loaded = False
+        self.version = 0
+
+    def _key(self, doc: dict):
+        return (-get_field(doc, self.score_field, 0), doc["wallet_address"])
+
+    def load(self, docs):
+        """Replace the view with a fresh top-K read from the database"""
+        self.docs = {}
+        for doc in docs:
+            wallet_address = doc["wallet_address"]
+            # Submissions that landed while the query ran are already in the index
+            indexed = self.score_index.scores.get(wallet_address)
+            if indexed is not None:
+                set_field(doc, self.score_field, indexed)
+            self.docs[wallet_address] = doc
+        self._keys = sorted(self._key(doc) for doc in self.docs.values())
+        del self._keys[self.k:]
+        self.docs = {key[1]: self.docs[key[1]] for key in self._keys}
+        self.loaded = True
+        self.version += 1
+
+    def clear(self):
+        self.load([])
+
+    def qualifies(self, wallet_address: str, score: int) -> bool:
+        return len(self._keys) < self.k or (-score, wallet_address) < self._keys[-1]
+
+    def insert(self, doc: dict):
+        """Insert or replace a full document, evicting the tail beyond K"""
+        wallet_address = doc["wallet_address"]
+        current = self.docs.get(wallet_address)
+        if current is not None:
+            # Concurrent fetches can race; never replace a newer copy with an older one
+            if current.get("total_games", 0) > doc.get("total_games", 0):
+                return
+            self._keys.remove(self._key(current))
+        key = self._key(doc)
+        if len(self._keys) >= self.k and key > self._keys[-1]:
+            return
+        bisect.insort(self._keys, key)
+        self.docs[wallet_address] = doc
+        while len(self._keys) > self.k:
+            evicted = self._keys.pop()
+            self.docs.pop(evicted[1], None)
+        self.version += 1
+
+    def apply(self, wallet_address: str, update: dict, created: bool) -> bool:
+        """Patch the view with one upsert result.
+        Returns True if the wallet just entered the top K and its full document must be fetched."""
+        if not self.loaded:
+            return False
+        doc = self.docs.get(wallet_address)
+        if doc is not None:
+            self._keys.remove(self._key(doc))
+            apply_update_to_doc(doc, update, created)
+            bisect.insort(self._keys, self._key(doc))
+            self.version += 1
+            return False
+
+        score = self.score_index.scores.get(wallet_address)
+        if score is None or not self.qualifies(wallet_address, score):
+            return False
+        if created:
+            doc = apply_update_to_doc({}, update, created)
+            self.insert({field: value for field, value in doc.items() if field in LEADERBOARD_PROJECTION})
+            return False
+        return True
+
+    def top(self, limit: int):
+        return [self.docs[key[1]] for key in self._keys[:limit]]
+
+leaderboard_views: Dict[str, TopKLeaderboard] = {
+    "all": TopKLeaderboard(LEADERBOARD_TOP_K, "score", rank_index)
+}
+for _difficulty in DIFFICULTIES:
+    # Matches the partial index on scores.<difficulty> > 0
+    leaderboard_views[_difficulty] = TopKLeaderboard(
+        LEADERBOARD_TOP_K,
+        f"scores.{_difficulty}",
+        difficulty_rank_indexes[_difficulty],
+        positive_only=True
+    )
+
+async def load_leaderboard_view(view_key: str):
+    """Load a live view from the database (startup, or after a detected gap)"""
+    view = leaderboard_views[view_key]
+    view.load(await storage.top_k(
+        "leaderboard", view.score_field, view.k, LEADERBOARD_PROJECTION, positive_only=view.positive_only
+    ))
+
+def unload_leaderboard_views():
+    """Reload every live view from storage on its next read (the cached snapshot is served meanwhile)"""
+    for view in leaderboard_views.values():
+        view.loaded = False
+
+async def view_reconcile_loop():
+    while True:
+        await asyncio.sleep(LEADERBOARD_VIEW_RECONCILE_INTERVAL)
+        unload_leaderboard_views()
+
+async def apply_update_to_views(wallet_address: str, update: dict, created: bool):
+    """Patch every live view with a durable upsert"""
+    for view_key, view in leaderboard_views.items():
+        if not view.apply(wallet_address, update, created):
+            if view.loaded and len(view.docs) < min(view.k, len(view.score_index)):
+                view.loaded = False  # Gap: the view is missing wallets, reload on the next read
+            continue
+        # Wallet moved into the top K from outside: fetch its full document once
+        doc = await storage.find_one("leaderboard", {"wallet_address": wallet_address}, LEADERBOARD_PROJECTION)
+        if doc is None:
+            view.loaded = False  # Gap: reload on the next read
+            continue
+        set_field(doc, view.score_field, view.score_index.scores.get(wallet_address, get_field(doc, view.score_field, 0)))
+        view.insert(doc)
+
+def set_rank_index_scores(wallet_address: str, doc: Optional[dict]):
+    """Put a wallet's stored totals into the rank indexes (None: the wallet is gone)"""
+    if doc is None:
+        rank_index.discard(wallet_address)
+    else:
+        rank_index.set(wallet_address, doc.get("score", 0))
+    for difficulty, index in difficulty_rank_indexes.items():
+        value = get_field(doc or {}, f"scores.{difficulty}", 0)
+        if value > 0:
+            index.set(wallet_address, value)
+        else:
+            index.discard(wallet_address)
+
+async def rebuild_rank_index():
+    """Rebuild the in-memory rank indexes from the leaderboard storage
+    The scan may read a wallet updated meanwhile before or after its update, so those
+    wallets are re-read once the new index is in place. Returns the wallets indexed."""
+    global rank_index_touched
+    async with rank_index_lock:
+        started = time.perf_counter()
+        rank_index_touched = set()
+        try:
+            items = []
+            difficulty_items = {difficulty: [] for difficulty in DIFFICULTIES}
+            async for doc in storage.scan(
+                "leaderboard", {"_id": 0, "wallet_address": 1, "score": 1, "scores": 1}, batch_size=5000
+            ):
+                items.append((doc["wallet_address"], doc.get("score", 0)))
+                for difficulty, value in (doc.get("scores") or {}).items():
+                    if difficulty in difficulty_items and value > 0:
+                        difficulty_items[difficulty].append((doc["wallet_address"], value))
+            touched, rank_index_touched = rank_index_touched, None
+            # Wallets whose totals this worker had wrong (other pods' writes), for the logs
+            drifted = sum(1 for wallet, score in items if wallet not in touched and rank_index.scores.get(wallet) != score)
+            rank_index.load(items)
+            for difficulty, index in difficulty_rank_indexes.items():
+                index.load(difficulty_items[difficulty])
+        finally:
+            rank_index_touched = None
+        for wallet_address in touched:
+            set_rank_index_scores(
+                wallet_address,
+                await storage.find_one("leaderboard", {"wallet_address": wallet_address}, {"_id": 0, "score": 1, "scores": 1})
+            )
+        rank_index_state["rebuilds"] += 1
+        rank_index_state["last_rebuild_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        rank_index_state["last_drifted"] = drifted
+        rank_index_state["rebuilt_at"] = datetime.utcnow()
+        return len(rank_index)
+
+async def rank_index_reconcile_loop():
+    while True:
+        await asyncio.sleep(RANK_INDEX_RECONCILE_INTERVAL)
+        try:
+            indexed = await rebuild_rank_index()
+            log_event(
+                logger, logging.INFO, "Rank index reconciled",
+                wallets=indexed, drifted=rank_index_state["last_drifted"], rebuild_ms=rank_index_state["last_rebuild_ms"]
+            )
+        except Exception as e:
+            log_event(logger, logging.WARNING, "Failed to reconcile rank index", error=str(e))
+
+def reset_local_leaderboard_state():
+    """Drop this worker's in-memory leaderboard state when a new (empty) season starts or the board is reset"""
+    for field in pending_stats:
+        pending_stats[field] = 0
+    stats_cache["data"] = None
+    invalidate_leaderboard_cache()
+    rank_index.clear()
+    for index in difficulty_rank_indexes.values():
+        index.clear()
+    for view in leaderboard_views.values():
+        view.clear()
+    player_cache.clear()
+
+# Cross-worker coherence
+async def handle_shared_event(event: dict):
+    """Apply another worker's event to this worker's in-memory state"""
+    if event["type"] == "update":
+        if event.get("season", 1) != storage.active_season:
+            return  # Written to a season this worker has already left (or not yet reached)
+        apply_update_to_rank_indexes(event["wallet_address"], event["update"])
+        player_cache.invalidate(event["wallet_address"])
+        await apply_update_to_views(event["wallet_address"], event["update"], event["created"])
+    elif event["type"] == "season":
+        await load_season_state()
+    elif event["type"] == "reset":
+        if event.get("season", 1) == storage.active_season:
+            reset_local_leaderboard_state()
+    elif event["type"] == "review":
+        await refresh_flagged_wallets()
+
+async def resync_shared_state():
+    """Reload local state from storage after the broker connection dropped (events may be lost)"""
+    await load_season_state()
+    await rebuild_rank_index()
+    unload_leaderboard_views()
+    invalidate_leaderboard_cache()
+    player_cache.clear()
+
+shared_state = (
+    SharedState(
+        SHARED_STATE_SOCKET,
+        {"wallet": rate_limit_store, "ip": ip_rate_limit_store},
+        handle_shared_event,
+        resync_shared_state,
+        SHARED_STATE_TIMEOUT_MS / 1000
+    )
+    if SHARED_STATE_ENABLED else None
+)
+
+# Seasons
+class WriteGate:
+    """Lets submissions run concurrently, and lets a season switch (or the journal's final
+    catch-up round) pause them briefly.
+    closed() waits for in-flight writes and holds new ones back (they wait, they don't fail)
+    until the switch is done, so no write straddles two seasons."""
+
+    def __init__(self):
+        self._writers = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._open = asyncio.Event()
+        self._open.set()
+        self._switch_lock = asyncio.Lock()
+        self.stats = {"switches": 0, "writes_held": 0, "last_closed_ms": 0.0, "max_closed_ms": 0.0}
+
+    @asynccontextmanager
+    async def write(self):
+        if not self._open.is_set():
+            self.stats["writes_held"] += 1
+        while not self._open.is_set():
+            await self._open.wait()
+        self._writers += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._writers -= 1
+            if self._writers == 0:
+                self._idle.set()
+
+    @asynccontextmanager
+    async def closed(self):
+        async with self._switch_lock:
+            started = time.perf_counter()
+            self._open.clear()
+            try:
+                await self._idle.wait()
+                yield
+            finally:
+                self._open.set()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.stats["switches"] += 1
+                self.stats["last_closed_ms"] = round(elapsed_ms, 3)
+                self.stats["max_closed_ms"] = round(max(self.stats["max_closed_ms"], elapsed_ms), 3)
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "writes_in_flight": self._writers, "open": self._open.is_set()}
+
+write_gate = WriteGate()
+season_history: Dict[str, dict] = {}  # "N" -> {started_at, ended_at, status}, refreshed from storage
+season_watch_task: Optional[asyncio.Task] = None
+
+async def activate_season(season: int):
+    """Point this worker's writes and in-memory state at `season`
+    Call with the write gate closed: batched writes still pending land in the old season first"""
+    for batcher in (score_batcher, window_batcher):
+        if batcher is not None:
+            await batcher.close()
+    try:
+        await flush_stats_counters()
+    except Exception as e:
+        log_event(logger, logging.WARNING, "Failed to flush stats counters", error=str(e))
+    storage.activate_season(season)
+    reset_local_leaderboard_state()
+
+async def load_season_state():
+    """Refresh the season history and follow a rollover made by another process"""
+    state = await storage.load_seasons()
+    season_history.clear()
+    season_history.update(state.get("seasons") or {})
+    season = state.get("current", 1)
+    if season == storage.active_season:
+        return
+    async with write_gate.closed():
+        if season == storage.active_season:
+            return
+        previous = storage.active_season
+        await activate_season(season)
+    # Other pods may already have written to the new season
+    await rebuild_rank_index()
+    unload_leaderboard_views()
+    log_event(logger, logging.INFO, "Season switched", previous=previous, season=season)
+
+async def rollover_season() -> Optional[dict]:
+    """Start the next season: build its collection, swap writes over, archive the current one
+    Returns {"previous", "season"}, or None if another process rolled over first"""
+    state = await storage.load_seasons()
+    previous = storage.active_season
+    if state.get("current", 1) != previous:
+        return None
+    season = max(int(number) for number in state.get("seasons", {"1": None})) + 1
+    
+    # Collection and indexes are built while submissions keep going to the current season
+    await storage.prepare_season(season)
+    async with write_gate.closed():
+        if storage.active_season != previous:
+            return None
+        # From here on, writes other processes still send to the ending season fail and follow the switch
+        await storage.archive_season(previous)
+        try:
+            switched = await storage.switch_season(previous, season, "archived", datetime.utcnow())
+        except Exception:
+            try:
+                await storage.unarchive_season(previous)
+            except Exception as e:
+                log_event(logger, logging.ERROR, "Failed to unarchive season after a failed rollover", season=previous, error=str(e))
+            raise
+        if not switched:
+            return None  # Another process switched from the same season (and archived it too)
+        await activate_season(season)
+    
+    await load_season_state()
+    if shared_state is not None:
+        shared_state.publish({"type": "season", "season": season})
+    log_event(
+        logger, logging.INFO, "Season rolled over",
+        previous=previous, season=season, switch_ms=write_gate.stats["last_closed_ms"]
+    )
+    return {"previous": previous, "season": season}
+
+async def follow_season_switch():
+    """A write was rejected by an archived season: switch to the season another process started
+    The history document changes just after the table is archived, so wait briefly for it"""
+    previous = storage.active_season
+    deadline = time.monotonic() + SEASON_FOLLOW_TIMEOUT
+    while True:
+        await load_season_state()
+        if storage.active_season != previous or time.monotonic() >= deadline:
+            return
+        await asyncio.sleep(0.05)
+
+async def season_watch_loop():
+    while True:
+        await asyncio.sleep(SEASON_CHECK_INTERVAL)
+        try:
+            await load_season_state()
+        except Exception as e:
+            log_event(logger, logging.WARNING, "Failed to check season", error=str(e))
+
+def season_snapshot() -> dict:
+    return {
+        "current": storage.active_season,
+        "seasons": len(season_history),
+        "check_interval": SEASON_CHECK_INTERVAL,
+        **write_gate.snapshot()
+    }
+
+# Anomaly review
+anomaly_refresh_task: Optional[asyncio.Task] = None
+
+async def refresh_flagged_wallets() -> int:
+    """Reload the flagged wallets from the review table; cached boards are rebuilt if they changed"""
+    wallets = await load_flagged_wallets(storage)
+    if wallets != flagged_wallets:
+        flagged_wallets.clear()
+        flagged_wallets.update(wallets)
+        if ANOMALY_EXCLUDE:
+            # Views keep extra rows so K remain once the flagged ones are filtered out
+            for view in leaderboard_views.values():
+                view.k = top_k_fetch_limit()
+            unload_leaderboard_views()
+            invalidate_leaderboard_cache()
+    anomaly_state["flagged_wallets"] = len(wallets)
+    anomaly_state["refreshed_at"] = datetime.utcnow()
+    return len(wallets)
+
+async def anomaly_refresh_loop():
+    while True:
+        await asyncio.sleep(ANOMALY_REFRESH_INTERVAL)
+        try:
+            await refresh_flagged_wallets()
+        except Exception as e:
+            log_event(logger, logging.WARNING, "Failed to refresh flagged wallets", error=str(e))
+
+@contextmanager
+def startup_phase(name: str):
+    """Time one startup phase (reported by the health endpoints)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_state["phases_ms"][name] = round((time.perf_counter() - started) * 1000, 3)
+
+async def warm_leaderboard_cache() -> int:
+    """Build and cache every leaderboard snapshot (all-time, per difficulty, current windows)
+    so the first requests after boot are cache hits"""
+    now = datetime.utcnow()
+    view_keys = list(leaderboard_views) + [current_window(window, now)[0] for window in LEADERBOARD_WINDOWS]
+    await asyncio.gather(*[get_leaderboard_snapshot(view_key) for view_key in view_keys])
+    return len(view_keys)
 
-@app.on_event("startup")
 async def startup_event():
-    """Initialize database indexes for optimal performance"""
+    """Bring the worker up: schema migrations, in-memory indexes, optional cache warm-up"""
+    started = time.perf_counter()
+    with startup_phase("migrations"):
+        try:
+            applied = await storage.setup()
+            startup_state["schema_migrations"] = applied
+            log_event(
+                logger, logging.INFO, "Schema migrations applied" if applied else "Schema up to date",
+                storage_engine=storage.name, schema_version=SCHEMA_VERSION, applied=applied
+            )
+        except Exception as e:
+            log_event(logger, logging.WARNING, "Failed to migrate schema", error=str(e))
+
+    with startup_phase("seasons"):
+        try:
+            await load_season_state()
+            log_event(logger, logging.INFO, "Season loaded", season=storage.active_season)
+        except Exception as e:
+            log_event(logger, logging.WARNING, "Failed to load season", error=str(e))
+
     try:
-        # Create indexes for fast queries and concurrent operations
-        await leaderboard_collection.create_index([("score", -1)])  # Descending score for ranking
-        await leaderboard_collection.create_index([("wallet_address", 1)], unique=True)  # Unique wallet with fast lookup
-        await leaderboard_collection.create_index([("last_difficulty", 1)])  # Filter by difficulty
-        await leaderboard_collection.create_index([("last_played", -1)])  # Recent activity
-        await leaderboard_collection.create_index([("score", -1), ("last_played", -1)])  # Compound index for leaderboard
-        await leaderboard_collection.create_index([("total_games", -1)])  # Most active players
+        # Load the rank index so rank lookups never scan the collection
+        with startup_phase("rank_index"):
+            indexed = await rebuild_rank_index()
+        log_event(logger, logging.INFO, "Rank index loaded", wallets=indexed)
         
-        print("✓ Database indexes created successfully (with unique wallet constraint)")
+        # Load live top-K views so leaderboard reads never hit Mongo
+        with startup_phase("views"):
+            for view_key in leaderboard_views:
+                await load_leaderboard_view(view_key)
+        log_event(logger, logging.INFO, "Leaderboard views loaded", views=list(leaderboard_views))
+    except Exception as e:
+        log_event(logger, logging.WARNING, "Failed to load rank index", error=str(e))
+    
+    with startup_phase("stats"):
+        try:
+            await seed_stats_counters()
+        except Exception as e:
+            log_event(logger, logging.WARNING, "Failed to seed stats counters", error=str(e))
+    
+    with startup_phase("review"):
+        try:
+            flagged = await refresh_flagged_wallets()
+            log_event(logger, logging.INFO, "Flagged wallets loaded", wallets=flagged, exclude=ANOMALY_EXCLUDE)
+        except Exception as e:
+            log_event(logger, logging.WARNING, "Failed to load flagged wallets", error=str(e))
+    
+    if submission_journal is not None:
+        with startup_phase("journal"):
+            try:
+                found = await submission_journal.open()
+                log_event(logger, logging.INFO, "Submission journal opened", directory=JOURNAL_DIR, depth=found)
+            except Exception as e:
+                log_event(logger, logging.WARNING, "Failed to open submission journal", error=str(e))
+    
+    if shared_state is not None:
+        with startup_phase("shared_state"):
+            try:
+                await shared_state.start()
+                log_event(logger, logging.INFO, "Shared state connected", role=shared_state.role, socket=SHARED_STATE_SOCKET)
+            except Exception as e:
+                log_event(logger, logging.WARNING, "Failed to start shared state", error=str(e))
+    
+    if STARTUP_WARMUP:
+        with startup_phase("warmup"):
+            try:
+                warmed = await warm_leaderboard_cache()
+                log_event(logger, logging.INFO, "Leaderboard cache warmed", snapshots=warmed)
+            except Exception as e:
+                log_event(logger, logging.WARNING, "Failed to warm leaderboard cache", error=str(e))
+    
+    global stats_flush_task, event_loop_lag_task, season_watch_task, anomaly_refresh_task, journal_replay_task
+    global rank_index_reconcile_task, view_reconcile_task
+    stats_flush_task = asyncio.create_task(stats_flush_loop())
+    run_history.start()
+    if RANK_INDEX_RECONCILE_INTERVAL > 0:
+        rank_index_reconcile_task = asyncio.create_task(rank_index_reconcile_loop())
+    if LEADERBOARD_VIEW_RECONCILE_INTERVAL > 0:
+        view_reconcile_task = asyncio.create_task(view_reconcile_loop())
+    if SEASON_CHECK_INTERVAL > 0:
+        season_watch_task = asyncio.create_task(season_watch_loop())
+    if ANOMALY_REFRESH_INTERVAL > 0:
+        anomaly_refresh_task = asyncio.create_task(anomaly_refresh_loop())
+    if submission_journal is not None:
+        journal_replay_task = asyncio.create_task(journal_replay_loop())
+    if ENABLE_METRICS:
+        event_loop_lag_task = asyncio.create_task(event_loop_lag_monitor())
+    
+    startup_state["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    log_event(logger, logging.INFO, "Startup complete", total_ms=startup_state["total_ms"], phases_ms=startup_state["phases_ms"])
+
+async def shutdown_event():
+    """Flush pending write-behind batches and counters before the worker exits"""
+    for batcher in (score_batcher, window_batcher):
+        if batcher is not None:
+            await batcher.close()
+    for task in (
+        stats_flush_task, event_loop_lag_task, season_watch_task, anomaly_refresh_task, journal_replay_task,
+        rank_index_reconcile_task, view_reconcile_task
+    ):
+        if task is not None:
+            task.cancel()
+    if submission_journal is not None:
+        try:
+            await submission_journal.close()  # Unreplayed records stay on disk for the next start
+        except Exception as e:
+            log_event(logger, logging.WARNING, "Failed to close submission journal", error=str(e))
+    try:
+        await flush_stats_counters()
     except Exception as e:
-        print(f"⚠ Warning: Failed to create indexes: {e}")
+        log_event(logger, logging.WARNING, "Failed to flush stats counters", error=str(e))
+    try:
+        await run_history.close()
+    except Exception as e:
+        log_event(logger, logging.WARNING, "Failed to flush run history", error=str(e))
+    if shared_state is not None:
+        await shared_state.close()
+    await storage.close()
+
+event_loop_lag_task: Optional[asyncio.Task] = None
+
+async def event_loop_lag_monitor():
+    """Sample how late the event loop runs a timer (blocking work shows up here)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+        event_loop_lag.observe(max(0.0, loop.time() - started - EVENT_LOOP_LAG_INTERVAL))
+
+def collect_state_metrics():
+    """Copy in-process counters into metrics right before a scrape"""
+    for cache_key, stats in list(leaderboard_cache_stats.items()):
+        view = cache_key[len("leaderboard_"):]
+        for event, value in stats.items():
+            leaderboard_cache_events.labels(view, event).set(value)
+    limiters = {"wallet": rate_limit_store, "ip": ip_rate_limit_store}
+    for scope, limiter in limiters.items():
+        if limiter is None:
+            continue
+        for event, value in limiter.stats.items():
+            rate_limit_events.labels(scope, event).set(value)
+        rate_limit_keys.labels(scope).set(len(limiter))
+    for name, batcher in (("scores", score_batcher), ("windows", window_batcher)):
+        if batcher is None:
+            continue
+        for stat, value in batcher.snapshot().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                write_behind_stats.labels(name, stat).set(value)
+    rank_index_size.set(len(rank_index))
+    for event, value in player_cache.stats.items():
+        player_cache_events.labels(event).set(value)
+    for encoding, stats in list(leaderboard_compression_stats["responses"].items()):
+        leaderboard_response_bytes.labels(encoding, "sent").set(stats["bytes_sent"])
+        leaderboard_response_bytes.labels(encoding, "saved").set(stats["bytes_saved"])
+    for name, limit in admission_limits.items():
+        admission_requests.labels(name, "active").set(limit.active)
+        admission_requests.labels(name, "queued").set(limit.queued)
+    if submission_journal is not None:
+        for stat, value in submission_journal.snapshot().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                submission_journal_stats.labels(stat).set(value)
+    store_breaker_open.set(1 if store_breaker.is_open else 0)
+
+metrics_registry.add_collector(collect_state_metrics)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics in text exposition format"""
+    return Response(
+        content=metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+async def store_health() -> dict:
+    """Degraded mode at a glance: the breaker's view of the store, confirmed by one indexed read"""
+    reachable = not store_breaker.is_open
+    if reachable:
+        try:
+            await asyncio.wait_for(storage.find_one("stats", {"_id": stats_doc_id()}, {"_id": 1}), HEALTH_STORE_TIMEOUT)
+        except Exception:
+            reachable = False
+    return {
+        "reachable": reachable,
+        "journal_depth": submission_journal.depth if submission_journal is not None else 0
+    }
+
+async def health_response(service: str):
+    """200 while the worker can take submissions: the store is reachable, or they go to the journal
+    ("degraded"). 503 once it can't, so the load balancer routes around it.
+    Requests are only served once startup has finished (lifespan), so there is no starting state."""
+    store = await store_health()
+    status = "healthy" if store["reachable"] else "degraded" if submission_journal is not None else "unavailable"
+    return JSONResponse(status_code=503 if status == "unavailable" else 200, content={
+        "status": status, "service": service, "startup": startup_state, "store": store
+    })
 
 @app.get("/")
 async def root():
@@ -149,8 +2061,8 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health check endpoint"""
-    return {"status": "healthy", "service": "degen-force-backend"}
+    """Health check endpoint (503 while the store is unreachable and there is no journal)"""
+    return await health_response("degen-force-backend")
 
 @app.get("/api/")
 async def api_root():
@@ -159,44 +2071,155 @@ async def api_root():
 
 @app.get("/api/health")
 async def api_health():
-    """API health check endpoint"""
-    return {"status": "healthy", "service": "degen-force-api"}
+    """API health check endpoint (503 while the store is unreachable and there is no journal)"""
+    return await health_response("degen-force-api")
 
 @app.get("/api/stats")
 async def get_stats():
-    """Get system statistics for monitoring"""
+    """Get system statistics for monitoring
+    O(1): counters are maintained at write time and the DB read is cached briefly"""
     try:
-        total_scores = await leaderboard_collection.count_documents({})
-        unique_players = len(await leaderboard_collection.distinct("wallet_address"))
+        now = time.time()
+        if stats_cache["data"] is None or now - stats_cache["timestamp"] >= STATS_CACHE_TTL:
+            counters = await storage.find_one("stats", {"_id": stats_doc_id()}) or {}
+            stats_cache["data"] = {
+                "total_scores": await storage.estimated_count("leaderboard"),
+                "unique_players": counters.get("unique_players", 0),
+                "total_games": counters.get("total_games", 0)
+            }
+            stats_cache["timestamp"] = now
+        counters = stats_cache["data"]
         
-        # Get top score
-        top_score_doc = await leaderboard_collection.find_one(
-            {},
-            {"score": 1, "_id": 0},
-            sort=[("score", -1)]
-        )
-        top_score = top_score_doc["score"] if top_score_doc else 0
+        # Top score from the in-memory rank index (first wallet shown on the board)
+        hidden = hidden_wallets()
+        top = [row for row in rank_index.window(0, 1 + len(hidden)) if row[1] not in hidden]
+        top_score = top[0][2] if top else 0
         
         return {
             "status": "success",
             "stats": {
-                "total_scores": total_scores,
-                "unique_players": unique_players,
+                "total_scores": counters["total_scores"],
+                # Include this worker's not-yet-flushed deltas
+                "unique_players": counters["unique_players"] + pending_stats["unique_players"],
+                "total_games": counters["total_games"] + pending_stats["total_games"],
                 "top_score": top_score,
-                "cache_size": len(leaderboard_cache)
+                "storage_engine": storage.name,
+                "cache_size": len(leaderboard_cache),
+                "leaderboard_cache": dict(leaderboard_cache_stats),
+                "leaderboard_compression": compression_snapshot(),
+                "player_cache": player_cache.snapshot(),
+                "rate_limit": {
+                    "wallet": rate_limit_store.snapshot(),
+                    "ip": ip_rate_limit_store.snapshot() if ip_rate_limit_store else {"enabled": False}
+                },
+                "write_behind": score_batcher.snapshot() if score_batcher else {"enabled": False},
+                "write_behind_windows": window_batcher.snapshot() if window_batcher else {"enabled": False},
+                "shared_state": shared_state.snapshot() if shared_state else {"enabled": False},
+                "run_history": run_history.snapshot(),
+                "rank_index": {"wallets": len(rank_index), "reconcile_interval": RANK_INDEX_RECONCILE_INTERVAL, **rank_index_state},
+                "season": season_snapshot(),
+                "anomalies": {"exclude": ANOMALY_EXCLUDE, **anomaly_state},
+                "journal": journal_snapshot(),
+                "admission": (
+                    {name: limit.snapshot() for name, limit in admission_limits.items()}
+                    if ADMISSION_ENABLED else {"enabled": False}
+                ),
+                "logging": logging_stats()
             }
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
 
+def queued_response() -> JSONResponse:
+    """202 for a submission journaled locally (status stays "success": it will be applied)"""
+    return JSONResponse(status_code=202, content={
+        "status": "success",
+        "queued": True,
+        "message": "Score received; it will appear on the leaderboard shortly"
+    })
+
+async def write_submission(entry: LeaderboardEntry, ip_address: str):
+    """Write one validated, rate-limited run (call inside write_gate.write())
+    Raises SeasonArchived if another process ended the season this worker writes to."""
+    current_time = datetime.utcnow()
+    
+    # Use atomic upsert to handle concurrent submissions
+    # This prevents race conditions when multiple games finish simultaneously
+    # (batched into a bulk_write when write-behind mode is enabled)
+    update = build_score_update(entry, current_time, ip_address)
+    window_updates = build_window_updates(entry, current_time)
+    op_id = new_op_id()
+    if submissions_journaled():
+        run = build_run_record(entry, current_time, ip_address)
+        await submission_journal.append([journal_record(entry.wallet_address, update, window_updates, [run])])
+        return queued_response()
+    try:
+        created = await persist_score_update(entry.wallet_address, update, op_id)
+    except Exception as e:
+        if not can_journal(e):
+            raise
+        # Store unreachable: queue the run on local disk rather than lose the score
+        record_store_failure(e)
+        run = build_run_record(entry, current_time, ip_address)
+        await submission_journal.append([journal_record(entry.wallet_address, update, window_updates, [run], op_id)])
+        return queued_response()
+    record_store_success()
+    
+    # Buckets are written only once the all-time total is saved, so a failed
+    # submission (which the client retries) never leaves them counted
+    try:
+        await persist_window_updates(window_updates, {entry.wallet_address: op_id})
+    except Exception as e:
+        if can_journal(e):
+            await submission_journal.append([journal_record(entry.wallet_address, None, window_updates, op_id=op_id)])
+        else:
+            # The all-time total is saved; don't fail (and invite a double-counting retry) over a bucket
+            log_event(
+                logger, logging.WARNING, "Failed to update window buckets",
+                wallet=entry.wallet_address[:8], error=str(e)
+            )
+    
+    # Keep the in-memory rank indexes in step with the $inc
+    total_score = apply_update_to_rank_indexes(entry.wallet_address, update)
+    
+    # Check if this was an insert or update
+    if created:
+        message = "New player score created"
+    else:
+        message = f"Score updated (accumulated): {total_score} pts"
+    log_event(
+        logger, logging.INFO, "Score submitted", sampled=True,
+        wallet=entry.wallet_address[:8], score=entry.score, total=total_score, new_player=created
+    )
+    
+    record_submission_stats(created, 1, entry.score)
+    player_cache.invalidate(entry.wallet_address)
+    run_history.add(build_run_record(entry, current_time, ip_address))
+    
+    # Patch live top-K views in place (window snapshots refresh on their soft TTL)
+    await apply_update_to_views(entry.wallet_address, update, created)
+    if shared_state is not None:
+        shared_state.publish({
+            "type": "update", "wallet_address": entry.wallet_address, "update": update, "created": created,
+            "season": storage.active_season
+        })
+
+    return {
+        "status": "success",
+        "message": message
+    }
+
 @app.post("/api/leaderboard/submit")
 async def submit_score(entry: LeaderboardEntry, request: Request):
     """Submit a score to the leaderboard - requires wallet address
     Rate limited to prevent spam and abuse
-    Accumulates scores for the same wallet address"""
+    Accumulates scores for the same wallet address
+    While the store is unreachable the run is journaled locally and acknowledged as queued (202)"""
     try:
+        ip_address = request.client.host if request.client else "unknown"
+        
         # Rate limiting check
-        if not await check_rate_limit(entry.wallet_address):
+        if not await check_rate_limit(entry.wallet_address, ip_address):
             raise HTTPException(
                 status_code=429, 
                 detail=f"Rate limit exceeded. Max {RATE_LIMIT_MAX_REQUESTS} submissions per {RATE_LIMIT_WINDOW} seconds"
@@ -206,158 +2229,993 @@ async def submit_score(entry: LeaderboardEntry, request: Request):
         if not entry.wallet_address or len(entry.wallet_address) < 10:
             raise HTTPException(status_code=400, detail="Valid wallet address is required")
         
-        current_time = datetime.utcnow()
+        # Held briefly (not failed) while a season rollover swaps the collection
+        try:
+            async with write_gate.write():
+                return await write_submission(entry, ip_address)
+        except SeasonArchived:
+            # Another process ended this season: switch to the new one and write there
+            await follow_season_switch()
+        async with write_gate.write():
+            return await write_submission(entry, ip_address)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error submitting score", exc_info=e)
+        raise HTTPException(status_code=500, detail="Failed to submit score")
+
+async def write_submission_batch(accepted: Dict[str, list], results: list, ip_address: str, current_time: datetime) -> set:
+    """Write the accepted runs of a batch (wallet -> [(index, entry)]) and fill in their results
+    (call inside write_gate.write()). Returns the wallets rejected by an archived season, results unset."""
+    # One merged update per wallet and per window bucket
+    updates = {}
+    window_updates = {}
+    for wallet_address, runs in accepted.items():
+        for _, entry in runs:
+            update = build_score_update(entry, current_time, ip_address)
+            updates[wallet_address] = merge_score_updates(updates[wallet_address], update) if wallet_address in updates else update
+            for window_id, filter, window_update in build_window_updates(entry, current_time):
+                key = (window_id, wallet_address)
+                if key in window_updates:
+                    window_update = merge_score_updates(window_updates[key][2], window_update)
+                window_updates[key] = (window_id, filter, window_update)
+    
+    # Wallets whose runs go to the local journal (store unreachable), wallets whose totals were
+    # saved, and whether those wallets' buckets have to be journaled too
+    queued, saved, queue_windows = set(), set(), False
+    created_by_wallet = {}
+    archived = set()
+    op_ids = {wallet_address: new_op_id() for wallet_address in updates}
+    if updates and submissions_journaled():
+        queued = set(updates)
+    elif updates:
+        try:
+            created_by_wallet = await persist_score_updates(updates, op_ids)
+        except Exception as e:
+            if not can_journal(e):
+                raise
+            record_store_failure(e)
+            queued = set(updates)
+        else:
+            queued = {wallet for wallet, created in created_by_wallet.items() if isinstance(created, Exception) and can_journal(created)}
+            saved = {wallet for wallet, created in created_by_wallet.items() if not isinstance(created, Exception)}
+            if queued:
+                record_store_failure(created_by_wallet[next(iter(queued))])
+            else:
+                record_store_success()
+    
+        # Buckets only for wallets whose totals are saved, and only once they are
+        saved_windows = [value for (_, wallet), value in window_updates.items() if wallet in saved]
+        if saved_windows:
+            try:
+                await persist_window_updates(saved_windows, op_ids)
+            except Exception as e:
+                queue_windows = can_journal(e)
+                if not queue_windows:
+                    log_event(logger, logging.WARNING, "Failed to update window buckets", wallets=len(saved), error=str(e))
+    
+    if queued or queue_windows:
+        records = []
+        for wallet_address, runs in accepted.items():
+            wallet_windows = [value for (_, wallet), value in window_updates.items() if wallet == wallet_address]
+            if wallet_address in queued:
+                run_records = [build_run_record(entry, current_time, ip_address) for _, entry in runs]
+                records.append(journal_record(wallet_address, updates[wallet_address], wallet_windows, run_records, op_ids[wallet_address]))
+            elif wallet_address in saved and queue_windows:
+                records.append(journal_record(wallet_address, None, wallet_windows, op_id=op_ids[wallet_address]))
+        await submission_journal.append(records)
+    
+    for wallet_address, runs in accepted.items():
+        if wallet_address in queued:
+            for index, entry in runs:
+                results[index] = {"index": index, "status": "accepted", "wallet_address": wallet_address, "queued": True}
+            continue
+        created = created_by_wallet[wallet_address]
+        if isinstance(created, SeasonArchived):
+            archived.add(wallet_address)  # Retried by the caller once it follows the switch
+            continue
+        if isinstance(created, Exception):
+            logger.error("Error submitting batched score", exc_info=created)
+            for index, entry in runs:
+                results[index] = {"index": index, "status": "error", "wallet_address": wallet_address, "detail": "Failed to submit score"}
+            continue
+    
+        update = updates[wallet_address]
+        total_score = apply_update_to_rank_indexes(wallet_address, update)
+        record_submission_stats(created, len(runs), update["$inc"]["score"])
+        player_cache.invalidate(wallet_address)
+        for index, entry in runs:
+            run_history.add(build_run_record(entry, current_time, ip_address))
+            results[index] = {"index": index, "status": "accepted", "wallet_address": wallet_address, "total_score": total_score}
+        await apply_update_to_views(wallet_address, update, created)
+        if shared_state is not None:
+            shared_state.publish({
+                "type": "update", "wallet_address": wallet_address, "update": update, "created": created,
+                "season": storage.active_season
+            })
+    return archived
+
+@app.post("/api/leaderboard/submit-batch")
+async def submit_score_batch(batch: LeaderboardBatch, request: Request):
+    """Submit several finished runs at once (e.g. queued while offline)
+    Each run is validated and rate limited on its own; runs for the same wallet
+    are merged into one accumulate-upsert and all wallets are written in one bulk write.
+    Runs the store can't take right now are journaled and reported accepted with "queued": true.
+    Returns one result per entry, in order."""
+    try:
         ip_address = request.client.host if request.client else "unknown"
+        current_time = datetime.utcnow()
+        results = [None] * len(batch.entries)
+        accepted: Dict[str, list] = {}  # wallet -> [(index, entry)]
         
-        # Use atomic upsert to handle concurrent submissions
-        # This prevents race conditions when multiple games finish simultaneously
-        result = await leaderboard_collection.update_one(
-            {"wallet_address": entry.wallet_address},
-            {
-                "$inc": {
-                    "score": entry.score,  # Atomically increment score
-                    "total_games": 1  # Atomically increment game count
-                },
-                "$set": {
-                    "last_survival_time_seconds": entry.survival_time_seconds,
-                    "last_enemies_killed": entry.enemies_killed,
-                    "last_biome_reached": entry.biome_reached,
-                    "last_difficulty": entry.difficulty,
-                    "last_played": current_time,
-                    "ip_address": ip_address
-                },
-                "$max": {
-                    "best_survival_time_seconds": entry.survival_time_seconds,
-                    "best_enemies_killed": entry.enemies_killed
-                },
-                "$setOnInsert": {
-                    "timestamp": current_time,  # Only set on first insert
-                    "wallet_address": entry.wallet_address
-                }
-            },
-            upsert=True  # Create document if it doesn't exist
-        )
+        # Validate every entry first, so invalid runs never use up rate-limit budget
+        entries = []
+        for index, raw in enumerate(batch.entries):
+            try:
+                entries.append((index, LeaderboardEntry(**raw)))
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(str(part) for part in error["loc"])
+                results[index] = {"index": index, "status": "invalid", "detail": f"{field}: {error['msg']}" if field else error["msg"]}
         
-        # Check if this was an insert or update
-        if result.upserted_id:
-            message = "New player score created"
-            print(f"✓ New player: {entry.wallet_address[:8]}... - {entry.score} pts")
-        else:
-            # Fetch updated score for logging
-            updated = await leaderboard_collection.find_one(
-                {"wallet_address": entry.wallet_address},
-                {"score": 1, "total_games": 1}
-            )
-            total_score = updated.get("score", entry.score)
-            total_games = updated.get("total_games", 1)
-            message = f"Score updated (accumulated): {total_score} pts"
-            print(f"✓ {entry.wallet_address[:8]}... - Added {entry.score} pts → Total: {total_score} pts ({total_games} games)")
+        # Rate limits count every run, exactly as if it had been submitted alone
+        for index, entry in entries:
+            if not await check_rate_limit(entry.wallet_address, ip_address):
+                results[index] = {
+                    "index": index, "status": "rate_limited", "wallet_address": entry.wallet_address,
+                    "detail": f"Rate limit exceeded. Max {RATE_LIMIT_MAX_REQUESTS} submissions per {RATE_LIMIT_WINDOW} seconds"
+                }
+                continue
+            accepted.setdefault(entry.wallet_address, []).append((index, entry))
         
-        # Invalidate cache for fresh leaderboard
-        invalidate_leaderboard_cache()
+        async with write_gate.write():
+            archived = await write_submission_batch(accepted, results, ip_address, current_time)
+        if archived:
+            # Another process ended this season: switch to the new one and write those wallets there
+            await follow_season_switch()
+            async with write_gate.write():
+                archived = await write_submission_batch(
+                    {wallet_address: accepted[wallet_address] for wallet_address in archived}, results, ip_address, current_time
+                )
+            if archived:
+                log_event(logger, logging.ERROR, "Season still archived after following the switch", wallets=len(archived))
+            for wallet_address in archived:
+                for index, _ in accepted[wallet_address]:
+                    results[index] = {"index": index, "status": "error", "wallet_address": wallet_address, "detail": "Failed to submit score"}
         
+        accepted_count = sum(1 for result in results if result["status"] == "accepted")
+        queued_count = sum(1 for result in results if result.get("queued"))
+        log_event(
+            logger, logging.INFO, "Score batch submitted", sampled=True,
+            entries=len(results), accepted=accepted_count, queued=queued_count, wallets=len(accepted)
+        )
         return {
             "status": "success",
-            "message": message
+            "accepted": accepted_count,
+            "queued": queued_count,
+            "rejected": len(results) - accepted_count,
+            "results": results
         }
     except HTTPException:
         raise
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"✗ Error submitting score: {e}")
-        raise HTTPException(status_code=500, detail="Failed to submit score")
+        logger.error("Error submitting score batch", exc_info=e)
+        raise HTTPException(status_code=500, detail="Failed to submit score batch")
+
+def format_leaderboard_entry(entry: dict, rank: int, difficulty: Optional[str] = None) -> dict:
+    """Format a leaderboard document as a ranked response row
+    For a per-difficulty view, score and games are that difficulty's totals"""
+    # Format survival time (use best time)
+    seconds = entry.get("best_survival_time_seconds", 0)
+    minutes = seconds // 60
+    secs = seconds % 60
+    survival_time = f"{minutes:02d}:{secs:02d}"
+    
+    if difficulty:
+        score = get_field(entry, f"scores.{difficulty}", 0)
+        total_games = get_field(entry, f"games.{difficulty}", 0)
+    else:
+        score = entry["score"]
+        total_games = entry.get("total_games", 1)
+    
+    return {
+        "rank": rank,
+        "wallet_address": entry["wallet_address"],
+        "score": score,
+        "total_games": total_games,
+        "survival_time": survival_time,
+        "enemies_killed": entry.get("best_enemies_killed", 0),
+        "biome_reached": entry.get("last_biome_reached", "Unknown"),
+        "difficulty": difficulty or entry.get("last_difficulty", "easy"),
+        "timestamp": entry.get("last_played", entry.get("timestamp")).isoformat() if entry.get("last_played") or entry.get("timestamp") else ""
+    }
+
+class LeaderboardSnapshot:
+    """A ranked leaderboard snapshot with pre-encoded JSON bodies.
+    Each row is encoded once; bodies for the common limits are joined and
+    hashed up front, so serving them is a plain byte copy. compress() adds
+    gzip/brotli variants of those bodies, so compressed responses are too."""
+
+    __slots__ = ("rows", "_row_bytes", "_bodies", "_compressed", "compression")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self._row_bytes = [
+            json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            for row in rows
+        ]
+        self._bodies = {}
+        # A short board serves every larger limit with its full body, so precompute that one too
+        for limit in {min(limit, len(rows)) for limit in LEADERBOARD_PRECOMPUTED_LIMITS}:
+            self._bodies[limit] = self._encode(limit)
+        self._compressed = {}
+        self.compression = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _encode(self, limit: int):
+        rows = self._row_bytes[:limit]
+        payload = b"[" + b",".join(rows) + b"]"
+        # Weak ETag: the trailing "cached" flag does not change the content
+        etag = f'W/"{hashlib.blake2b(payload, digest_size=12).hexdigest()}"'
+        prefix = b'{"status":"success","total":%d,"leaderboard":%s,"cached":' % (len(rows), payload)
+        return prefix, etag
+
+    def body(self, limit: int):
+        """Return (body_prefix, etag) for a limit; the caller appends the cached flag"""
+        limit = min(limit, len(self.rows))
+        encoded = self._bodies.get(limit)
+        if encoded is None:
+            encoded = self._encode(limit)
+        return encoded
+
+    def compress(self):
+        """Build the compressed variants of every precomputed body (both cached flags)
+        Safe to run in a worker thread: zlib and brotli release the GIL"""
+        compressed, compression = {}, {}
+        for limit, (prefix, _) in self._bodies.items():
+            if len(prefix) < LEADERBOARD_COMPRESS_MIN_BYTES:
+                continue
+            for encoding in LEADERBOARD_ENCODINGS:
+                started = time.perf_counter()
+                if encoding == "gzip":
+                    # Deflate the shared prefix once and finish a copy of the stream per flag
+                    stream = zlib.compressobj(LEADERBOARD_GZIP_LEVEL, zlib.DEFLATED, 31)
+                    head = stream.compress(prefix)
+                    variants = {}
+                    for tail in LEADERBOARD_CACHED_TAILS:
+                        finish = stream.copy()
+                        variants[tail] = head + finish.compress(tail) + finish.flush()
+                else:
+                    variants = {
+                        tail: brotli.compress(prefix + tail, mode=brotli.MODE_TEXT, quality=LEADERBOARD_BROTLI_QUALITY)
+                        for tail in LEADERBOARD_CACHED_TAILS
+                    }
+                compressed[(limit, encoding)] = variants
+                stats = compression.setdefault(encoding, {"bytes": 0, "compressed_bytes": 0, "compress_ms": 0.0})
+                stats["bytes"] += len(prefix) + len(LEADERBOARD_CACHED_TAILS[0])
+                stats["compressed_bytes"] += len(variants[LEADERBOARD_CACHED_TAILS[0]])
+                stats["compress_ms"] += (time.perf_counter() - started) * 1000
+        self._compressed, self.compression = compressed, compression
+
+    def variant(self, limit: int, encoding: str, tail: bytes) -> Optional[bytes]:
+        """The pre-compressed body for a limit, or None (not precomputed, or too small)"""
+        variants = self._compressed.get((min(limit, len(self.rows)), encoding))
+        return variants[tail] if variants else None
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best pre-compressed encoding the client accepts (None: identity)"""
+    if not accept_encoding or not LEADERBOARD_ENCODINGS:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in LEADERBOARD_ENCODINGS:  # Server preference breaks ties
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+def record_leaderboard_response(encoding: Optional[str], identity_bytes: int, sent_bytes: int):
+    stats = leaderboard_compression_stats["responses"][encoding or "identity"]
+    stats["count"] += 1
+    stats["bytes_sent"] += sent_bytes
+    stats["bytes_saved"] += identity_bytes - sent_bytes
+
+def record_snapshot_compression(snapshot: LeaderboardSnapshot):
+    leaderboard_compression_stats["snapshots_compressed"] += 1
+    for encoding, stats in snapshot.compression.items():
+        totals = leaderboard_compression_stats["snapshots"][encoding]
+        totals["bytes"] += stats["bytes"]
+        totals["compressed_bytes"] += stats["compressed_bytes"]
+        totals["compress_ms"] += stats["compress_ms"]
+        totals["last_ratio"] = round(stats["bytes"] / stats["compressed_bytes"], 3)
+
+def compression_snapshot() -> dict:
+    snapshots = {
+        encoding: {
+            **{key: round(value, 3) for key, value in totals.items()},
+            "ratio": round(totals["bytes"] / totals["compressed_bytes"], 3) if totals["compressed_bytes"] else 0.0
+        }
+        for encoding, totals in leaderboard_compression_stats["snapshots"].items()
+    }
+    return {
+        "encodings": list(LEADERBOARD_ENCODINGS),
+        "snapshots_compressed": leaderboard_compression_stats["snapshots_compressed"],
+        "snapshots": snapshots,
+        "responses": {encoding: dict(stats) for encoding, stats in leaderboard_compression_stats["responses"].items()}
+    }
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+def hidden_wallets() -> set:
+    """Wallets left out of leaderboard reads: the ones flagged for review (with ANOMALY_EXCLUDE)"""
+    return flagged_wallets if ANOMALY_EXCLUDE else set()
+
+def top_k_fetch_limit() -> int:
+    """Rows to read for a top-K board: enough that K remain after dropping hidden wallets"""
+    return LEADERBOARD_TOP_K + len(hidden_wallets())
+
+def visible_entries(entries: List[dict]) -> List[dict]:
+    """Drop hidden wallets, then keep the top K (ranks are assigned after filtering)"""
+    hidden = hidden_wallets()
+    if hidden:
+        entries = [entry for entry in entries if entry.get("wallet_address") not in hidden]
+    return entries[:LEADERBOARD_TOP_K]
+
+def hidden_ranks(index: RankIndex) -> List[int]:
+    """Sorted raw ranks of the hidden wallets in a rank index"""
+    ranks = (index.rank(wallet_address) for wallet_address in hidden_wallets())
+    return sorted(rank for rank in ranks if rank is not None)
+
+def visible_rank(index: RankIndex, wallet_address: str, hidden: Optional[List[int]] = None) -> Optional[int]:
+    """Rank among the wallets shown on the board (None if unknown or hidden)
+    `hidden` is hidden_ranks(index), when the caller ranks several wallets"""
+    if wallet_address in hidden_wallets():
+        return None
+    rank = index.rank(wallet_address)
+    if rank is None:
+        return None
+    if hidden is None:
+        hidden = hidden_ranks(index)
+    return rank - bisect.bisect_left(hidden, rank)
+
+async def stored_visible_rank(wallet_address: str, score_field: str, hidden: List[int]) -> Optional[int]:
+    """Rank computed by storage, for a wallet a rank index does not hold (after a restart, during a rebuild)
+    `hidden` is hidden_ranks() of the matching index: hidden wallets are discounted as far as it knows them"""
+    rank = await storage.rank(wallet_address, score_field)
+    if rank is None:
+        return None
+    return rank - bisect.bisect_left(hidden, rank)
+
+def visible_around(index: RankIndex, wallet_address: str, neighbours: int):
+    """(rank, wallet, score) rows of a visible wallet and up to N visible neighbours on each side"""
+    hidden = hidden_wallets()
+    rows = [row for row in index.around(wallet_address, neighbours + len(hidden)) if row[1] not in hidden]
+    position = next(position for position, row in enumerate(rows) if row[1] == wallet_address)
+    ranks = hidden_ranks(index)
+    return [
+        (rank - bisect.bisect_left(ranks, rank), wallet, score)
+        for rank, wallet, score in rows[max(0, position - neighbours):position + neighbours + 1]
+    ]
+
+async def build_leaderboard_snapshot(view_key: str = "all"):
+    """Build the full ranked snapshot (top K rows) for one leaderboard view
+    Returns (rows, version)"""
+    if view_key.startswith("season:"):
+        # Archived season ("season:N" or "season:N:<difficulty>"): indexed top-K read on its collection
+        _, season, *rest = view_key.split(":")
+        difficulty = rest[0] if rest else None
+        entries = await storage.top_k(
+            f"season:{season}", f"scores.{difficulty}" if difficulty else "score", top_k_fetch_limit(),
+            LEADERBOARD_PROJECTION, positive_only=difficulty is not None
+        )
+        entries = visible_entries(entries)
+        return [format_leaderboard_entry(entry, idx + 1, difficulty) for idx, entry in enumerate(entries)], None
+    
+    view = leaderboard_views.get(view_key)
+    if view is None:
+        if shared_state is not None:
+            # Another worker may have queried this window within the soft TTL
+            rows = await shared_state.get_snapshot(view_key, LEADERBOARD_CACHE_SOFT_TTL)
+            if rows is not None:
+                return rows, None
+        # Window bucket: indexed top-K read on (window_id, score desc, wallet_address)
+        entries = await storage.top_k(
+            "windows", "score", top_k_fetch_limit(), LEADERBOARD_PROJECTION, match={"window_id": view_key}
+        )
+        entries = visible_entries(entries)
+        rows = [format_leaderboard_entry(entry, idx + 1) for idx, entry in enumerate(entries)]
+        if shared_state is not None:
+            shared_state.put_snapshot(view_key, rows)
+        return rows, None
+    
+    if not view.loaded:
+        # Indexed top-K read (per-difficulty views use their partial index)
+        await load_leaderboard_view(view_key)
+    version = view.version
+    entries = visible_entries(view.top(view.k))
+    difficulty = view_key if view_key in DIFFICULTIES else None
+    
+    # Format response with ranks
+    return [format_leaderboard_entry(entry, idx + 1, difficulty) for idx, entry in enumerate(entries)], version
+
+async def _rebuild_leaderboard_snapshot(view_key: str):
+    rows, version = await build_leaderboard_snapshot(view_key)
+    snapshot = LeaderboardSnapshot(rows)
+    if LEADERBOARD_ENCODINGS:
+        await asyncio.to_thread(snapshot.compress)
+        record_snapshot_compression(snapshot)
+    set_cached_leaderboard(snapshot, view_key, version)
+    return snapshot
+
+def start_leaderboard_refresh(view_key: str = "all"):
+    """Start rebuilding a snapshot unless a build for the same key is already in flight
+    Returns (task, started)"""
+    cache_key = f"leaderboard_{view_key}"
+    task = leaderboard_inflight.get(cache_key)
+    if task is not None:
+        return task, False
+    
+    def finished(done: asyncio.Task):
+        leaderboard_inflight.pop(cache_key, None)
+        if done.cancelled() or done.exception() is not None:
+            leaderboard_cache_stats[cache_key]["errors"] += 1
+    
+    task = asyncio.ensure_future(_rebuild_leaderboard_snapshot(view_key))
+    leaderboard_inflight[cache_key] = task
+    leaderboard_cache_stats[cache_key]["refreshes"] += 1
+    task.add_done_callback(finished)
+    return task, True
+
+async def get_leaderboard_snapshot(view_key: str = "all"):
+    """Get the ranked snapshot for a view with single-flight misses and stale-while-revalidate
+    Live top-K views are versioned; window views go stale after the soft TTL.
+    Returns (snapshot, cached)"""
+    cache_key = f"leaderboard_{view_key}"
+    stats = leaderboard_cache_stats[cache_key]
+    view = leaderboard_views.get(view_key)
+    version = view.version if view is not None and view.loaded else None
+    
+    cached_data, fresh = get_cached_leaderboard(view_key, version)
+    if cached_data is not None and fresh:
+        stats["hits"] += 1
+        return cached_data, True
+    if cached_data is not None and LEADERBOARD_STALE_WHILE_REVALIDATE:
+        # Serve the previous snapshot now, one background task refreshes it
+        stats["stale_hits"] += 1
+        start_leaderboard_refresh(view_key)
+        return cached_data, True
+    
+    task, started = start_leaderboard_refresh(view_key)
+    stats["misses" if started else "coalesced"] += 1
+    # Shield so a disconnecting caller never cancels the shared build
+    return await asyncio.shield(task), False
 
 @app.get("/api/leaderboard")
-async def get_leaderboard(limit: int = 100, difficulty: Optional[str] = None):
-    """Get top scores from the leaderboard
-    Cached for 30 seconds to handle high traffic"""
+async def get_leaderboard(
+    request: Request,
+    limit: int = 100,
+    difficulty: Optional[str] = None,
+    window: Optional[str] = None,
+    season: Optional[int] = None
+):
+    """Get top scores from the leaderboard (all-time, per difficulty, or daily/weekly window)
+    `season` reads an ended season's archived standings (current season by default)
+    Served as pre-encoded bytes from the cached snapshot; supports ETag / If-None-Match"""
     try:
         # Validate limit
-        if limit < 1 or limit > 1000:
+        if limit < 1:
             limit = 100
+        limit = min(limit, LEADERBOARD_TOP_K)
         
-        # Check cache first
-        cached_data = get_cached_leaderboard(difficulty)
-        if cached_data:
-            # Return cached data (limit applied)
-            return {
-                "status": "success",
-                "total": len(cached_data[:limit]),
-                "leaderboard": cached_data[:limit],
-                "cached": True
-            }
-        
-        # Build query
-        query = {}
+        view_key = "all"
         if difficulty:
-            query["difficulty"] = difficulty.lower()
+            difficulty = difficulty.lower()
+            if difficulty not in DIFFICULTIES:
+                raise HTTPException(status_code=400, detail=f"Invalid difficulty. Use one of: {', '.join(DIFFICULTIES)}")
+            view_key = difficulty
+        if window:
+            window = window.lower()
+            if window not in LEADERBOARD_WINDOWS:
+                raise HTTPException(status_code=400, detail=f"Invalid window. Use one of: {', '.join(LEADERBOARD_WINDOWS)}")
+            if difficulty:
+                raise HTTPException(status_code=400, detail="Window leaderboards can't be filtered by difficulty")
+            view_key, _, _ = current_window(window, datetime.utcnow())
+        if season is not None and season != storage.active_season:
+            if window:
+                raise HTTPException(status_code=400, detail="Window leaderboards are only kept for the current season")
+            if season_history.get(str(season), {}).get("status") != "archived":
+                raise HTTPException(status_code=404, detail="Season not found")
+            view_key = f"season:{season}:{difficulty}" if difficulty else f"season:{season}"
         
-        # Get top scores sorted by score descending
-        # Using projection to reduce data transfer
-        projection = {
-            "_id": 0,
-            "wallet_address": 1,
-            "score": 1,
-            "total_games": 1,
-            "best_survival_time_seconds": 1,
-            "best_enemies_killed": 1,
-            "last_biome_reached": 1,
-            "last_difficulty": 1,
-            "last_played": 1,
-            "timestamp": 1
-        }
+        snapshot, cached = None, True
+        admission_fallback = getattr(request.state, "admission_fallback", False)
+        if admission_fallback or store_breaker.is_open:
+            # Over the admission limit, or the store is down: answer from whatever snapshot is cached
+            snapshot = get_fallback_leaderboard(view_key)
+            if snapshot is None and admission_fallback:
+                raise HTTPException(
+                    status_code=503, detail="Server busy, please retry shortly",
+                    headers={"Retry-After": str(ADMISSION_RETRY_AFTER)}
+                )
+        fallback = snapshot is not None
+        if snapshot is None:
+            try:
+                snapshot, cached = await get_leaderboard_snapshot(view_key)
+            except Exception:
+                # Rebuild failed (store unreachable past the hard TTL): keep serving the last snapshot
+                snapshot = get_fallback_leaderboard(view_key)
+                if snapshot is None:
+                    raise
+                fallback = True
+        if fallback:
+            leaderboard_cache_stats[f"leaderboard_{view_key}"]["fallbacks"] += 1
+        prefix, etag = snapshot.body(limit)
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if fallback:
+            headers["X-Cache-Fallback"] = "stale"
+        headers["X-Leaderboard-Season"] = str(storage.active_season if season is None else season)
+        if window:
+            headers["X-Leaderboard-Window"] = view_key
         
-        cursor = leaderboard_collection.find(query, projection).sort("score", -1).limit(limit)
-        entries = await cursor.to_list(length=limit)
+        # Polling clients that already have this snapshot get an empty 304
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
         
-        # Format response with ranks
-        leaderboard = []
-        for idx, entry in enumerate(entries):
-            # Format survival time (use best time)
-            seconds = entry.get("best_survival_time_seconds", 0)
-            minutes = seconds // 60
-            secs = seconds % 60
-            survival_time = f"{minutes:02d}:{secs:02d}"
-            
-            leaderboard.append({
-                "rank": idx + 1,
-                "wallet_address": entry["wallet_address"],
-                "score": entry["score"],
-                "total_games": entry.get("total_games", 1),
-                "survival_time": survival_time,
-                "enemies_killed": entry.get("best_enemies_killed", 0),
-                "biome_reached": entry.get("last_biome_reached", "Unknown"),
-                "difficulty": entry.get("last_difficulty", "easy"),
-                "timestamp": entry.get("last_played", entry.get("timestamp")).isoformat() if entry.get("last_played") or entry.get("timestamp") else ""
-            })
+        tail = LEADERBOARD_CACHED_TAILS[0] if cached else LEADERBOARD_CACHED_TAILS[1]
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        content = snapshot.variant(limit, encoding, tail) if encoding else None
+        if content is None:
+            encoding = None
+            content = prefix + tail
+        else:
+            headers["Content-Encoding"] = encoding
+        record_leaderboard_response(encoding, len(prefix) + len(tail), len(content))
+        return Response(content=content, media_type="application/json", headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching leaderboard", exc_info=e)
+        raise HTTPException(status_code=500, detail="Failed to fetch leaderboard")
+
+def encode_leaderboard_cursor(score: int, wallet_address: str) -> str:
+    """Encode a keyset position as an opaque cursor"""
+    raw = json.dumps([score, wallet_address], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_leaderboard_cursor(cursor: str):
+    """Decode a cursor back to (score, wallet_address)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, wallet_address = json.loads(raw)
+        if not isinstance(score, int) or not isinstance(wallet_address, str):
+            raise ValueError
+        return score, wallet_address
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+@app.get("/api/leaderboard/page")
+async def get_leaderboard_page(limit: int = 100, cursor: Optional[str] = None):
+    """Page through the full leaderboard with keyset (seek) pagination
+    Each page is an index range read on (score desc, wallet_address) - no skip()"""
+    try:
+        limit = max(1, min(limit, LEADERBOARD_PAGE_MAX))
+        
+        # Seek past the last row of the previous page
+        after = decode_leaderboard_cursor(cursor) if cursor else None
         
-        # Cache the result
-        set_cached_leaderboard(leaderboard, difficulty)
+        # Fetch one extra row to know whether another page exists (plus room for hidden wallets)
+        hidden = hidden_wallets()
+        entries = await storage.top_k("leaderboard", "score", limit + 1 + len(hidden), LEADERBOARD_PROJECTION, after=after)
+        entries = [entry for entry in entries if entry["wallet_address"] not in hidden]
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        
+        # Ranks come from the in-memory rank index, so deep pages cost no count query
+        ranks = hidden_ranks(rank_index)
+        leaderboard = [
+            format_leaderboard_entry(entry, visible_rank(rank_index, entry["wallet_address"], ranks))
+            for entry in entries
+        ]
+        next_cursor = None
+        if has_more:
+            last = entries[-1]
+            next_cursor = encode_leaderboard_cursor(last["score"], last["wallet_address"])
         
         return {
             "status": "success",
             "total": len(leaderboard),
             "leaderboard": leaderboard,
-            "cached": False
+            "next_cursor": next_cursor
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error fetching leaderboard page", exc_info=e)
+        raise HTTPException(status_code=500, detail="Failed to fetch leaderboard page")
+
+@app.get("/api/leaderboard/rank/{wallet_address}")
+async def get_wallet_rank(wallet_address: str, around: int = 0, difficulty: Optional[str] = None):
+    """Get a wallet's global (or per-difficulty) rank, optionally with ±N neighbours
+    Served from the in-memory rank index, so it works for any rank"""
+    wallet_address = wallet_address.strip()
+    around = max(0, min(around, RANK_AROUND_MAX))
+    
+    index = rank_index
+    if difficulty:
+        index = difficulty_rank_indexes.get(difficulty.lower())
+        if index is None:
+            raise HTTPException(status_code=400, detail=f"Invalid difficulty. Use one of: {', '.join(DIFFICULTIES)}")
+    
+    hidden = hidden_ranks(index)
+    rank = visible_rank(index, wallet_address, hidden)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="Wallet not found on leaderboard")
+    
+    response = {
+        "status": "success",
+        "wallet_address": wallet_address,
+        "rank": rank,
+        "score": index.scores[wallet_address],
+        "total_players": len(index) - len(hidden)
+    }
+    if around:
+        response["around"] = [
+            {"rank": r, "wallet_address": w, "score": score}
+            for r, w, score in visible_around(index, wallet_address, around)
+        ]
+    return response
+
+@app.get("/api/player/{wallet_address}")
+async def get_player_profile(wallet_address: str):
+    """Get one wallet's totals and ranks
+    The document comes from the per-wallet LRU cache; ranks from the in-memory rank indexes,
+    or from storage for a wallet the indexes do not hold yet (after a restart, during a rebuild)"""
+    wallet_address = wallet_address.strip()
+    if wallet_address in hidden_wallets():
+        raise HTTPException(status_code=404, detail="Wallet not found on leaderboard")
+    hidden = hidden_ranks(rank_index)
+    rank = visible_rank(rank_index, wallet_address, hidden)
+    
+    player = player_cache.get(wallet_address)
+    if player is None:
+        token = player_cache.begin_load(wallet_address)
+        try:
+            try:
+                player = await storage.find_one("leaderboard", {"wallet_address": wallet_address}, LEADERBOARD_PROJECTION)
+            except Exception as e:
+                logger.error("Error fetching player profile", exc_info=e)
+                raise HTTPException(status_code=500, detail="Failed to fetch player profile")
+            if player is None:
+                raise HTTPException(status_code=404, detail="Wallet not found on leaderboard")
+            player_cache.finish_load(wallet_address, token, player)
+        finally:
+            player_cache.abandon_load(wallet_address, token)  # Failed or cancelled loads leave no token behind
+    
+    difficulty_ranks = {
+        difficulty: visible_rank(difficulty_rank_indexes[difficulty], wallet_address) for difficulty in DIFFICULTIES
+    }
+    try:
+        if rank is None:
+            rank = await stored_visible_rank(wallet_address, "score", hidden)
+        for difficulty, difficulty_rank in difficulty_ranks.items():
+            if difficulty_rank is None and get_field(player, f"scores.{difficulty}", 0) > 0:
+                difficulty_ranks[difficulty] = await stored_visible_rank(
+                    wallet_address, f"scores.{difficulty}", hidden_ranks(difficulty_rank_indexes[difficulty])
+                )
+    except Exception as e:
+        logger.error("Error ranking player profile", exc_info=e)
+        raise HTTPException(status_code=500, detail="Failed to fetch player profile")
+    if rank is None:
+        raise HTTPException(status_code=404, detail="Wallet not found on leaderboard")
+    
+    seconds = player.get("best_survival_time_seconds", 0)
+    last_played = player.get("last_played") or player.get("timestamp")
+    return {
+        "status": "success",
+        "player": {
+            "wallet_address": wallet_address,
+            "rank": rank,
+            "total_players": max(len(rank_index) - len(hidden), rank),  # The index may still be filling
+            "score": player["score"],
+            "total_games": player.get("total_games", 1),
+            "survival_time": f"{seconds // 60:02d}:{seconds % 60:02d}",
+            "best_survival_time_seconds": seconds,
+            "enemies_killed": player.get("best_enemies_killed", 0),
+            "biome_reached": player.get("last_biome_reached", "Unknown"),
+            "difficulty": player.get("last_difficulty", "easy"),
+            "first_played": player["timestamp"].isoformat() if player.get("timestamp") else "",
+            "last_played": last_played.isoformat() if last_played else "",
+            "difficulties": {
+                difficulty: {
+                    "score": get_field(player, f"scores.{difficulty}", 0),
+                    "games": get_field(player, f"games.{difficulty}", 0),
+                    "rank": difficulty_ranks[difficulty]
+                }
+                for difficulty in DIFFICULTIES
+            }
+        }
+    }
+
+def encode_runs_cursor(played_at: datetime, run_id: str) -> str:
+    """Encode a history position (played_at, run_id) as an opaque cursor"""
+    raw = json.dumps([played_at.isoformat(), run_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_runs_cursor(cursor: str):
+    """Decode a cursor back to (played_at, run_id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        played_at, run_id = json.loads(raw)
+        if not isinstance(played_at, str) or not isinstance(run_id, str):
+            raise ValueError
+        return datetime.fromisoformat(played_at), run_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+@app.get("/api/player/{wallet_address}/runs")
+async def get_player_runs(wallet_address: str, limit: int = 20, cursor: Optional[str] = None):
+    """Page through a wallet's recent runs, newest first
+    Keyset pagination on the (wallet_address, played_at) index"""
+    wallet_address = wallet_address.strip()
+    if wallet_address in hidden_wallets():
+        raise HTTPException(status_code=404, detail="Wallet not found on leaderboard")
+    try:
+        limit = max(1, min(limit, RUNS_PAGE_MAX))
+        before = decode_runs_cursor(cursor) if cursor else None
+        
+        runs = await storage.find_runs(wallet_address, limit + 1, before=before)
+        has_more = len(runs) > limit
+        runs = runs[:limit]
+        
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_runs_cursor(runs[-1]["played_at"], runs[-1]["run_id"])
+        
+        return {
+            "status": "success",
+            "wallet_address": wallet_address,
+            "total": len(runs),
+            "runs": [
+                {
+                    "run_id": run["run_id"],
+                    "score": run["score"],
+                    "survival_time": f"{run['survival_time_seconds'] // 60:02d}:{run['survival_time_seconds'] % 60:02d}",
+                    "survival_time_seconds": run["survival_time_seconds"],
+                    "enemies_killed": run["enemies_killed"],
+                    "biome_reached": run["biome_reached"],
+                    "difficulty": run["difficulty"],
+                    "played_at": run["played_at"].isoformat()
+                }
+                for run in runs
+            ],
+            "next_cursor": next_cursor
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"✗ Error fetching leaderboard: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch leaderboard")
+        logger.error("Error fetching player runs", exc_info=e)
+        raise HTTPException(status_code=500, detail="Failed to fetch player runs")
+
+def require_admin(request: Request):
+    """Reject admin requests without the configured X-Admin-Key (all of them when no key is configured)"""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not hmac.compare_digest(request.headers.get("x-admin-key", "").encode("utf-8"), ADMIN_API_KEY.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Admin key required")
+
+def flatten_export_row(doc: dict, fields, flatten: bool) -> dict:
+    """Convert a document into an export row
+    With flatten (CSV), per-difficulty maps become scores.easy, scores.hard, ... columns"""
+    row = {}
+    for field in fields:
+        value = doc.get(field)
+        if field in ("scores", "games"):
+            if not flatten:
+                row[field] = {difficulty: (value or {}).get(difficulty, 0) for difficulty in DIFFICULTIES}
+                continue
+            for difficulty in DIFFICULTIES:
+                row[f"{field}.{difficulty}"] = (value or {}).get(difficulty, 0)
+        elif isinstance(value, datetime):
+            row[field] = value.isoformat()
+        else:
+            row[field] = value
+    return row
+
+@app.get("/api/admin/leaderboard/export")
+async def export_leaderboard(
+    request: Request,
+    format: str = "ndjson",
+    fields: Optional[str] = None,
+    since: Optional[str] = None
+):
+    """Stream every wallet's record in rank order as NDJSON or CSV (admin)
+    Backed by a batched cursor, so memory stays flat regardless of row count.
+    `since` (ISO timestamp) exports only wallets with last_played >= since."""
+    require_admin(request)
+    
+    format = format.lower()
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use ndjson or csv")
+    
+    selected = list(EXPORT_FIELDS)
+    if fields:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected if field not in EXPORT_FIELDS]
+        if unknown or not selected:
+            raise HTTPException(status_code=400, detail=f"Invalid fields. Use any of: {', '.join(EXPORT_FIELDS)}")
+    
+    since_time = None
+    if since:
+        try:
+            since_time = datetime.fromisoformat(since)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid since timestamp (use ISO 8601)")
+    
+    projection = {"_id": 0, "wallet_address": 1, "score": 1}
+    projection.update({field: 1 for field in selected})
+    
+    async def generate_rows():
+        cursor = storage.scan("leaderboard", projection, since=since_time, batch_size=EXPORT_BATCH_SIZE)
+        buffer = io.StringIO()
+        writer = None
+        rows_in_buffer = 0
+        position = 0
+        # Ranks are the public board's: hidden wallets are exported without one and not counted
+        hidden = hidden_wallets()
+        ranks = hidden_ranks(rank_index) if since else None
+        async for doc in cursor:
+            if doc["wallet_address"] in hidden:
+                rank = None
+            elif since:
+                # Filtered exports report the wallet's global rank, not its position in the export
+                rank = visible_rank(rank_index, doc["wallet_address"], ranks)
+            else:
+                position += 1
+                rank = position
+            row = {"rank": rank, **flatten_export_row(doc, selected, flatten=format == "csv")}
+            if format == "ndjson":
+                buffer.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+                buffer.write("\n")
+            else:
+                if writer is None:
+                    writer = csv.DictWriter(buffer, fieldnames=list(row))
+                    writer.writeheader()
+                writer.writerow(row)
+            rows_in_buffer += 1
+            if rows_in_buffer >= EXPORT_BATCH_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                rows_in_buffer = 0
+        if buffer.tell():
+            yield buffer.getvalue()
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    filename = f"leaderboard-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        generate_rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @app.delete("/api/leaderboard/reset")
-async def reset_leaderboard():
-    """Reset leaderboard (for testing/admin use)"""
+async def reset_leaderboard(request: Request):
+    """Reset leaderboard (admin)
+    Empties the current season in place: scores, window buckets and counters. Run history is kept.
+    To keep the standings readable, start a new season with /api/admin/season/rollover instead."""
+    if RESET_ALLOW_UNAUTHENTICATED and not request.headers.get("x-admin-key"):
+        log_event(logger, logging.WARNING, "Unauthenticated leaderboard reset (RESET_ALLOW_UNAUTHENTICATED is deprecated)")
+    else:
+        require_admin(request)
     try:
-        result = await leaderboard_collection.delete_many({})
-        invalidate_leaderboard_cache()
-        print(f"✓ Leaderboard reset: {result.deleted_count} entries removed")
+        # Gate closed: pending batched writes land first, and none straddles the reset
+        async with write_gate.closed():
+            for batcher in (score_batcher, window_batcher):
+                if batcher is not None:
+                    await batcher.close()
+            deleted_count = await storage.reset()
+            reset_local_leaderboard_state()
+        if shared_state is not None:
+            shared_state.publish({"type": "reset", "season": storage.active_season})
+        log_event(logger, logging.INFO, "Leaderboard reset", deleted=deleted_count, season=storage.active_season)
         return {
             "status": "success",
-            "message": f"Deleted {result.deleted_count} entries",
-            "deleted_count": result.deleted_count
+            "message": f"Deleted {deleted_count} entries",
+            "deleted_count": deleted_count
         }
     except Exception as e:
-        print(f"✗ Error resetting leaderboard: {e}")
+        logger.error("Error resetting leaderboard", exc_info=e)
         raise HTTPException(status_code=500, detail="Failed to reset leaderboard")
 
+@app.post("/api/admin/season/rollover")
+async def rollover_season_endpoint(request: Request):
+    """End the current season and start the next one (admin)
+    The ended season stays readable at /api/leaderboard?season=N"""
+    require_admin(request)
+    try:
+        result = await rollover_season()
+        if result is None:
+            raise HTTPException(status_code=409, detail="Season changed concurrently, retry")
+        return {"status": "success", **result, "switch_ms": write_gate.stats["last_closed_ms"]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error rolling over season", exc_info=e)
+        raise HTTPException(status_code=500, detail="Failed to roll over season")
+
+@app.post("/api/admin/anomalies/scan")
+async def scan_anomalies(request: Request, days: Optional[float] = None, dry_run: bool = False):
+    """Run the batch anomaly scan over recent runs and return its summary (admin)
+    `days` defaults to ANOMALY_SCAN_DAYS (0 scans every retained run); `dry_run` skips the review write.
+    For large histories prefer running anomaly_scan.py as a separate job."""
+    require_admin(request)
+    try:
+        await run_history.flush()  # Include runs still buffered on this worker
+        summary = await run_scan(storage, ANOMALY_SCAN_DAYS if days is None else days, dry_run=dry_run)
+        anomaly_state["last_scan"] = {field: value for field, value in summary.items() if field != "flagged"}
+        if not dry_run:
+            await refresh_flagged_wallets()
+            if shared_state is not None:
+                shared_state.publish({"type": "review"})
+        log_event(
+            logger, logging.INFO, "Anomaly scan finished",
+            runs=summary["runs"], flagged=summary["flagged_wallets"], dry_run=dry_run, timings_ms=summary["timings_ms"]
+        )
+        return {"status": "success", **summary}
+    except Exception as e:
+        logger.error("Error scanning for anomalies", exc_info=e)
+        raise HTTPException(status_code=500, detail="Failed to scan for anomalies")
+
+@app.get("/api/admin/anomalies")
+async def get_anomalies(request: Request):
+    """Wallets in the review table, flagged first (admin)"""
+    require_admin(request)
+    try:
+        wallets = [doc async for doc in storage.scan("review", {"_id": 0})]
+        wallets.sort(key=lambda doc: (doc.get("status") != "flagged", -doc.get("max_z", 0)))
+        return {"status": "success", "exclude": ANOMALY_EXCLUDE, "wallets": wallets}
+    except Exception as e:
+        logger.error("Error fetching anomalies", exc_info=e)
+        raise HTTPException(status_code=500, detail="Failed to fetch anomalies")
+
+@app.get("/api/seasons")
+async def get_seasons():
+    """Current season and the history of ended (archived or dropped) seasons
+    Served from this worker's copy of the history, refreshed every SEASON_CHECK_INTERVAL seconds"""
+    try:
+        seasons = [
+            {"season": int(number), **info}
+            for number, info in sorted(season_history.items(), key=lambda item: int(item[0]))
+        ]
+        return {"status": "success", "current": storage.active_season, "seasons": seasons}
+    except Exception as e:
+        logger.error("Error fetching seasons", exc_info=e)
+        raise HTTPException(status_code=500, detail="Failed to fetch seasons")
@@ -0,0 +1,1223 @@
+"""
+Storage engines for the Degen Force leaderboard.
+
+The API layer talks to a LeaderboardStorage instead of a Motor collection,
+so the same endpoints can run on MongoDB (default), fully in-process
+(memory) or on SQLite. That makes it possible to load-test and profile the
+API without a running MongoDB and to compare engines on one workload.
+
+Data is organised in logical tables of documents:
+- "leaderboard": one accumulated document per wallet, for the active season
+- "season:N": season N's leaderboard table (read-only once the season has ended)
+- "windows": one bucket document per (window_id, wallet)
+- "stats": small counter documents and the season history
+- "review": wallets flagged by the anomaly scan, one document per wallet
+
+plus an append-only run history (one record per game, expired after a
+retention period) read newest-first per wallet.
+
+Writes are Mongo-style update documents ($inc/$max/$set/$setOnInsert),
+which every engine applies with the same semantics. Replayed writes carry an
+op id and are applied at most once per document (bulk_upsert_once).
+"""
+import asyncio
+import copy
+import heapq
+import json
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, ConnectionFailure, DuplicateKeyError, WriteError
+
+DIFFICULTIES = ("easy", "hard", "cursed")
+
+# Logical table -> MongoDB collection name
+MONGO_COLLECTIONS = {
+    "leaderboard": "leaderboard",
+    "windows": "leaderboard_windows",
+    "stats": "stats",
+    "review": "leaderboard_review"
+}
+RUNS_COLLECTION = "player_runs"  # Time-series collection (timeField played_at, metaField wallet_address)
+META_COLLECTION = "leaderboard_meta"  # Applied schema version
+
+# An archived season's collection gets a validator no document passes: writes fail with code 121
+ARCHIVED_VALIDATOR = {"$expr": {"$eq": [0, 1]}}
+DOCUMENT_VALIDATION_FAILURE = 121
+
+# Bump when indexes or tables change; setup() skips all work once a store is at this version
+SCHEMA_VERSION = 5
+
+DEFAULT_RUNS_RETENTION = timedelta(days=90)
+
+# Season history document in the "stats" table:
+# {"current": N, "seasons": {"N": {"started_at", "ended_at", "status": active|archived|dropped}}}
+SEASONS_KEY = {"_id": "seasons"}
+
+# Markers {"s": source, "n": sequence} of the last ops applied to a document. Ops of a source
+# reach a document in sequence order, so its latest marker is a high-water mark: an op at or
+# below it was applied before. Journal segments are sources; every live write is a source of its
+# own (see new_op_id). Only ops that may still be replayed matter, so a few are kept.
+APPLIED_OPS_FIELD = "applied_ops"
+APPLIED_OPS_KEEP = 16
+
+# Window bucket ids of later seasons carry an "s<N>:" prefix (season 1 buckets have none)
+SEASON_WINDOW_PATTERN = re.compile(r"^s(\d+):")
+
+
+class SeasonArchived(Exception):
+    """A write reached an ended season's table: the writer hasn't followed the rollover yet"""
+
+
+def season_table(season: int) -> str:
+    """Physical leaderboard table of a season (season 1 is the original table)"""
+    return "leaderboard" if season <= 1 else f"leaderboard_s{season}"
+
+
+def season_window_prefix(season: int) -> str:
+    """Prefix of a season's window bucket ids"""
+    return "" if season <= 1 else f"s{season}:"
+
+
+def window_season(window_id: str) -> int:
+    """Season a window bucket id belongs to"""
+    match = SEASON_WINDOW_PATTERN.match(window_id)
+    return int(match.group(1)) if match else 1
+
+
+def season_stats_id(season: int) -> str:
+    """_id of a season's write-time counters document in the "stats" table"""
+    return "leaderboard" if season <= 1 else f"leaderboard:s{season}"
+
+
+def season_switch_update(previous: int, season: int, ended_status: str, now: datetime) -> dict:
+    """Update that ends `previous` and starts `season` in the season history document"""
+    return {"$set": {
+        "current": season,
+        f"seasons.{previous}.ended_at": now,
+        f"seasons.{previous}.status": ended_status,
+        f"seasons.{season}": {"started_at": now, "ended_at": None, "status": "active"}
+    }}
+
+
+# Document helpers (shared with the in-memory views in server.py)
+def get_field(doc: dict, path: str, default=None):
+    """Read a (possibly dotted) field from a document"""
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return default
+        doc = doc[part]
+    return doc
+
+
+def set_field(doc: dict, path: str, value):
+    """Write a (possibly dotted) field into a document"""
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[leaf] = value
+
+
+def apply_update_to_doc(doc: dict, update: dict, created: bool) -> dict:
+    """Apply an upsert's update operators to an in-memory copy of the document"""
+    if created:
+        for field, value in update.get("$setOnInsert", {}).items():
+            set_field(doc, field, value)
+    for field, value in update.get("$set", {}).items():
+        set_field(doc, field, value)
+    for field, value in update.get("$inc", {}).items():
+        set_field(doc, field, get_field(doc, field, 0) + value)
+    for field, value in update.get("$max", {}).items():
+        current = get_field(doc, field)
+        set_field(doc, field, value if current is None else max(current, value))
+    for field, value in update.get("$push", {}).items():
+        items = list(get_field(doc, field, [])) + list(value["$each"])
+        set_field(doc, field, items[value["$slice"]:] if "$slice" in value else items)
+    return doc
+
+
+def record_applied_op(doc: dict, op_id: dict) -> bool:
+    """Record the op's marker in the document; False if its source's high-water mark is already past it"""
+    applied = doc.setdefault(APPLIED_OPS_FIELD, [])
+    if any(isinstance(marker, dict) and marker.get("s") == op_id["s"] and marker.get("n", -1) >= op_id["n"] for marker in applied):
+        return False
+    applied.append(op_id)
+    del applied[:-APPLIED_OPS_KEEP]
+    return True
+
+
+def new_op_id() -> dict:
+    """Marker for a live write, so a journaled copy of it is skipped if the write did land"""
+    return {"s": uuid.uuid4().hex, "n": 0}
+
+
+def mark_applied_op(update: dict, op_id: dict) -> dict:
+    """The update, also recording the op's marker in the document"""
+    return {**update, "$push": {APPLIED_OPS_FIELD: {"$each": [op_id], "$slice": -APPLIED_OPS_KEEP}}}
+
+
+def project(doc: dict, projection: Optional[dict]) -> dict:
+    """Apply a projection and return an independent copy"""
+    if not projection:
+        return copy.deepcopy(doc)
+    if not any(projection.values()):
+        # Exclusion projection, e.g. {"_id": 0}
+        return {field: copy.deepcopy(value) for field, value in doc.items() if field not in projection}
+    fields = [field for field, include in projection.items() if include and field != "_id"]
+    result = {field: copy.deepcopy(doc[field]) for field in fields if field in doc}
+    if projection.get("_id", 1) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    return result
+
+
+def rank_sort_key(doc: dict, score_field: str):
+    return (-get_field(doc, score_field, 0), doc.get("wallet_address", ""))
+
+
+class LeaderboardStorage:
+    """Interface every storage engine implements"""
+
+    name = "base"
+    active_season = 1  # Season whose table "leaderboard" refers to
+
+    def _table_name(self, table: str) -> str:
+        """Physical table behind a logical table name"""
+        if table == "leaderboard":
+            return season_table(self.active_season)
+        if table.startswith("season:"):
+            return season_table(int(table[len("season:"):]))
+        return table
+
+    def is_unavailable(self, error: BaseException) -> bool:
+        """The store couldn't be reached, so the failed write can be journaled and retried later
+        It may have been applied: writes carry an op marker (mark_applied_op), so a retry of one
+        that landed is skipped rather than counted twice"""
+        return False
+
+    async def setup(self) -> List[int]:
+        """Apply pending schema migrations (indexes / tables); returns the versions applied
+        A store already at SCHEMA_VERSION costs a single read"""
+        return []
+
+    async def upsert_accumulate(self, table: str, key: dict, update: dict) -> bool:
+        """Apply one accumulate-upsert; returns True if the document was created"""
+        raise NotImplementedError
+
+    async def bulk_upsert(self, table: str, ops: List[Tuple[dict, dict]]) -> Tuple[Set[int], Dict[int, Exception]]:
+        """Apply many (key, update) upserts unordered
+        Returns (indexes of ops that created a document, {index: error} for failed ops)"""
+        raise NotImplementedError
+
+    async def bulk_upsert_once(
+        self, table: str, ops: List[Tuple[dict, dict, dict]]
+    ) -> Tuple[Set[int], Set[int], Dict[int, Exception]]:
+        """Apply many (key, update, op_id) upserts unordered, skipping ops already applied to their document
+        op_id is {"s": source, "n": sequence}. Pass at most one op per document, and a document's ops
+        of one source in sequence order across calls: an op is skipped once its source's mark reaches it.
+        Returns (indexes that created a document, indexes applied earlier, {index: error} for failed ops)"""
+        raise NotImplementedError
+
+    async def find_one(self, table: str, key: dict, projection: Optional[dict] = None) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def top_k(
+        self,
+        table: str,
+        score_field: str,
+        limit: int,
+        projection: Optional[dict] = None,
+        match: Optional[dict] = None,
+        after: Optional[Tuple[int, str]] = None,
+        positive_only: bool = False
+    ) -> List[dict]:
+        """Top documents ordered by (score_field desc, wallet_address asc)
+        `after` seeks past a (score, wallet_address) position; `positive_only` skips scores <= 0"""
+        raise NotImplementedError
+
+    def scan(
+        self,
+        table: str,
+        projection: Optional[dict] = None,
+        since: Optional[datetime] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[dict]:
+        """Iterate every document in rank order (score desc, wallet asc) in batches"""
+        raise NotImplementedError
+
+    async def rank(self, wallet_address: str, score_field: str = "score") -> Optional[int]:
+        """1-based rank computed by the engine itself (no in-memory index)"""
+        raise NotImplementedError
+
+    async def stats(self) -> dict:
+        """Exact totals: {"players", "games", "score"}"""
+        raise NotImplementedError
+
+    async def estimated_count(self, table: str) -> int:
+        raise NotImplementedError
+
+    async def insert_runs(self, runs: List[dict]) -> int:
+        """Append per-game run records (unordered; order of arrival is not preserved)
+        Returns how many records were rejected individually; raises if the whole batch failed"""
+        raise NotImplementedError
+
+    def scan_runs(
+        self, fields: Sequence[str], since: Optional[datetime] = None, batch_size: int = 50000
+    ) -> AsyncIterator[Dict[str, list]]:
+        """Every run (played at or after `since`) in columnar batches: field -> list of values
+        Unordered; for offline jobs over the whole history"""
+        raise NotImplementedError
+
+    async def find_runs(
+        self, wallet_address: str, limit: int, before: Optional[Tuple[datetime, str]] = None
+    ) -> List[dict]:
+        """A wallet's runs newest first, ordered by (played_at desc, run_id desc)
+        `before` seeks past a (played_at, run_id) position"""
+        raise NotImplementedError
+
+    async def load_seasons(self) -> dict:
+        """The season history document (created on first use)"""
+        state = await self.find_one("stats", SEASONS_KEY, {"_id": 0})
+        if state is not None:
+            return state
+        await self.upsert_accumulate("stats", SEASONS_KEY, {"$setOnInsert": {
+            "current": 1,
+            "seasons": {"1": {"started_at": None, "ended_at": None, "status": "active"}}
+        }})
+        return await self.find_one("stats", SEASONS_KEY, {"_id": 0})
+
+    def activate_season(self, season: int):
+        """Point the "leaderboard" table at a season's table"""
+        self.active_season = season
+
+    async def prepare_season(self, season: int):
+        """Create a season's (empty, indexed) table; idempotent"""
+        raise NotImplementedError
+
+    async def switch_season(self, previous: int, season: int, ended_status: str, now: datetime) -> bool:
+        """Record `season` as current if `previous` still is (compare-and-set)
+        Returns False if another process switched first. The caller activates the season."""
+        raise NotImplementedError
+
+    async def archive_season(self, season: int):
+        """Make a season's table reject writes with SeasonArchived (reads, reset and drop still work)
+        Done before the switch, so a process still writing to the ended season fails instead of
+        writing into a table that is about to be dropped"""
+        raise NotImplementedError
+
+    async def unarchive_season(self, season: int):
+        """Accept writes to a season's table again (a rollover failed after archiving it)"""
+        raise NotImplementedError
+
+    async def reset(self, season: Optional[int] = None) -> int:
+        """Delete a season's leaderboard, window buckets and write-time counters (default: the active season)
+        The active season's table is emptied in place; an ended season's table is dropped.
+        Returns the number of leaderboard documents removed."""
+        raise NotImplementedError
+
+    async def drop_season(self, season: int):
+        """Drop an ended season's data and mark it dropped in the history"""
+        if season == self.active_season:
+            raise ValueError("Can't drop the active season")
+        await self.reset(season)
+        await self.upsert_accumulate("stats", SEASONS_KEY, {"$set": {f"seasons.{season}.status": "dropped"}})
+
+    async def close(self):
+        pass
+
+
+class MongoStorage(LeaderboardStorage):
+    """MongoDB via Motor (default engine)"""
+
+    name = "mongo"
+
+    def __init__(self, db, runs_retention: timedelta = DEFAULT_RUNS_RETENTION):
+        self.db = db
+        self._collections = {}  # Physical name -> Motor collection
+        self.runs = db[RUNS_COLLECTION]
+        self.runs_retention = runs_retention
+
+    def is_unavailable(self, error):
+        # Server selection timeouts and failovers (NotPrimaryError, AutoReconnect, NetworkTimeout).
+        # A write cut off mid-flight may have landed; its replay is skipped by its op marker.
+        return isinstance(error, ConnectionFailure)
+
+    def _collection(self, table: str):
+        name = self._table_name(table)
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = self.db[MONGO_COLLECTIONS.get(name, name)]
+        return collection
+
+    async def setup(self):
+        meta = self.db[META_COLLECTION]
+        state = await meta.find_one({"_id": "schema"}) or {}
+        version = state.get("version", 0)
+        applied = []
+        migrations = (
+            (1, self._migrate_indexes), (2, self._migrate_runs), (3, self._migrate_review), (4, self._migrate_score_index),
+            (5, self._migrate_difficulty_totals)
+        )
+        for target, migrate in migrations:
+            if version >= target:
+                continue
+            await migrate()
+            await meta.update_one(
+                {"_id": "schema"},
+                {"$max": {"version": target}, "$set": {"migrated_at": datetime.utcnow()}},
+                upsert=True
+            )
+            applied.append(target)
+
+        # Retention is configuration, not schema: only touch the collection when it changed
+        expire_after = int(self.runs_retention.total_seconds())
+        if 2 not in applied and state.get("runs_expire_after") != expire_after:
+            await self.db.command("collMod", RUNS_COLLECTION, expireAfterSeconds=expire_after)
+        if state.get("runs_expire_after") != expire_after:
+            await meta.update_one({"_id": "schema"}, {"$set": {"runs_expire_after": expire_after}}, upsert=True)
+        return applied
+
+    async def _migrate_indexes(self):
+        """Schema 1: leaderboard and window bucket indexes"""
+        leaderboard = self._collection("leaderboard")
+        windows = self._collection("windows")
+        await self._create_leaderboard_indexes(leaderboard)
+
+        # Window buckets: one document per (window, wallet), top-K read per window, TTL expiry
+        await windows.create_index(
+            [("window_id", ASCENDING), ("wallet_address", ASCENDING)], unique=True
+        )
+        await windows.create_index(
+            [("window_id", ASCENDING), ("score", DESCENDING), ("wallet_address", ASCENDING)]
+        )
+        await windows.create_index("expires_at", expireAfterSeconds=0)
+
+        # Superseded by the (score, wallet_address) and per-difficulty indexes
+        for index_name in ("score_-1_last_played_-1", "last_difficulty_1"):
+            try:
+                await leaderboard.drop_index(index_name)
+            except Exception:
+                pass
+
+    @staticmethod
+    async def _create_leaderboard_indexes(leaderboard):
+        # Create indexes for fast queries and concurrent operations
+        await leaderboard.create_index([("wallet_address", 1)], unique=True)  # Unique wallet with fast lookup
+        await leaderboard.create_index([("last_played", -1)])  # Recent activity
+        await leaderboard.create_index([("score", -1), ("wallet_address", 1)])  # Covers the (score desc, wallet) leaderboard sort and keyset seeks
+        await leaderboard.create_index([("total_games", -1)])  # Most active players
+        for difficulty in DIFFICULTIES:
+            # Per-difficulty top-K reads; partial so wallets that never played it cost nothing
+            await leaderboard.create_index(
+                [(f"scores.{difficulty}", -1), ("wallet_address", 1)],
+                partialFilterExpression={f"scores.{difficulty}": {"$gt": 0}}
+            )
+
+    async def _migrate_runs(self):
+        """Schema 2: per-run history"""
+        # Run history: time-series buckets per wallet make high-rate inserts cheap;
+        # expireAfterSeconds drops whole buckets past the retention period
+        expire_after = int(self.runs_retention.total_seconds())
+        try:
+            await self.db.create_collection(
+                RUNS_COLLECTION,
+                timeseries={"timeField": "played_at", "metaField": "wallet_address", "granularity": "seconds"},
+                expireAfterSeconds=expire_after
+            )
+        except CollectionInvalid:
+            await self.db.command("collMod", RUNS_COLLECTION, expireAfterSeconds=expire_after)
+        await self.runs.create_index([("wallet_address", ASCENDING), ("played_at", DESCENDING)])  # Per-wallet history pages
+
+    async def _migrate_review(self):
+        """Schema 3: anomaly review queue"""
+        await self._collection("review").create_index("wallet_address", unique=True)
+
+    async def _leaderboard_collections(self):
+        """Every season's leaderboard collection"""
+        return [
+            self.db[name] for name in await self.db.list_collection_names()
+            if name == "leaderboard" or re.fullmatch(r"leaderboard_s\d+", name)
+        ]
+
+    async def _migrate_score_index(self):
+        """Schema 4: drop the score-only index, a prefix of (score, wallet_address), from every season's table"""
+        for collection in await self._leaderboard_collections():
+            try:
+                await collection.drop_index("score_-1")
+            except Exception:
+                pass
+
+    async def _migrate_difficulty_totals(self):
+        """Schema 5: per-difficulty totals for documents written before they were kept
+        The old schema only recorded the last difficulty played, so the whole total goes there."""
+        for collection in await self._leaderboard_collections():
+            for difficulty in DIFFICULTIES:
+                await collection.update_many(
+                    {"scores": {"$exists": False}, "last_difficulty": difficulty},
+                    [{"$set": {f"scores.{difficulty}": "$score", f"games.{difficulty}": "$total_games"}}],
+                    bypass_document_validation=True  # Archived seasons are read-only to the app, not to migrations
+                )
+
+    @staticmethod
+    def _write_error(error: dict) -> Exception:
+        message = error.get("errmsg", "Bulk write failed")
+        return SeasonArchived(message) if error.get("code") == DOCUMENT_VALIDATION_FAILURE else RuntimeError(message)
+
+    async def upsert_accumulate(self, table, key, update):
+        try:
+            result = await self._collection(table).update_one(key, update, upsert=True)
+        except WriteError as e:
+            if e.code == DOCUMENT_VALIDATION_FAILURE:
+                raise SeasonArchived(str(e)) from e
+            raise
+        return result.upserted_id is not None
+
+    async def bulk_upsert(self, table, ops):
+        requests = [UpdateOne(key, update, upsert=True) for key, update in ops]
+        try:
+            result = await self._collection(table).bulk_write(requests, ordered=False)
+            return set(result.upserted_ids), {}
+        except BulkWriteError as e:
+            upserted = {u["index"] for u in e.details.get("upserted", [])}
+            errors = {err["index"]: self._write_error(err) for err in e.details.get("writeErrors", [])}
+            return upserted, errors
+
+    async def bulk_upsert_once(self, table, ops):
+        # A marker at or past the op makes the filter miss, and the upsert's insert
+        # then hits the unique key index: a duplicate key error means "applied earlier"
+        requests = [
+            UpdateOne(
+                {**key, APPLIED_OPS_FIELD: {"$not": {"$elemMatch": {"s": op_id["s"], "n": {"$gte": op_id["n"]}}}}},
+                {**update, "$push": {APPLIED_OPS_FIELD: {"$each": [op_id], "$slice": -APPLIED_OPS_KEEP}}},
+                upsert=True
+            )
+            for key, update, op_id in ops
+        ]
+        try:
+            result = await self._collection(table).bulk_write(requests, ordered=False)
+            return set(result.upserted_ids), set(), {}
+        except BulkWriteError as e:
+            upserted = {u["index"] for u in e.details.get("upserted", [])}
+            applied, errors = set(), {}
+            for err in e.details.get("writeErrors", []):
+                if err.get("code") == 11000:
+                    applied.add(err["index"])
+                else:
+                    errors[err["index"]] = self._write_error(err)
+            return upserted, applied, errors
+
+    async def find_one(self, table, key, projection=None):
+        return await self._collection(table).find_one(key, projection)
+
+    @staticmethod
+    def _query(score_field, match=None, after=None, positive_only=False, since=None):
+        query = dict(match or {})
+        if positive_only:
+            query[score_field] = {"$gt": 0}
+        if since is not None:
+            query["last_played"] = {"$gte": since}
+        if after is not None:
+            score, wallet_address = after
+            # Seek past the previous position: an index range read, no skip()
+            query["$or"] = [
+                {score_field: {"$lt": score}},
+                {score_field: score, "wallet_address": {"$gt": wallet_address}}
+            ]
+        return query
+
+    async def top_k(self, table, score_field, limit, projection=None, match=None, after=None, positive_only=False):
+        cursor = self._collection(table).find(
+            self._query(score_field, match, after, positive_only), projection
+        ).sort([(score_field, -1), ("wallet_address", 1)]).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def scan(self, table, projection=None, since=None, batch_size=1000):
+        # With `since`, the planner may pick the last_played index and sort in memory:
+        # let that sort spill to disk rather than fail at the 100MB limit
+        cursor = self._collection(table).find(
+            self._query("score", since=since), projection, allow_disk_use=True
+        ).sort([("score", -1), ("wallet_address", 1)]).batch_size(batch_size)
+        async for doc in cursor:
+            yield doc
+
+    async def rank(self, wallet_address, score_field="score"):
+        doc = await self.find_one("leaderboard", {"wallet_address": wallet_address}, {score_field: 1})
+        if doc is None:
+            return None
+        score = get_field(doc, score_field, 0)
+        # A missing per-difficulty total counts as 0, as in the other engines
+        tied = {"$in": [0, None]} if score == 0 else score
+        ahead = await self._collection("leaderboard").count_documents({"$or": [
+            {score_field: {"$gt": score}},
+            {score_field: tied, "wallet_address": {"$lt": wallet_address}}
+        ]})
+        return ahead + 1
+
+    async def stats(self):
+        totals = await self._collection("leaderboard").aggregate([
+            {"$group": {"_id": None, "players": {"$sum": 1}, "games": {"$sum": "$total_games"}, "score": {"$sum": "$score"}}}
+        ]).to_list(length=1)
+        totals = totals[0] if totals else {}
+        return {"players": totals.get("players", 0), "games": totals.get("games", 0), "score": totals.get("score", 0)}
+
+    async def estimated_count(self, table):
+        return await self._collection(table).estimated_document_count()
+
+    async def insert_runs(self, runs):
+        try:
+            await self.runs.insert_many(runs, ordered=False)
+            return 0
+        except BulkWriteError as e:
+            return len(e.details.get("writeErrors", []))
+
+    async def scan_runs(self, fields, since=None, batch_size=50000):
+        query = {} if since is None else {"played_at": {"$gte": since}}
+        projection = {"_id": 0, **{field: 1 for field in fields}}
+        cursor = self.runs.find(query, projection, batch_size=batch_size)
+        while True:
+            docs = await cursor.to_list(batch_size)
+            if not docs:
+                break
+            yield {field: [doc.get(field) for doc in docs] for field in fields}
+
+    async def find_runs(self, wallet_address, limit, before=None):
+        query = {"wallet_address": wallet_address}
+        if before is not None:
+            played_at, run_id = before
+            query["$or"] = [
+                {"played_at": {"$lt": played_at}},
+                {"played_at": played_at, "run_id": {"$lt": run_id}}
+            ]
+        cursor = self.runs.find(query, {"_id": 0}).sort([("played_at", -1), ("run_id", -1)]).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def load_seasons(self):
+        try:
+            return await super().load_seasons()
+        except DuplicateKeyError:
+            # Another worker created the document at the same moment
+            return await self.find_one("stats", SEASONS_KEY, {"_id": 0})
+
+    async def prepare_season(self, season):
+        # Indexes on an empty collection build instantly
+        await self._create_leaderboard_indexes(self._collection(f"season:{season}"))
+
+    async def switch_season(self, previous, season, ended_status, now):
+        result = await self._collection("stats").update_one(
+            {**SEASONS_KEY, "current": previous}, season_switch_update(previous, season, ended_status, now)
+        )
+        return result.modified_count == 1
+
+    async def archive_season(self, season):
+        name = season_table(season)
+        await self.db.command(
+            "collMod", MONGO_COLLECTIONS.get(name, name),
+            validator=ARCHIVED_VALIDATOR, validationLevel="strict", validationAction="error"
+        )
+
+    async def unarchive_season(self, season):
+        name = season_table(season)
+        await self.db.command("collMod", MONGO_COLLECTIONS.get(name, name), validator={}, validationLevel="off")
+
+    async def reset(self, season=None):
+        season = self.active_season if season is None else season
+        leaderboard = self._collection(f"season:{season}")
+        if season == self.active_season:
+            removed = (await leaderboard.delete_many({})).deleted_count
+        else:
+            # Dropping a collection is one metadata operation, not a delete per document
+            removed = await leaderboard.estimated_document_count()
+            name = season_table(season)
+            await self.db.drop_collection(MONGO_COLLECTIONS.get(name, name))
+            self._collections.pop(name, None)
+        if season <= 1:
+            windows = {"window_id": {"$not": SEASON_WINDOW_PATTERN}}
+        else:
+            windows = {"window_id": {"$regex": f"^{season_window_prefix(season)}"}}  # Anchored: an index range read
+        await self._collection("windows").delete_many(windows)
+        await self._collection("stats").delete_one({"_id": season_stats_id(season)})
+        return removed
+
+
+class MemoryStorage(LeaderboardStorage):
+    """Everything in process memory; for benchmarks and tests (not durable)"""
+
+    name = "memory"
+
+    def __init__(self, runs_retention: timedelta = DEFAULT_RUNS_RETENTION):
+        self.tables: Dict[str, Dict[tuple, dict]] = {table: {} for table in MONGO_COLLECTIONS}
+        self.runs: Dict[str, List[dict]] = {}  # wallet -> runs in arrival order
+        self.runs_retention = runs_retention
+        self.archived: Set[str] = set()  # Physical tables of archived seasons
+
+    def _docs(self, table: str) -> Dict[tuple, dict]:
+        return self.tables.setdefault(self._table_name(table), {})
+
+    @staticmethod
+    def _key(key: dict) -> tuple:
+        return tuple(sorted(key.items()))
+
+    def _upsert(self, table, key, update, op_id=None):
+        """Returns True if the document was created, None if op_id was applied before"""
+        if self._table_name(table) in self.archived:
+            raise SeasonArchived(f"{self._table_name(table)} is archived")
+        docs = self._docs(table)
+        doc_key = self._key(key)
+        doc = docs.get(doc_key)
+        created = doc is None
+        if created:
+            doc = dict(key)
+        if op_id is not None and not record_applied_op(doc, op_id):
+            return None
+        if created:
+            docs[doc_key] = doc
+        apply_update_to_doc(doc, update, created)
+        return created
+
+    async def upsert_accumulate(self, table, key, update):
+        return self._upsert(table, key, update)
+
+    async def bulk_upsert(self, table, ops):
+        upserted, errors = set(), {}
+        for index, (key, update) in enumerate(ops):
+            try:
+                if self._upsert(table, key, update):
+                    upserted.add(index)
+            except Exception as e:
+                errors[index] = e
+        return upserted, errors
+
+    async def bulk_upsert_once(self, table, ops):
+        upserted, applied, errors = set(), set(), {}
+        for index, (key, update, op_id) in enumerate(ops):
+            try:
+                created = self._upsert(table, key, update, op_id)
+            except Exception as e:
+                errors[index] = e
+                continue
+            if created is None:
+                applied.add(index)
+            elif created:
+                upserted.add(index)
+        return upserted, applied, errors
+
+    async def find_one(self, table, key, projection=None):
+        doc = self._docs(table).get(self._key(key))
+        return None if doc is None else project(doc, projection)
+
+    def _candidates(self, table, score_field, match=None, after=None, positive_only=False, since=None):
+        for doc in self._docs(table).values():
+            if match and any(doc.get(field) != value for field, value in match.items()):
+                continue
+            score = get_field(doc, score_field, 0)
+            if positive_only and score <= 0:
+                continue
+            if since is not None and (doc.get("last_played") is None or doc["last_played"] < since):
+                continue
+            if after is not None and (-score, doc.get("wallet_address", "")) <= (-after[0], after[1]):
+                continue
+            yield doc
+
+    async def top_k(self, table, score_field, limit, projection=None, match=None, after=None, positive_only=False):
+        docs = heapq.nsmallest(
+            limit,
+            self._candidates(table, score_field, match, after, positive_only),
+            key=lambda doc: rank_sort_key(doc, score_field)
+        )
+        return [project(doc, projection) for doc in docs]
+
+    async def scan(self, table, projection=None, since=None, batch_size=1000):
+        docs = sorted(
+            self._candidates(table, "score", since=since),
+            key=lambda doc: rank_sort_key(doc, "score")
+        )
+        for index, doc in enumerate(docs):
+            yield project(doc, projection)
+            if index % batch_size == batch_size - 1:
+                await asyncio.sleep(0)  # Let other requests run between batches
+
+    async def rank(self, wallet_address, score_field="score"):
+        doc = self._docs("leaderboard").get(self._key({"wallet_address": wallet_address}))
+        if doc is None:
+            return None
+        key = rank_sort_key(doc, score_field)
+        return 1 + sum(
+            1 for other in self._docs("leaderboard").values()
+            if rank_sort_key(other, score_field) < key
+        )
+
+    async def stats(self):
+        docs = self._docs("leaderboard").values()
+        return {
+            "players": len(docs),
+            "games": sum(doc.get("total_games", 0) for doc in docs),
+            "score": sum(doc.get("score", 0) for doc in docs)
+        }
+
+    async def estimated_count(self, table):
+        return len(self._docs(table))
+
+    async def insert_runs(self, runs):
+        for run in runs:
+            self.runs.setdefault(run["wallet_address"], []).append(copy.deepcopy(run))
+        return 0
+
+    async def scan_runs(self, fields, since=None, batch_size=50000):
+        cutoff = datetime.utcnow() - self.runs_retention
+        if since is not None:
+            cutoff = max(cutoff, since)
+        runs = [run for wallet_runs in self.runs.values() for run in wallet_runs if run["played_at"] >= cutoff]
+        for start in range(0, len(runs), batch_size):
+            batch = runs[start:start + batch_size]
+            yield {field: [run.get(field) for run in batch] for field in fields}
+            await asyncio.sleep(0)
+
+    async def find_runs(self, wallet_address, limit, before=None):
+        cutoff = datetime.utcnow() - self.runs_retention
+        runs = self.runs.get(wallet_address, [])
+        runs[:] = [run for run in runs if run["played_at"] >= cutoff]  # Retention, applied lazily
+        candidates = [
+            run for run in runs
+            if before is None or (run["played_at"], run["run_id"]) < before
+        ]
+        newest = heapq.nlargest(limit, candidates, key=lambda run: (run["played_at"], run["run_id"]))
+        return [copy.deepcopy(run) for run in newest]
+
+    async def prepare_season(self, season):
+        self._docs(f"season:{season}")
+
+    async def switch_season(self, previous, season, ended_status, now):
+        state = await self.find_one("stats", SEASONS_KEY)
+        if state is None or state.get("current") != previous:
+            return False
+        self._upsert("stats", SEASONS_KEY, season_switch_update(previous, season, ended_status, now))
+        return True
+
+    async def archive_season(self, season):
+        self.archived.add(season_table(season))
+
+    async def unarchive_season(self, season):
+        self.archived.discard(season_table(season))
+
+    async def reset(self, season=None):
+        season = self.active_season if season is None else season
+        name = season_table(season)
+        removed = len(self.tables.get(name, {}))
+        if season == self.active_season:
+            self.tables[name] = {}
+        else:
+            self.tables.pop(name, None)
+            self.archived.discard(name)
+        windows = self._docs("windows")
+        for key in [key for key, doc in windows.items() if window_season(doc["window_id"]) == season]:
+            del windows[key]
+        self._docs("stats").pop(self._key({"_id": season_stats_id(season)}), None)
+        return removed
+
+
+# JSON round-trip for documents with datetimes (SQLite doc column, worker broker messages)
+def json_default(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Unsupported type: {type(value).__name__}")
+
+
+def json_object_hook(obj: dict):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+class SqliteStorage(LeaderboardStorage):
+    """SQLite in WAL mode. Documents are stored as JSON with the ranking fields
+    mirrored into indexed columns; statements run on a worker thread.
+    Timestamps are stored as fixed-width ISO strings so they compare as text."""
+
+    name = "sqlite"
+
+    # Primary result codes of a database that can't be used right now: SQLITE_BUSY, SQLITE_LOCKED,
+    # SQLITE_IOERR, SQLITE_CANTOPEN. Other OperationalErrors (e.g. a bad statement) are bugs, not outages.
+    # Each write is one transaction, so a statement failing with these left nothing applied.
+    UNAVAILABLE_CODES = (5, 6, 10, 14)
+    UNAVAILABLE_MESSAGES = ("database is locked", "database table is locked", "disk i/o error", "unable to open database")
+    ARCHIVED_MESSAGE = "season archived"  # Raised by an archived season's insert trigger
+
+    # Ranking fields mirrored into columns
+    SCORE_COLUMNS = {"score": "score", **{f"scores.{d}": f"score_{d}" for d in DIFFICULTIES}}
+
+    def __init__(self, path: str, runs_retention: timedelta = DEFAULT_RUNS_RETENTION):
+        self.path = path
+        self.runs_retention = runs_retention
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self.applied_migrations: List[int] = []
+        self._setup()  # Tables must exist before the first request, even without setup()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")  # Durable across app crashes in WAL mode
+        return conn
+
+    def is_unavailable(self, error):
+        if not isinstance(error, sqlite3.OperationalError):
+            return False
+        code = getattr(error, "sqlite_errorcode", None)  # Python 3.11+; extended codes keep the primary one in the low byte
+        if code is not None:
+            return code & 0xFF in self.UNAVAILABLE_CODES
+        message = str(error).lower()
+        return any(text in message for text in self.UNAVAILABLE_MESSAGES)
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(self._locked, fn, *args)
+
+    def _locked(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    def _setup(self):
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        for table in MONGO_COLLECTIONS:
+            self._create_table(table)
+        self._create_leaderboard_indexes("leaderboard")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS windows_rank ON windows (window_id, score DESC, wallet_address)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT NOT NULL,
+                wallet_address TEXT NOT NULL,
+                played_at TEXT NOT NULL,
+                doc TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_wallet ON runs (wallet_address, played_at DESC, run_id DESC)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_expiry ON runs (played_at)")
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.applied_migrations = [SCHEMA_VERSION]
+
+    def _create_table(self, name):
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                key TEXT PRIMARY KEY,
+                wallet_address TEXT,
+                window_id TEXT,
+                score INTEGER NOT NULL DEFAULT 0,
+                score_easy INTEGER NOT NULL DEFAULT 0,
+                score_hard INTEGER NOT NULL DEFAULT 0,
+                score_cursed INTEGER NOT NULL DEFAULT 0,
+                last_played TEXT,
+                doc TEXT NOT NULL
+            )
+        """)
+
+    def _create_leaderboard_indexes(self, name):
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_rank ON {name} (score DESC, wallet_address)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_wallet ON {name} (wallet_address)")
+        for difficulty in DIFFICULTIES:
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {name}_rank_{difficulty} "
+                f"ON {name} (score_{difficulty} DESC, wallet_address) WHERE score_{difficulty} > 0"
+            )
+
+    async def setup(self):
+        # Migrated when the database is opened; report what that applied
+        return self.applied_migrations
+
+    @staticmethod
+    def _doc_key(key: dict) -> str:
+        return json.dumps(sorted(key.items()), separators=(",", ":"))
+
+    def _upsert_many(self, table, ops, applied=None):
+        """ops are (key, update) or, when `applied` collects replayed duplicates, (key, update, op_id)"""
+        upserted, errors = set(), {}
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for index, op in enumerate(ops):
+                try:
+                    created = self._upsert_one(table, *op)
+                except sqlite3.IntegrityError as e:
+                    # The trigger aborts just this statement; the rest of the transaction goes on
+                    errors[index] = SeasonArchived(f"{table} is archived") if str(e) == self.ARCHIVED_MESSAGE else e
+                    continue
+                except Exception as e:
+                    errors[index] = e
+                    continue
+                if created is None:
+                    applied.add(index)
+                elif created:
+                    upserted.add(index)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return upserted, errors
+
+    def _upsert_one(self, table, key, update, op_id=None):
+        doc_key = self._doc_key(key)
+        row = self._conn.execute(f"SELECT doc FROM {table} WHERE key = ?", (doc_key,)).fetchone()
+        created = row is None
+        doc = dict(key) if created else json.loads(row[0], object_hook=json_object_hook)
+        if op_id is not None and not record_applied_op(doc, op_id):
+            return None
+        apply_update_to_doc(doc, update, created)
+        last_played = doc.get("last_played")
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {table} "
+            "(key, wallet_address, window_id, score, score_easy, score_hard, score_cursed, last_played, doc) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                doc_key,
+                doc.get("wallet_address"),
+                doc.get("window_id"),
+                doc.get("score", 0),
+                *(get_field(doc, f"scores.{d}", 0) for d in DIFFICULTIES),
+                last_played.isoformat(timespec="microseconds") if isinstance(last_played, datetime) else None,
+                json.dumps(doc, default=json_default, separators=(",", ":"))
+            )
+        )
+        return created
+
+    async def upsert_accumulate(self, table, key, update):
+        upserted, errors = await self._run(self._upsert_many, self._table_name(table), [(key, update)])
+        if errors:
+            raise errors[0]
+        return 0 in upserted
+
+    async def bulk_upsert(self, table, ops):
+        return await self._run(self._upsert_many, self._table_name(table), ops)
+
+    async def bulk_upsert_once(self, table, ops):
+        applied = set()
+        upserted, errors = await self._run(self._upsert_many, self._table_name(table), ops, applied)
+        return upserted, applied, errors
+
+    def _find_one(self, table, key):
+        row = self._conn.execute(f"SELECT doc FROM {table} WHERE key = ?", (self._doc_key(key),)).fetchone()
+        return None if row is None else json.loads(row[0], object_hook=json_object_hook)
+
+    async def find_one(self, table, key, projection=None):
+        doc = await self._run(self._find_one, self._table_name(table), key)
+        return None if doc is None else project(doc, projection)
+
+    def _where(self, score_field, match=None, after=None, positive_only=False, since=None):
+        column = self.SCORE_COLUMNS[score_field]
+        clauses, params = [], []
+        for field, value in (match or {}).items():
+            if field not in ("wallet_address", "window_id"):
+                raise ValueError(f"Unsupported match field: {field}")
+            clauses.append(f"{field} = ?")
+            params.append(value)
+        if positive_only:
+            clauses.append(f"{column} > 0")
+        if since is not None:
+            clauses.append("last_played >= ?")
+            params.append(since.isoformat(timespec="microseconds"))
+        if after is not None:
+            clauses.append(f"({column} < ? OR ({column} = ? AND wallet_address > ?))")
+            params.extend([after[0], after[0], after[1]])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return column, where, params
+
+    def _top_k(self, table, score_field, limit, match, after, positive_only):
+        column, where, params = self._where(score_field, match, after, positive_only)
+        rows = self._conn.execute(
+            f"SELECT doc FROM {table} {where} ORDER BY {column} DESC, wallet_address ASC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        return [json.loads(row[0], object_hook=json_object_hook) for row in rows]
+
+    async def top_k(self, table, score_field, limit, projection=None, match=None, after=None, positive_only=False):
+        docs = await self._run(self._top_k, self._table_name(table), score_field, limit, match, after, positive_only)
+        return [project(doc, projection) for doc in docs]
+
+    async def scan(self, table, projection=None, since=None, batch_size=1000):
+        # A separate read connection: WAL lets it read a consistent snapshot while writes continue
+        table = self._table_name(table)
+        conn = await asyncio.to_thread(sqlite3.connect, self.path, check_same_thread=False)
+        try:
+            column, where, params = self._where("score", since=since)
+            cursor = await asyncio.to_thread(
+                conn.execute, f"SELECT doc FROM {table} {where} ORDER BY {column} DESC, wallet_address ASC", params
+            )
+            while True:
+                rows = await asyncio.to_thread(cursor.fetchmany, batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield project(json.loads(row[0], object_hook=json_object_hook), projection)
+        finally:
+            await asyncio.to_thread(conn.close)
+
+    def _rank(self, table, wallet_address, score_field):
+        column = self.SCORE_COLUMNS[score_field]
+        row = self._conn.execute(
+            f"SELECT {column} FROM {table} WHERE wallet_address = ?", (wallet_address,)
+        ).fetchone()
+        if row is None:
+            return None
+        ahead = self._conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE {column} > ? OR ({column} = ? AND wallet_address < ?)",
+            (row[0], row[0], wallet_address)
+        ).fetchone()[0]
+        return ahead + 1
+
+    async def rank(self, wallet_address, score_field="score"):
+        return await self._run(self._rank, self._table_name("leaderboard"), wallet_address, score_field)
+
+    def _stats(self, table):
+        players, score, games = self._conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(score), 0), COALESCE(SUM(json_extract(doc, '$.total_games')), 0) FROM {table}"
+        ).fetchone()
+        return {"players": players, "games": games, "score": score}
+
+    async def stats(self):
+        return await self._run(self._stats, self._table_name("leaderboard"))
+
+    async def estimated_count(self, table):
+        table = self._table_name(table)
+        return await self._run(lambda: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+
+    def _insert_runs(self, runs):
+        cutoff = (datetime.utcnow() - self.runs_retention).isoformat(timespec="microseconds")
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT INTO runs (run_id, wallet_address, played_at, doc) VALUES (?, ?, ?, ?)",
+                [
+                    (run["run_id"], run["wallet_address"], run["played_at"].isoformat(timespec="microseconds"),
+                     json.dumps(run, default=json_default, separators=(",", ":")))
+                    for run in runs
+                ]
+            )
+            # Retention: an indexed range delete, piggybacked on the (background) batch insert
+            self._conn.execute("DELETE FROM runs WHERE played_at < ?", (cutoff,))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    async def insert_runs(self, runs):
+        await self._run(self._insert_runs, runs)
+        return 0
+
+    def _find_runs(self, wallet_address, limit, before):
+        clauses, params = ["wallet_address = ?"], [wallet_address]
+        if before is not None:
+            played_at = before[0].isoformat(timespec="microseconds")
+            clauses.append("(played_at < ? OR (played_at = ? AND run_id < ?))")
+            params.extend([played_at, played_at, before[1]])
+        rows = self._conn.execute(
+            f"SELECT doc FROM runs WHERE {' AND '.join(clauses)} ORDER BY played_at DESC, run_id DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        return [json.loads(row[0], object_hook=json_object_hook) for row in rows]
+
+    async def find_runs(self, wallet_address, limit, before=None):
+        return await self._run(self._find_runs, wallet_address, limit, before)
+
+    async def scan_runs(self, fields, since=None, batch_size=50000):
+        # Columns straight out of SQLite (no per-row JSON decode), on a separate WAL read connection
+        columns = ", ".join(
+            field if field in ("run_id", "wallet_address", "played_at") else f"json_extract(doc, '$.{field}')"
+            for field in fields
+        )
+        where, params = ("WHERE played_at >= ?", (since.isoformat(timespec="microseconds"),)) if since else ("", ())
+        conn = await asyncio.to_thread(sqlite3.connect, self.path, check_same_thread=False)
+        try:
+            cursor = await asyncio.to_thread(conn.execute, f"SELECT {columns} FROM runs {where}", params)
+            while True:
+                rows = await asyncio.to_thread(cursor.fetchmany, batch_size)
+                if not rows:
+                    break
+                yield {field: list(values) for field, values in zip(fields, zip(*rows))}
+        finally:
+            await asyncio.to_thread(conn.close)
+
+    def _prepare_season(self, season):
+        name = season_table(season)
+        self._create_table(name)
+        self._create_leaderboard_indexes(name)
+
+    async def prepare_season(self, season):
+        await self._run(self._prepare_season, season)
+
+    def _switch_season(self, previous, season, ended_status, now):
+        self._conn.execute("BEGIN IMMEDIATE")  # Holds the write lock across the compare and the set
+        try:
+            state = self._find_one("stats", SEASONS_KEY)
+            switched = state is not None and state.get("current") == previous
+            if switched:
+                self._upsert_one("stats", SEASONS_KEY, season_switch_update(previous, season, ended_status, now))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return switched
+
+    async def switch_season(self, previous, season, ended_status, now):
+        return await self._run(self._switch_season, previous, season, ended_status, now)
+
+    def _archive_season(self, season):
+        name = season_table(season)
+        # Every write is an INSERT OR REPLACE, so one trigger covers inserts and updates
+        self._conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {name}_archived BEFORE INSERT ON {name} "
+            f"BEGIN SELECT RAISE(ABORT, '{self.ARCHIVED_MESSAGE}'); END"
+        )
+
+    async def archive_season(self, season):
+        await self._run(self._archive_season, season)
+
+    async def unarchive_season(self, season):
+        await self._run(self._conn.execute, f"DROP TRIGGER IF EXISTS {season_table(season)}_archived")
+
+    def _reset(self, season, drop):
+        name = season_table(season)
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            if drop:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+                ).fetchone()
+                removed = self._conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] if exists else 0
+                self._conn.execute(f"DROP TABLE IF EXISTS {name}")
+            else:
+                removed = self._conn.execute(f"DELETE FROM {name}").rowcount
+            if season <= 1:
+                self._conn.execute("DELETE FROM windows WHERE window_id NOT GLOB 's[0-9]*:*'")
+            else:
+                self._conn.execute("DELETE FROM windows WHERE window_id GLOB ?", (f"{season_window_prefix(season)}*",))
+            self._conn.execute("DELETE FROM stats WHERE key = ?", (self._doc_key({"_id": season_stats_id(season)}),))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    async def reset(self, season=None):
+        season = self.active_season if season is None else season
+        return await self._run(self._reset, season, season != self.active_season)
+
+    async def close(self):
+        await self._run(self._conn.close)
+
+
+def create_storage(
+    engine: str,
+    db=None,
+    sqlite_path: str = "leaderboard.db",
+    runs_retention: timedelta = DEFAULT_RUNS_RETENTION
+) -> LeaderboardStorage:
+    """Build the storage engine selected by STORAGE_ENGINE"""
+    engine = engine.lower()
+    if engine == "mongo":
+        return MongoStorage(db, runs_retention)
+    if engine == "memory":
+        return MemoryStorage(runs_retention)
+    if engine == "sqlite":
+        return SqliteStorage(sqlite_path, runs_retention)
+    raise ValueError(f"Unknown storage engine: {engine}")
@@ -0,0 +1,118 @@
+"""
+Structured, non-blocking logging for the Degen Force backend.
+
+Request handlers put log records on a bounded in-memory queue; a background
+thread (QueueListener) formats them as JSON lines and writes them to stdout, so
+a slow stdout or container log driver never blocks the event loop.
+
+High-volume success lines can be sampled (LOG_SAMPLE_RATE). Warnings and errors
+are never sampled or dropped: if the queue is full they are written on the
+calling thread instead.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+LOGGER_NAME = "degen_force"
+
+_sample_rate = 1.0
+_handler = None
+_listener = None
+_stats = {"sampled_out": 0}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, plus the record's fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records without waiting; on overflow drop info/debug, write warnings+ synchronously"""
+
+    def __init__(self, log_queue: queue.Queue, fallback: logging.Handler):
+        super().__init__(log_queue)
+        self.fallback = fallback
+        self.stats = {"queued": 0, "dropped": 0, "written_sync": 0}
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process: hand the record over as is and
+        # leave message merging and JSON encoding to the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.stats["queued"] += 1
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                self.stats["written_sync"] += 1
+                self.fallback.handle(record)
+            else:
+                self.stats["dropped"] += 1
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room so stop() works (and drains) even when the queue is full
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(level: str = "INFO", sample_rate: float = 1.0, queue_size: int = 10000, stream=None) -> logging.Logger:
+    """Configure the backend's logger tree and start the background writer (idempotent)"""
+    global _sample_rate, _handler, _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    _sample_rate = max(0.0, min(1.0, sample_rate))
+    if _listener is not None:
+        return logger
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _handler = NonBlockingQueueHandler(queue.Queue(queue_size), output)
+    logger.addHandler(_handler)
+    logger.propagate = False
+    _listener = DrainingQueueListener(_handler.queue, output)
+    _listener.start()
+    atexit.register(_listener.stop)  # Drains the queue on exit
+    return logger
+
+
+def log_event(logger: logging.Logger, level: int, msg: str, sampled: bool = False, **fields):
+    """Log a structured record. sampled=True marks a high-volume success line
+    that is kept with probability LOG_SAMPLE_RATE (never applied to warnings+)."""
+    if not logger.isEnabledFor(level):
+        return
+    if sampled and level < logging.WARNING and _sample_rate < 1.0 and random.random() >= _sample_rate:
+        _stats["sampled_out"] += 1
+        return
+    logger.log(level, msg, extra={"fields": fields})
+
+
+def logging_stats() -> dict:
+    stats = {"sample_rate": _sample_rate, **_stats}
+    if _handler is not None:
+        stats.update(_handler.stats)
+        stats["queue_depth"] = _handler.queue.qsize()
+    return stats
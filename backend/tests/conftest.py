@@ -0,0 +1,73 @@
+"""
+Shared fixtures for the backend tests.
+
+The app runs on the in-memory storage engine, so no MongoDB is needed:
+    cd backend && python -m pytest tests
+"""
+import itertools
+import os
+import sys
+from contextlib import asynccontextmanager
+
+# Configure the server before it is imported: in-memory store, known admin key, no journal
+os.environ["STORAGE_ENGINE"] = "memory"
+os.environ["ADMIN_API_KEY"] = "test-admin-key"
+os.environ.pop("JOURNAL_DIR", None)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+
+import server
+from storage import create_storage
+
+ADMIN_HEADERS = {"X-Admin-Key": "test-admin-key"}
+_wallets = itertools.count()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@asynccontextmanager
+async def start_app(monkeypatch):
+    """Start the app on an empty in-memory store; yields a client for it
+    Patch other server globals before entering to have startup pick them up."""
+    store = create_storage("memory")
+    monkeypatch.setattr(server, "storage", store)
+    monkeypatch.setattr(server.run_history, "storage", store)
+    server.reset_local_leaderboard_state()
+    server.season_history.clear()
+    server.flagged_wallets.clear()
+    for view in server.leaderboard_views.values():
+        monkeypatch.setattr(view, "k", server.LEADERBOARD_TOP_K)  # Grown by earlier tests' flagged wallets
+    async with server.lifespan(server.app):
+        transport = httpx.ASGITransport(app=server.app, client=("10.0.0.1", 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    async with start_app(monkeypatch) as client:
+        yield client
+
+
+def make_wallet(prefix: str = "Wa") -> str:
+    """A wallet address no other test uses (keeps per-wallet rate limits apart)"""
+    return f"{prefix}{next(_wallets):040d}"
+
+
+def make_entry(wallet_address: str, score: int, difficulty: str = "easy", **fields) -> dict:
+    entry = {
+        "wallet_address": wallet_address,
+        "score": score,
+        "survival_time_seconds": 120,
+        "enemies_killed": 30,
+        "biome_reached": "Jungle",
+        "difficulty": difficulty
+    }
+    entry.update(fields)
+    return entry
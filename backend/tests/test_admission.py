@@ -0,0 +1,153 @@
+import asyncio
+
+import httpx
+import pytest
+
+import server
+from admission import AdmissionLimit, AdmissionMiddleware, Overloaded
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_waiters_are_admitted_in_fifo_order():
+    limit = AdmissionLimit("test", max_concurrent=1, max_queue=10, queue_timeout=1)
+    await limit.acquire()
+    order = []
+
+    async def request(n):
+        await limit.acquire()
+        order.append(n)
+        await asyncio.sleep(0)
+        limit.release()
+
+    waiters = [asyncio.ensure_future(request(n)) for n in range(5)]
+    await asyncio.sleep(0)
+    assert limit.queued == 5
+    assert not limit.try_acquire()  # Never ahead of requests already in line
+    limit.release()
+    await asyncio.gather(*waiters)
+
+    assert order == [0, 1, 2, 3, 4]
+    assert (limit.active, limit.queued) == (0, 0)
+
+
+async def test_full_queue_sheds_immediately():
+    limit = AdmissionLimit("test", max_concurrent=1, max_queue=1, queue_timeout=1)
+    await limit.acquire()
+    waiter = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as shed:
+        await limit.acquire()
+    assert shed.value.reason == "queue_full"
+    assert limit.stats["shed_queue_full"] == 1
+
+    limit.release()
+    await waiter
+    limit.release()
+    assert limit.active == 0
+
+
+async def test_deadline_sheds_and_leaves_the_queue():
+    limit = AdmissionLimit("test", max_concurrent=1, max_queue=5, queue_timeout=0.02)
+    await limit.acquire()
+
+    with pytest.raises(Overloaded) as shed:
+        await limit.acquire()
+    assert shed.value.reason == "deadline"
+    assert (limit.queued, limit.stats["shed_deadline"]) == (0, 1)
+    limit.release()
+    assert limit.active == 0
+
+
+async def test_cancelled_waiter_leaves_no_slot_behind():
+    limit = AdmissionLimit("test", max_concurrent=1, max_queue=5, queue_timeout=1)
+    await limit.acquire()
+    waiter = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limit.queued == 0
+    limit.release()
+    assert limit.active == 0
+
+
+async def test_slot_handed_over_as_the_waiter_gives_up_is_passed_on():
+    limit = AdmissionLimit("test", max_concurrent=1, max_queue=5, queue_timeout=1)
+    await limit.acquire()
+    first = asyncio.ensure_future(limit.acquire())
+    second = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+
+    # Hand the slot to the first waiter, then cancel it before it runs
+    limit.release()
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    await asyncio.wait_for(second, timeout=1)
+    limit.release()
+    assert (limit.active, limit.queued) == (0, 0)
+
+
+def build_app(limit: AdmissionLimit, gate: asyncio.Event, fallback: bool = False):
+    async def app(scope, receive, send):
+        if scope["path"] == "/slow":
+            await gate.wait()
+        flagged = scope.get("state", {}).get("admission_fallback", False)
+        body = b"fallback" if flagged else b"ok"
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    return AdmissionMiddleware(
+        app, {"api": limit}, lambda path: "api", fallback_routes=("api",) if fallback else (), retry_after=3
+    )
+
+
+async def test_middleware_sheds_with_retry_after():
+    gate = asyncio.Event()
+    limit = AdmissionLimit("api", max_concurrent=1, max_queue=0, queue_timeout=1)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app(limit, gate)), base_url="http://test") as client:
+        slow = asyncio.ensure_future(client.get("/slow"))
+        while limit.active == 0:
+            await asyncio.sleep(0)
+        shed = await client.get("/fast")
+        gate.set()
+        assert (await slow).status_code == 200
+
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "3"
+    assert limit.active == 0
+
+
+async def test_shed_requests_are_timed_under_their_admission_class():
+    gate = asyncio.Event()
+    limit = AdmissionLimit("api", max_concurrent=1, max_queue=0, queue_timeout=1)
+    app = server.MetricsMiddleware(build_app(limit, gate))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        slow = asyncio.ensure_future(client.get("/slow"))
+        while limit.active == 0:
+            await asyncio.sleep(0)
+        assert (await client.get("/fast")).status_code == 503
+        gate.set()
+        await slow
+
+    rendered = "\n".join(server.http_request_duration.render())
+    assert 'route="admission:api",status="503"' in rendered
+    assert 'route="unmatched",status="200"' in rendered  # Admitted, but this bare app has no router
+
+
+async def test_fallback_routes_go_ahead_flagged_instead_of_waiting():
+    gate = asyncio.Event()
+    limit = AdmissionLimit("api", max_concurrent=1, max_queue=0, queue_timeout=1)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=build_app(limit, gate, fallback=True)), base_url="http://test") as client:
+        slow = asyncio.ensure_future(client.get("/slow"))
+        while limit.active == 0:
+            await asyncio.sleep(0)
+        fallback = await client.get("/fast")
+        gate.set()
+        assert (await slow).content == b"ok"
+
+    assert (fallback.status_code, fallback.content) == (200, b"fallback")
+    assert limit.stats["fallbacks"] == 1
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+import server
+from anomaly_scan import run_scan
+
+from conftest import ADMIN_HEADERS, make_entry, make_wallet, start_app
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    """A board of the top 3, so hiding a wallet has to reach past the cut"""
+    monkeypatch.setattr(server, "LEADERBOARD_TOP_K", 3)
+    monkeypatch.setattr(server, "ANOMALY_EXCLUDE", True)
+    async with start_app(monkeypatch) as client:
+        yield client
+
+
+async def flag(*wallets):
+    await server.storage.bulk_upsert("review", [
+        ({"wallet_address": wallet}, {"$set": {"wallet_address": wallet, "status": "flagged"}}) for wallet in wallets
+    ])
+    await server.refresh_flagged_wallets()
+
+
+async def test_flagged_wallets_are_hidden_before_the_top_k_cut(client):
+    wallets = [make_wallet() for _ in range(5)]
+    for score, wallet in zip((500, 400, 300, 200, 100), wallets):
+        await client.post("/api/leaderboard/submit", json=make_entry(wallet, score))
+    await client.get("/api/leaderboard")
+    await flag(wallets[0])
+
+    board = (await client.get("/api/leaderboard")).json()["leaderboard"]
+    assert [(row["rank"], row["wallet_address"]) for row in board] == [(1, wallets[1]), (2, wallets[2]), (3, wallets[3])]
+
+    page = (await client.get("/api/leaderboard/page", params={"limit": 2})).json()
+    assert [row["rank"] for row in page["leaderboard"]] == [1, 2]
+    rest = (await client.get("/api/leaderboard/page", params={"limit": 10, "cursor": page["next_cursor"]})).json()
+    assert [(row["rank"], row["wallet_address"]) for row in rest["leaderboard"]] == [(3, wallets[3]), (4, wallets[4])]
+
+    stats = (await client.get("/api/stats")).json()["stats"]
+    assert stats["top_score"] == 400
+
+
+async def test_flagged_wallets_have_no_rank_or_profile(client):
+    wallets = [make_wallet() for _ in range(3)]
+    for score, wallet in zip((300, 200, 100), wallets):
+        await client.post("/api/leaderboard/submit", json=make_entry(wallet, score))
+    await flag(wallets[0])
+
+    assert (await client.get(f"/api/leaderboard/rank/{wallets[0]}")).status_code == 404
+    assert (await client.get(f"/api/player/{wallets[0]}")).status_code == 404
+    rank = (await client.get(f"/api/leaderboard/rank/{wallets[2]}", params={"around": 5})).json()
+    assert (rank["rank"], rank["total_players"]) == (2, 2)
+    assert [row["wallet_address"] for row in rank["around"]] == [wallets[1], wallets[2]]
+    profile = (await client.get(f"/api/player/{wallets[1]}")).json()["player"]
+    assert (profile["rank"], profile["difficulties"]["easy"]["rank"]) == (1, 1)
+
+
+async def test_admin_export_still_includes_flagged_wallets(client):
+    wallet = make_wallet()
+    await client.post("/api/leaderboard/submit", json=make_entry(wallet, 100))
+    await flag(wallet)
+
+    response = await client.get("/api/admin/leaderboard/export", headers=ADMIN_HEADERS)
+    assert wallet in response.text
+    anomalies = (await client.get("/api/admin/anomalies", headers=ADMIN_HEADERS)).json()
+    assert [row["wallet_address"] for row in anomalies["wallets"]] == [wallet]
+
+
+async def test_export_ranks_count_only_visible_wallets(client):
+    wallets = [make_wallet() for _ in range(3)]
+    for score, wallet in zip((500, 300, 100), wallets):
+        await client.post("/api/leaderboard/submit", json=make_entry(wallet, score))
+    await flag(wallets[0])
+
+    for params in ({}, {"since": "2000-01-01T00:00:00"}):
+        response = await client.get("/api/admin/leaderboard/export", params=params, headers=ADMIN_HEADERS)
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [(row["wallet_address"], row["rank"]) for row in rows] == [(wallets[0], None), (wallets[1], 1), (wallets[2], 2)]
+
+
+async def test_scan_needs_at_least_one_flagged_run(client):
+    await client.post("/api/leaderboard/submit", json=make_entry(make_wallet(), 100))
+    await server.run_history.flush()
+    with pytest.raises(ValueError, match="min_flagged_runs"):
+        await run_scan(server.storage, None, min_flagged_runs=0)
+    assert (await run_scan(server.storage, None, min_flagged_runs=1, dry_run=True))["flagged_wallets"] == 0
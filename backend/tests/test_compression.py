@@ -0,0 +1,65 @@
+import gzip
+
+import pytest
+
+import server
+from server import negotiate_encoding
+
+from conftest import make_entry, make_wallet
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def encodings(monkeypatch):
+    monkeypatch.setattr(server, "LEADERBOARD_ENCODINGS", ("br", "gzip"))
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.1, br;q=0", "gzip"),
+    ("GZIP;Q=0.8", "gzip"),
+    ("gzip;q=oops", None),
+])
+def test_negotiate_encoding(encodings, accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+async def test_compressed_variants_match_the_identity_body(client):
+    for score in range(30, 0, -1):
+        await client.post("/api/leaderboard/submit", json=make_entry(make_wallet(), score))
+    await client.get("/api/leaderboard")  # Build the snapshot, so the next reads are cached
+
+    identity = await client.get("/api/leaderboard", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in identity.headers
+    assert identity.headers["Vary"] == "Accept-Encoding"
+    for encoding in server.LEADERBOARD_ENCODINGS:
+        response = await client.get("/api/leaderboard", headers={"Accept-Encoding": encoding})
+        assert response.headers["Content-Encoding"] == encoding
+        assert response.headers["ETag"] == identity.headers["ETag"]
+        assert response.content == identity.content  # httpx decodes the body
+        assert int(response.headers["Content-Length"]) < len(identity.content)
+
+
+async def test_small_bodies_are_sent_uncompressed(client):
+    await client.post("/api/leaderboard/submit", json=make_entry(make_wallet(), 5))
+    response = await client.get("/api/leaderboard", params={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+    assert len(response.content) < server.LEADERBOARD_COMPRESS_MIN_BYTES
+    assert "Content-Encoding" not in response.headers
+    assert response.json()["total"] == 1
+
+
+def test_gzip_variants_are_complete_streams(encodings):
+    rows = [{"rank": n, "wallet_address": f"w{n:040d}", "score": 1000 - n} for n in range(100)]
+    snapshot = server.LeaderboardSnapshot(rows)
+    snapshot.compress()
+    prefix, _ = snapshot.body(100)
+    for tail in server.LEADERBOARD_CACHED_TAILS:
+        assert gzip.decompress(snapshot.variant(100, "gzip", tail)) == prefix + tail
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+
+import server
+
+from conftest import make_entry, make_wallet
+
+pytestmark = pytest.mark.anyio
+
+
+async def board(client, difficulty):
+    response = await client.get("/api/leaderboard", params={"difficulty": difficulty})
+    assert response.status_code == 200
+    return [(row["wallet_address"], row["score"], row["total_games"]) for row in response.json()["leaderboard"]]
+
+
+async def test_difficulty_boards_rank_per_difficulty_totals(client):
+    both, hard_only, easy_only = make_wallet(), make_wallet(), make_wallet()
+    await client.post("/api/leaderboard/submit", json=make_entry(both, 100, "easy"))
+    await client.post("/api/leaderboard/submit", json=make_entry(both, 30, "hard"))
+    await client.post("/api/leaderboard/submit", json=make_entry(both, 25, "hard"))
+    await client.post("/api/leaderboard/submit", json=make_entry(hard_only, 50, "hard"))
+    await client.post("/api/leaderboard/submit", json=make_entry(easy_only, 70, "easy"))
+
+    assert await board(client, "hard") == [(both, 55, 2), (hard_only, 50, 1)]
+    assert await board(client, "easy") == [(both, 100, 1), (easy_only, 70, 1)]
+    assert await board(client, "cursed") == []
+
+    # The live view is patched in place by the next submission
+    await client.post("/api/leaderboard/submit", json=make_entry(hard_only, 10, "hard"))
+    server.invalidate_leaderboard_cache()
+    assert await board(client, "hard") == [(hard_only, 60, 2), (both, 55, 2)]
+
+
+async def test_backfilled_documents_show_on_their_difficulty_board(client):
+    """Documents from before per-difficulty totals, as schema 5 backfills them"""
+    wallet = make_wallet()
+    now = datetime.utcnow()
+    await server.storage.bulk_upsert("leaderboard", [({"wallet_address": wallet}, {"$set": {
+        "wallet_address": wallet, "score": 40, "total_games": 3, "last_difficulty": "cursed",
+        "scores": {"cursed": 40}, "games": {"cursed": 3}, "timestamp": now, "last_played": now
+    }})])
+    await server.rebuild_rank_index()
+    server.unload_leaderboard_views()
+    server.invalidate_leaderboard_cache()
+
+    assert await board(client, "cursed") == [(wallet, 40, 3)]
+    assert await board(client, "easy") == []
+    assert (await client.get(f"/api/player/{wallet}")).json()["player"]["difficulties"]["cursed"]["rank"] == 1
+
+
+async def test_profile_falls_back_to_storage_ranks_while_the_index_is_empty(client, monkeypatch):
+    """As after a restart, before the rank indexes are rebuilt"""
+    leader, player = make_wallet(), make_wallet()
+    await client.post("/api/leaderboard/submit", json=make_entry(leader, 100, "hard"))
+    await client.post("/api/leaderboard/submit", json=make_entry(player, 40, "hard"))
+    await client.post("/api/leaderboard/submit", json=make_entry(player, 5, "easy"))
+    monkeypatch.setattr(server, "rank_index", server.RankIndex())
+    monkeypatch.setattr(server, "difficulty_rank_indexes", {difficulty: server.RankIndex() for difficulty in server.DIFFICULTIES})
+    server.player_cache.clear()
+
+    profile = (await client.get(f"/api/player/{player}")).json()["player"]
+    assert (profile["rank"], profile["total_players"]) == (2, 2)
+    assert {difficulty: ranks["rank"] for difficulty, ranks in profile["difficulties"].items() if ranks["rank"]} == {"hard": 2, "easy": 1}
+    assert (await client.get(f"/api/player/{make_wallet()}")).status_code == 404
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import AutoReconnect, DuplicateKeyError, NetworkTimeout, NotPrimaryError, ServerSelectionTimeoutError
+
+import server
+from journal import CircuitBreaker, SubmissionJournal
+from storage import create_storage, json_default, record_applied_op
+
+from conftest import make_entry, make_wallet, start_app
+
+pytestmark = pytest.mark.anyio
+
+DEAD_PID = 4194399  # Above Linux's largest pid_max, so never a live process
+
+
+def write_segment(directory, created_ns: int, pid: int, records, torn: bytes = b"") -> str:
+    path = os.path.join(directory, f"journal-{created_ns:020d}-{pid}.log")
+    with open(path, "wb") as file:
+        for record in records:
+            file.write(json.dumps(record, default=json_default).encode("utf-8") + b"\n")
+        file.write(torn)
+    return path
+
+
+class Collector:
+    """replay() target that records the batches it was given, optionally failing one"""
+
+    def __init__(self, fail_at=None):
+        self.batches = []
+        self.fail_at = fail_at
+
+    async def __call__(self, batch):
+        if self.fail_at is not None and len(self.batches) == self.fail_at:
+            self.fail_at = None
+            raise ConnectionError("store down")
+        self.batches.append(batch)
+
+    @property
+    def records(self):
+        return [record for batch in self.batches for record in batch]
+
+
+async def test_appended_records_replay_in_order_with_stable_op_ids(tmp_path):
+    journal = SubmissionJournal(str(tmp_path), fsync_interval_ms=1)
+    await journal.open()
+    played_at = datetime(2026, 1, 2, 3, 4, 5, 678000)
+    await journal.append([{"n": 0, "played_at": played_at}, {"n": 1}])
+    await journal.append([{"n": 2}])
+    assert journal.depth == 3
+
+    collect = Collector()
+    assert await journal.replay(collect, batch_size=2) == 3
+    assert [len(batch) for batch in collect.batches] == [2, 1]
+    assert [record["n"] for record in collect.records] == [0, 1, 2]
+    assert collect.records[0]["played_at"] == played_at
+    sources = {record["op_id"]["s"] for record in collect.records}
+    assert len(sources) == 1
+    assert [record["op_id"]["n"] for record in collect.records] == [0, 1, 2]
+    assert journal.depth == 0
+    assert os.listdir(tmp_path) == []
+
+
+async def test_concurrent_appends_share_one_fsync(tmp_path):
+    journal = SubmissionJournal(str(tmp_path), fsync_interval_ms=20)
+    await journal.open()
+    await asyncio.gather(*(journal.append([{"n": n}]) for n in range(25)))
+    assert (journal.stats["appended"], journal.stats["fsyncs"]) == (25, 1)
+    await journal.close()
+
+
+async def test_failed_batch_is_retried_without_replaying_earlier_ones(tmp_path):
+    journal = SubmissionJournal(str(tmp_path), fsync_interval_ms=1)
+    await journal.open()
+    await journal.append([{"n": n} for n in range(5)])
+
+    collect = Collector(fail_at=1)
+    with pytest.raises(ConnectionError):
+        await journal.replay(collect, batch_size=2)
+    assert journal.depth == 3
+    await journal.replay(collect, batch_size=2)
+    assert [record["n"] for record in collect.records] == [0, 1, 2, 3, 4]
+    assert journal.depth == 0
+
+
+async def test_exited_workers_segments_are_claimed_and_torn_lines_skipped(tmp_path):
+    write_segment(tmp_path, 1000, DEAD_PID, [{"n": 0}, {"n": 1}], torn=b'{"n": 2, "wal')
+    write_segment(tmp_path, 2000, DEAD_PID, [{"n": 3}])
+    journal = SubmissionJournal(str(tmp_path), fsync_interval_ms=1)
+
+    assert await journal.open() == 3
+    assert (journal.stats["segments_claimed"], journal.stats["corrupt_records"]) == (2, 1)
+    assert sorted(os.listdir(tmp_path)) == [f"journal-{ns:020d}-{os.getpid()}.log" for ns in (1000, 2000)]
+
+    collect = Collector()
+    await journal.replay(collect, batch_size=10)
+    # Oldest segment first; op ids keep the segment's creation time across the claim
+    assert [(record["n"], record["op_id"]) for record in collect.records] == [
+        (0, {"s": 1000, "n": 0}), (1, {"s": 1000, "n": 1}), (3, {"s": 2000, "n": 0})
+    ]
+
+
+async def test_live_workers_segments_are_left_alone(tmp_path):
+    write_segment(tmp_path, 1000, os.getppid(), [{"n": 0}])
+    journal = SubmissionJournal(str(tmp_path), fsync_interval_ms=1)
+    assert await journal.open() == 0
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_high_water_mark_skips_ops_at_or_below_it():
+    doc = {}
+    assert record_applied_op(doc, {"s": 1, "n": 5})
+    assert not record_applied_op(doc, {"s": 1, "n": 5})
+    assert not record_applied_op(doc, {"s": 1, "n": 3})
+    assert record_applied_op(doc, {"s": 2, "n": 0})
+    assert record_applied_op(doc, {"s": 1, "n": 6})
+
+    for n in range(7, 100):
+        record_applied_op(doc, {"s": 1, "n": n})
+    assert len(doc["applied_ops"]) == 16
+    assert not record_applied_op(doc, {"s": 1, "n": 50})
+
+
+async def test_bulk_upsert_once_is_idempotent():
+    store = create_storage("memory")
+    ops = [({"wallet_address": "w1"}, {"$inc": {"score": 5}}, {"s": 1, "n": 0})]
+    assert await store.bulk_upsert_once("leaderboard", ops) == ({0}, set(), {})
+    assert await store.bulk_upsert_once("leaderboard", ops) == (set(), {0}, {})
+    assert (await store.find_one("leaderboard", {"wallet_address": "w1"}))["score"] == 5
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert breaker.is_open and not breaker.probe_due()
+
+    time.sleep(0.06)
+    assert breaker.probe_due()
+    assert not breaker.record_failure()  # Failed probe: wait another reset_timeout
+    assert not breaker.probe_due()
+
+    assert breaker.record_success()
+    assert not breaker.is_open and breaker.probe_due()
+    assert not breaker.record_success()
+    assert (breaker.stats["opened"], breaker.stats["closed"]) == (1, 1)
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=1)
+    breaker.record_failure()
+    breaker.record_success()
+    assert not breaker.record_failure()
+    assert not breaker.is_open
+
+
+async def test_unreachable_store_errors_are_journaled(tmp_path):
+    mongo = create_storage("mongo", AsyncIOMotorClient("mongodb://localhost:1", connect=False)["test"])
+    for error in (ServerSelectionTimeoutError("no primary"), NotPrimaryError("stepped down"), AutoReconnect("reset"), NetworkTimeout("timed out")):
+        assert mongo.is_unavailable(error)
+    assert not mongo.is_unavailable(DuplicateKeyError("E11000"))
+
+    store = create_storage("sqlite", sqlite_path=str(tmp_path / "leaderboard.db"))
+    assert store.is_unavailable(sqlite3.OperationalError("database is locked"))
+    assert store.is_unavailable(sqlite3.OperationalError("unable to open database file"))
+    assert not store.is_unavailable(sqlite3.OperationalError("no such column: scroe"))
+    assert not store.is_unavailable(ValueError("database is locked"))
+    assert not create_storage("memory").is_unavailable(ConnectionError("down"))
+
+
+@pytest.fixture
+async def journaled_client(monkeypatch, tmp_path):
+    """The app with a journal, and a breaker the test opens and closes by hand"""
+    monkeypatch.setattr(server, "submission_journal", SubmissionJournal(str(tmp_path), 1))
+    monkeypatch.setattr(server, "store_breaker", CircuitBreaker(1, 3600))
+    monkeypatch.setattr(server, "JOURNAL_REPLAY_INTERVAL", 3600)
+    async with start_app(monkeypatch) as client:
+        yield client
+
+
+async def test_submissions_are_queued_while_the_store_is_down_and_replayed_once(journaled_client):
+    client = journaled_client
+    wallet, other = make_wallet(), make_wallet()
+    await client.post("/api/leaderboard/submit", json=make_entry(wallet, 10))
+    server.store_breaker.record_failure()
+
+    response = await client.post("/api/leaderboard/submit", json=make_entry(wallet, 20))
+    assert response.status_code == 202
+    assert response.json()["queued"] is True
+    response = await client.post("/api/leaderboard/submit-batch", json={"entries": [make_entry(wallet, 5), make_entry(other, 7)]})
+    assert (response.json()["accepted"], response.json()["queued"]) == (2, 2)
+    assert server.submission_journal.depth == 3  # One record per submission, one per wallet of the batch
+    assert (await client.get(f"/api/leaderboard/rank/{wallet}")).json()["score"] == 10
+
+    server.store_breaker.record_success()
+    assert await server.replay_journal() == 3
+    assert server.submission_journal.depth == 0
+    assert (await client.get(f"/api/leaderboard/rank/{wallet}")).json()["score"] == 35
+    assert (await client.get(f"/api/leaderboard/rank/{other}")).json()["score"] == 7
+    doc = await server.storage.find_one("leaderboard", {"wallet_address": wallet})
+    assert doc["total_games"] == 3
+
+    # Direct writes resume once the journal is drained
+    assert (await client.post("/api/leaderboard/submit", json=make_entry(other, 1))).status_code == 200
+
+
+async def test_failover_mid_write_is_journaled_and_counted_once(journaled_client, monkeypatch):
+    """AutoReconnect leaves a write's outcome unknown: whether it landed or not, replay counts it once"""
+    client = journaled_client
+    store = server.storage
+    monkeypatch.setattr(store, "is_unavailable", lambda error: isinstance(error, AutoReconnect))
+    upsert_accumulate = store.upsert_accumulate
+
+    async def failover(table, key, update, landed):
+        if landed:
+            await upsert_accumulate(table, key, update)
+        raise AutoReconnect("connection reset during failover")
+
+    duplicates = server.journal_state["duplicates"]
+    landed, lost = make_wallet(), make_wallet()
+    for wallet in (landed, lost):
+        await client.post("/api/leaderboard/submit", json=make_entry(wallet, 10))
+        monkeypatch.setattr(store, "upsert_accumulate", lambda table, key, update, wallet=wallet: failover(table, key, update, wallet == landed))
+        response = await client.post("/api/leaderboard/submit", json=make_entry(wallet, 20))
+        assert response.status_code == 202 and response.json()["queued"] is True
+        monkeypatch.setattr(store, "upsert_accumulate", upsert_accumulate)
+        assert server.submission_journal.depth == 1
+
+        server.store_breaker.record_success()
+        assert await server.replay_journal() == 1
+        doc = await store.find_one("leaderboard", {"wallet_address": wallet})
+        assert (doc["score"], doc["total_games"]) == (30, 2)
+        assert (await client.get(f"/api/leaderboard/rank/{wallet}")).json()["score"] == 30
+    assert server.journal_state["duplicates"] == duplicates + 1  # The write that landed was skipped
+
+
+async def test_health_reports_the_store_and_fails_only_without_a_journal(client, monkeypatch):
+    health = await client.get("/api/health")
+    assert (health.status_code, health.json()["status"], health.json()["store"]["reachable"]) == (200, "healthy", True)
+
+    async def unreachable(*args, **kwargs):
+        raise ConnectionError("store down")
+
+    monkeypatch.setattr(server.storage, "find_one", unreachable)
+    for path in ("/health", "/api/health"):
+        health = await client.get(path)
+        assert (health.status_code, health.json()["status"], health.json()["store"]["reachable"]) == (503, "unavailable", False)
+
+
+async def test_health_is_degraded_while_submissions_are_journaled(journaled_client):
+    server.store_breaker.record_failure()
+    health = await journaled_client.get("/api/health")
+    assert (health.status_code, health.json()["status"], health.json()["store"]["reachable"]) == (200, "degraded", False)
+
+
+async def test_stats_seeding_only_ignores_losing_the_race(client, monkeypatch):
+    async def missing(*args, **kwargs):
+        return None
+
+    async def raced(*args, **kwargs):
+        raise DuplicateKeyError("E11000 duplicate key error")
+
+    async def broken(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(server.storage, "find_one", missing)
+    monkeypatch.setattr(server.storage, "upsert_accumulate", raced)
+    await server.seed_stats_counters()  # Another worker seeded it first
+    monkeypatch.setattr(server.storage, "upsert_accumulate", broken)
+    with pytest.raises(RuntimeError, match="disk full"):
+        await server.seed_stats_counters()
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+import server
+from server import etag_matches
+
+from conftest import make_entry, make_wallet
+
+pytestmark = pytest.mark.anyio
+
+
+async def submit_players(client, count: int):
+    for score in range(count, 0, -1):
+        response = await client.post("/api/leaderboard/submit", json=make_entry(make_wallet(), score * 10))
+        assert response.status_code == 200
+
+
+async def wait_for_new_etag(client, etag: str, **params) -> str:
+    """Stale-while-revalidate may serve the previous snapshot once more while it rebuilds"""
+    for _ in range(50):
+        response = await client.get("/api/leaderboard", params=params)
+        if response.headers["ETag"] != etag:
+            return response.headers["ETag"]
+        await asyncio.sleep(0.01)
+    raise AssertionError("snapshot was not rebuilt")
+
+
+def test_etag_matches_weak_lists_and_wildcard():
+    etag = 'W/"abc"'
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"zzz", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"zzz"', etag)
+    assert not etag_matches(None, etag)
+
+
+async def test_etag_is_stable_across_the_cached_flag_and_revalidates_with_304(client):
+    await submit_players(client, 3)
+
+    first = await client.get("/api/leaderboard")
+    second = await client.get("/api/leaderboard")
+    assert (first.json()["cached"], second.json()["cached"]) == (False, True)
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert first.json()["leaderboard"] == second.json()["leaderboard"]
+
+    not_modified = await client.get("/api/leaderboard", headers={"If-None-Match": first.headers["ETag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == first.headers["ETag"]
+
+
+async def test_new_score_changes_the_etag(client):
+    await submit_players(client, 3)
+    etag = (await client.get("/api/leaderboard")).headers["ETag"]
+
+    await client.post("/api/leaderboard/submit", json=make_entry(make_wallet(), 1000))
+    new_etag = await wait_for_new_etag(client, etag)
+    response = await client.get("/api/leaderboard", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == new_etag
+    assert response.json()["leaderboard"][0]["score"] == 1000
+
+
+async def test_limits_share_one_snapshot_with_their_own_etags(client):
+    await submit_players(client, 15)
+
+    top10 = await client.get("/api/leaderboard", params={"limit": 10})
+    top100 = await client.get("/api/leaderboard", params={"limit": 100})
+    top12 = await client.get("/api/leaderboard", params={"limit": 12})
+    assert (top10.json()["total"], top100.json()["total"], top12.json()["total"]) == (10, 15, 12)
+    assert top100.json()["leaderboard"][:12] == top12.json()["leaderboard"]
+    assert len({top10.headers["ETag"], top100.headers["ETag"], top12.headers["ETag"]}) == 3
+    # One snapshot build served all three limits
+    assert top12.json()["cached"] is True
+
+
+class GatedBuilds:
+    """Stands in for build_leaderboard_snapshot: counts builds, each held until released"""
+
+    def __init__(self, monkeypatch):
+        self.build = server.build_leaderboard_snapshot
+        self.release = asyncio.Event()
+        self.calls = 0
+        monkeypatch.setattr(server, "build_leaderboard_snapshot", self)
+
+    async def __call__(self, view_key="all"):
+        self.calls += 1
+        await self.release.wait()
+        return await self.build(view_key)
+
+
+async def test_concurrent_misses_share_one_build(client, monkeypatch):
+    await submit_players(client, 3)
+    builds = GatedBuilds(monkeypatch)
+    stats = server.leaderboard_cache_stats["leaderboard_all"]
+    misses, coalesced = stats["misses"], stats["coalesced"]
+
+    requests = [asyncio.ensure_future(client.get("/api/leaderboard")) for _ in range(8)]
+    await asyncio.sleep(0.01)
+    assert builds.calls == 1 and not any(request.done() for request in requests)
+    builds.release.set()
+    responses = await asyncio.gather(*requests)
+
+    assert builds.calls == 1
+    assert (stats["misses"] - misses, stats["coalesced"] - coalesced) == (1, 7)
+    assert len({response.headers["ETag"] for response in responses}) == 1
+    assert all(response.json()["cached"] is False for response in responses)
+
+
+async def test_stale_snapshot_is_served_while_one_task_rebuilds_it(client, monkeypatch):
+    await submit_players(client, 3)
+    etag = (await client.get("/api/leaderboard")).headers["ETag"]
+    await client.post("/api/leaderboard/submit", json=make_entry(make_wallet(), 1000))
+    builds = GatedBuilds(monkeypatch)
+
+    # The view moved on, so the cached snapshot is stale: it keeps being served, without waiting
+    for _ in range(3):
+        response = await client.get("/api/leaderboard")
+        assert (response.headers["ETag"], response.json()["cached"]) == (etag, True)
+        await asyncio.sleep(0.01)  # The refresh has started and is held
+    assert builds.calls == 1
+
+    builds.release.set()
+    new_etag = await wait_for_new_etag(client, etag)
+    assert new_etag != etag and builds.calls == 1
+    assert (await client.get("/api/leaderboard")).json()["leaderboard"][0]["score"] == 1000
+
+
+async def test_without_stale_while_revalidate_a_stale_snapshot_waits_for_the_rebuild(client, monkeypatch):
+    monkeypatch.setattr(server, "LEADERBOARD_STALE_WHILE_REVALIDATE", False)
+    await submit_players(client, 3)
+    await client.get("/api/leaderboard")
+    await client.post("/api/leaderboard/submit", json=make_entry(make_wallet(), 1000))
+
+    response = await client.get("/api/leaderboard")
+    assert response.json()["cached"] is False
+    assert response.json()["leaderboard"][0]["score"] == 1000
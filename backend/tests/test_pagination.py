@@ -0,0 +1,55 @@
+import pytest
+
+from storage import create_storage
+
+from conftest import make_entry, make_wallet
+
+pytestmark = pytest.mark.anyio
+
+TIED_SCORES = (100, 100, 100, 100, 100, 100, 100, 50, 50, 50, 50, 50, 10, 10, 10, 10, 10, 10, 10, 10, 5)
+
+
+def expected_order(scores_by_wallet):
+    return sorted(scores_by_wallet.items(), key=lambda item: (-item[1], item[0]))
+
+
+async def test_pages_over_ties_have_no_gaps_or_duplicates(client):
+    scores_by_wallet = {}
+    for score in TIED_SCORES:
+        wallet = make_wallet()
+        await client.post("/api/leaderboard/submit", json=make_entry(wallet, score))
+        scores_by_wallet[wallet] = score
+
+    for limit in (1, 2, 3, 5, 8):
+        rows, cursor, pages = [], None, 0
+        while True:
+            params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+            page = (await client.get("/api/leaderboard/page", params=params)).json()
+            assert 0 < page["total"] <= limit
+            rows.extend(page["leaderboard"])
+            cursor, pages = page["next_cursor"], pages + 1
+            if cursor is None:
+                break
+        assert [(row["wallet_address"], row["score"]) for row in rows] == expected_order(scores_by_wallet)
+        assert [row["rank"] for row in rows] == list(range(1, len(TIED_SCORES) + 1))
+        assert pages == -(-len(TIED_SCORES) // limit)
+
+
+@pytest.mark.parametrize("engine", ["memory", "sqlite"])
+async def test_keyset_seek_resumes_inside_a_run_of_ties(engine, tmp_path):
+    store = create_storage(engine, sqlite_path=str(tmp_path / "leaderboard.db"))
+    await store.setup()
+    scores_by_wallet = {make_wallet("Tie"): score for score in TIED_SCORES}
+    _, errors = await store.bulk_upsert("leaderboard", [
+        ({"wallet_address": wallet}, {"$inc": {"score": score}}) for wallet, score in scores_by_wallet.items()
+    ])
+    assert not errors
+
+    seen, after = [], None
+    while True:
+        docs = await store.top_k("leaderboard", "score", 4, {"_id": 0, "wallet_address": 1, "score": 1}, after=after)
+        if not docs:
+            break
+        seen.extend((doc["wallet_address"], doc["score"]) for doc in docs)
+        after = (docs[-1]["score"], docs[-1]["wallet_address"])
+    assert seen == expected_order(scores_by_wallet)
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from server import RankIndex
+
+from conftest import make_entry, make_wallet
+
+pytestmark = pytest.mark.anyio
+
+
+def ordered(scores: dict):
+    """Reference ranking: score desc, wallet asc"""
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def test_rank_and_window_match_sorted_order():
+    random.seed(1)
+    index = RankIndex()
+    scores = {f"wallet{n:04d}": random.randint(0, 50) for n in range(300)}
+    index.load(scores.items())
+
+    expected = ordered(scores)
+    assert len(index) == len(scores)
+    for position, (wallet, _) in enumerate(expected, start=1):
+        assert index.rank(wallet) == position
+    assert index.window(10, 5) == [(position + 1, wallet, score) for position, (wallet, score) in enumerate(expected) if 10 <= position < 15]
+
+
+def test_set_increment_and_discard_keep_order():
+    random.seed(2)
+    index = RankIndex()
+    scores = {}
+    for _ in range(2000):
+        wallet = f"wallet{random.randint(0, 99):02d}"
+        action = random.random()
+        if action < 0.5:
+            scores[wallet] = scores.get(wallet, 0) + random.randint(1, 20)
+            assert index.increment(wallet, scores[wallet] - index.scores.get(wallet, 0)) == scores[wallet]
+        elif action < 0.8:
+            scores[wallet] = random.randint(0, 500)
+            index.set(wallet, scores[wallet])
+        else:
+            scores.pop(wallet, None)
+            index.discard(wallet)
+
+    assert len(index) == len(scores)
+    assert [(wallet, score) for _, wallet, score in index.window(0, len(scores))] == ordered(scores)
+
+
+def test_ties_break_on_wallet_and_unknown_wallet_has_no_rank():
+    index = RankIndex()
+    index.load([("b", 10), ("a", 10), ("c", 20)])
+    assert [wallet for _, wallet, _ in index.window(0, 3)] == ["c", "a", "b"]
+    assert index.rank("missing") is None
+
+
+def test_around_clips_at_the_edges():
+    index = RankIndex()
+    index.load([(f"w{n}", 100 - n) for n in range(10)])
+    assert [rank for rank, _, _ in index.around("w0", 2)] == [1, 2, 3]
+    assert [rank for rank, _, _ in index.around("w5", 2)] == [4, 5, 6, 7, 8]
+    assert [rank for rank, _, _ in index.around("w9", 2)] == [8, 9, 10]
+
+
+async def test_rank_endpoint(client):
+    wallets = [make_wallet() for _ in range(5)]
+    for score, wallet in zip((50, 40, 30, 20, 10), wallets):
+        response = await client.post("/api/leaderboard/submit", json=make_entry(wallet, score))
+        assert response.status_code == 200
+    await client.post("/api/leaderboard/submit", json=make_entry(wallets[4], 45, "hard"))
+
+    response = await client.get(f"/api/leaderboard/rank/{wallets[4]}", params={"around": 1})
+    body = response.json()
+    assert response.status_code == 200
+    assert (body["rank"], body["score"], body["total_players"]) == (1, 55, 5)
+    assert [row["wallet_address"] for row in body["around"]] == [wallets[4], wallets[0]]
+
+    response = await client.get(f"/api/leaderboard/rank/{wallets[4]}", params={"difficulty": "hard"})
+    assert (response.json()["rank"], response.json()["total_players"]) == (1, 1)
+
+    assert (await client.get(f"/api/leaderboard/rank/{make_wallet()}")).status_code == 404
+    assert (await client.get(f"/api/leaderboard/rank/{wallets[0]}", params={"difficulty": "nightmare"})).status_code == 400
@@ -0,0 +1,119 @@
+from datetime import datetime
+
+import pytest
+
+import server
+
+from conftest import ADMIN_HEADERS, make_entry, make_wallet
+
+pytestmark = pytest.mark.anyio
+
+
+async def rollover_from_another_process(previous: int, season: int):
+    """What another pod's rollover does to the shared store, without this worker seeing it"""
+    store = server.storage
+    await store.prepare_season(season)
+    await store.archive_season(previous)
+    assert await store.switch_season(previous, season, "archived", datetime.utcnow())
+
+
+async def test_admin_endpoints_require_the_key(client):
+    assert (await client.post("/api/admin/season/rollover")).status_code == 403
+    assert (await client.post("/api/admin/season/rollover", headers={"X-Admin-Key": "wrong"})).status_code == 403
+    assert (await client.delete("/api/leaderboard/reset")).status_code == 403
+    assert server.storage.active_season == 1
+
+
+async def test_rollover_starts_an_empty_season_and_keeps_the_old_one_readable(client):
+    wallet = make_wallet()
+    await client.post("/api/leaderboard/submit", json=make_entry(wallet, 100))
+    await client.get("/api/leaderboard")
+
+    response = await client.post("/api/admin/season/rollover", headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert (response.json()["previous"], response.json()["season"]) == (1, 2)
+
+    current = await client.get("/api/leaderboard")
+    assert current.json()["leaderboard"] == []
+    assert current.headers["X-Leaderboard-Season"] == "2"
+    archived = await client.get("/api/leaderboard", params={"season": 1})
+    assert [row["score"] for row in archived.json()["leaderboard"]] == [100]
+    assert (await client.get(f"/api/leaderboard/rank/{wallet}")).status_code == 404
+    assert (await client.get("/api/leaderboard", params={"season": 7})).status_code == 404
+
+    seasons = (await client.get("/api/seasons")).json()
+    assert seasons["current"] == 2
+    assert {season["season"]: season["status"] for season in seasons["seasons"]} == {1: "archived", 2: "active"}
+
+    await client.post("/api/leaderboard/submit", json=make_entry(wallet, 7))
+    assert (await client.get(f"/api/leaderboard/rank/{wallet}")).json()["score"] == 7
+    assert (await server.storage.find_one("season:1", {"wallet_address": wallet}))["score"] == 100
+
+
+async def test_archived_season_rejects_writes(client):
+    await client.post("/api/admin/season/rollover", headers=ADMIN_HEADERS)
+    with pytest.raises(server.SeasonArchived):
+        await server.storage.upsert_accumulate("season:1", {"wallet_address": make_wallet()}, {"$inc": {"score": 1}})
+
+
+async def test_submit_follows_a_rollover_made_elsewhere(client):
+    wallet = make_wallet()
+    await client.post("/api/leaderboard/submit", json=make_entry(wallet, 100))
+    await rollover_from_another_process(1, 2)
+    assert server.storage.active_season == 1
+
+    response = await client.post("/api/leaderboard/submit", json=make_entry(wallet, 7))
+    assert response.status_code == 200
+    assert server.storage.active_season == 2
+    assert (await server.storage.find_one("season:2", {"wallet_address": wallet}))["score"] == 7
+    assert (await server.storage.find_one("season:1", {"wallet_address": wallet}))["score"] == 100
+
+
+async def test_batch_follows_a_rollover_made_elsewhere(client):
+    wallet, other = make_wallet(), make_wallet()
+    await rollover_from_another_process(1, 2)
+
+    response = await client.post("/api/leaderboard/submit-batch", json={
+        "entries": [make_entry(wallet, 5), make_entry(other, 6)]
+    })
+    assert response.json()["accepted"] == 2
+    assert server.storage.active_season == 2
+    board = (await client.get("/api/leaderboard")).json()["leaderboard"]
+    assert [(row["wallet_address"], row["score"]) for row in board] == [(other, 6), (wallet, 5)]
+
+
+async def test_failed_switch_leaves_the_season_writable(client, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise RuntimeError("switch failed")
+    monkeypatch.setattr(server.storage, "switch_season", fail)
+
+    response = await client.post("/api/admin/season/rollover", headers=ADMIN_HEADERS)
+    assert response.status_code == 500
+    assert server.storage.active_season == 1
+    assert (await client.post("/api/leaderboard/submit", json=make_entry(make_wallet(), 3))).status_code == 200
+
+
+async def test_reset_empties_the_current_season_in_place(client):
+    wallet = make_wallet()
+    for score, player in ((30, wallet), (20, make_wallet())):
+        await client.post("/api/leaderboard/submit", json=make_entry(player, score))
+    await client.get("/api/leaderboard")
+
+    response = await client.delete("/api/leaderboard/reset", headers=ADMIN_HEADERS)
+    assert response.json()["deleted_count"] == 2
+    assert server.storage.active_season == 1
+    assert (await client.get("/api/leaderboard")).json()["leaderboard"] == []
+    assert (await client.get(f"/api/leaderboard/rank/{wallet}")).status_code == 404
+    stats = (await client.get("/api/stats")).json()["stats"]
+    assert (stats["total_scores"], stats["unique_players"], stats["total_games"]) == (0, 0, 0)
+
+    await client.post("/api/leaderboard/submit", json=make_entry(wallet, 5))
+    assert (await client.get(f"/api/leaderboard/rank/{wallet}")).json()["score"] == 5
+
+
+async def test_unauthenticated_reset_during_the_deprecation_window(client, monkeypatch):
+    await client.post("/api/leaderboard/submit", json=make_entry(make_wallet(), 30))
+    monkeypatch.setattr(server, "RESET_ALLOW_UNAUTHENTICATED", True)
+
+    assert (await client.delete("/api/leaderboard/reset")).json()["deleted_count"] == 1
+    assert (await client.delete("/api/leaderboard/reset", headers={"X-Admin-Key": "wrong"})).status_code == 403
@@ -0,0 +1,183 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from storage import SCHEMA_VERSION, SeasonArchived, create_storage
+
+pytestmark = pytest.mark.anyio
+
+PROJECTION = {"_id": 0, "wallet_address": 1, "score": 1}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+async def store(request, tmp_path):
+    """Every engine that runs without a server, held to the same contract"""
+    store = create_storage(request.param, sqlite_path=str(tmp_path / "leaderboard.db"))
+    await store.setup()
+    yield store
+    await store.close()
+
+
+def score_update(score: int, difficulty: str = "easy", played_at: datetime = None) -> dict:
+    return {
+        "$inc": {"score": score, "total_games": 1, f"scores.{difficulty}": score},
+        "$set": {"last_played": played_at or datetime.utcnow()},
+        "$max": {"best_enemies_killed": score // 10}
+    }
+
+
+def wallets(docs):
+    return [(doc["wallet_address"], doc["score"]) for doc in docs]
+
+
+async def test_upsert_accumulates_and_reports_created(store):
+    assert await store.upsert_accumulate("leaderboard", {"wallet_address": "w1"}, score_update(30)) is True
+    assert await store.upsert_accumulate("leaderboard", {"wallet_address": "w1"}, score_update(20, "hard")) is False
+
+    doc = await store.find_one("leaderboard", {"wallet_address": "w1"})
+    assert (doc["score"], doc["total_games"], doc["scores"], doc["best_enemies_killed"]) == (50, 2, {"easy": 30, "hard": 20}, 3)
+    assert await store.find_one("leaderboard", {"wallet_address": "w1"}, PROJECTION) == {"wallet_address": "w1", "score": 50}
+    assert await store.find_one("leaderboard", {"wallet_address": "nobody"}) is None
+
+
+async def test_bulk_upsert_reports_created_documents(store):
+    await store.upsert_accumulate("leaderboard", {"wallet_address": "w1"}, score_update(5))
+    upserted, errors = await store.bulk_upsert("leaderboard", [
+        ({"wallet_address": "w1"}, score_update(5)),
+        ({"wallet_address": "w2"}, score_update(7)),
+    ])
+    assert (upserted, errors) == ({1}, {})
+    assert (await store.find_one("leaderboard", {"wallet_address": "w1"}))["score"] == 10
+
+
+async def test_top_k_orders_by_score_then_wallet(store):
+    for wallet, score, difficulty in (("w3", 50, "easy"), ("w1", 50, "hard"), ("w2", 80, "easy"), ("w4", 10, "hard")):
+        await store.upsert_accumulate("leaderboard", {"wallet_address": wallet}, score_update(score, difficulty))
+
+    assert wallets(await store.top_k("leaderboard", "score", 10, PROJECTION)) == [("w2", 80), ("w1", 50), ("w3", 50), ("w4", 10)]
+    assert wallets(await store.top_k("leaderboard", "score", 2, PROJECTION, after=(50, "w1"))) == [("w3", 50), ("w4", 10)]
+    hard = await store.top_k("leaderboard", "scores.hard", 10, {"_id": 0, "wallet_address": 1}, positive_only=True)
+    assert [doc["wallet_address"] for doc in hard] == ["w1", "w4"]
+
+    assert [await store.rank(wallet) for wallet in ("w2", "w1", "w3", "w4")] == [1, 2, 3, 4]
+    assert await store.rank("w3", "scores.hard") == 4  # Missing per-difficulty totals count as 0 (ties by wallet)
+    assert await store.rank("nobody") is None
+    assert await store.stats() == {"players": 4, "games": 4, "score": 190}
+
+
+async def test_windows_are_read_per_bucket(store):
+    for window_id, wallet, score in (("daily:a", "w1", 5), ("daily:a", "w2", 9), ("daily:b", "w1", 100)):
+        await store.upsert_accumulate(
+            "windows", {"window_id": window_id, "wallet_address": wallet}, {"$inc": {"score": score}}
+        )
+    docs = await store.top_k("windows", "score", 10, PROJECTION, match={"window_id": "daily:a"})
+    assert wallets(docs) == [("w2", 9), ("w1", 5)]
+
+
+async def test_scan_since_keeps_rank_order(store):
+    now = datetime.utcnow()
+    for wallet, score, age in (("w1", 10, 0), ("w2", 30, 10), ("w3", 20, 0)):
+        await store.upsert_accumulate("leaderboard", {"wallet_address": wallet}, score_update(score, played_at=now - timedelta(days=age)))
+
+    assert wallets([doc async for doc in store.scan("leaderboard", PROJECTION, batch_size=2)]) == [("w2", 30), ("w3", 20), ("w1", 10)]
+    recent = [doc async for doc in store.scan("leaderboard", PROJECTION, since=now - timedelta(days=1))]
+    assert wallets(recent) == [("w3", 20), ("w1", 10)]
+
+
+async def test_runs_page_newest_first(store):
+    start = datetime.utcnow() - timedelta(hours=1)  # Within the runs retention
+    await store.insert_runs([
+        {"run_id": f"r{n}", "wallet_address": "w1", "played_at": start + timedelta(minutes=n), "score": n} for n in range(5)
+    ] + [{"run_id": "x", "wallet_address": "w2", "played_at": start, "score": 1}])
+
+    first = await store.find_runs("w1", 2)
+    assert [run["run_id"] for run in first] == ["r4", "r3"]
+    rest = await store.find_runs("w1", 10, before=(first[-1]["played_at"], first[-1]["run_id"]))
+    assert [run["run_id"] for run in rest] == ["r2", "r1", "r0"]
+    columns = [batch async for batch in store.scan_runs(["wallet_address", "score"], since=start + timedelta(minutes=3))]
+    assert sorted(score for batch in columns for score in batch["score"]) == [3, 4]
+
+
+async def test_archived_season_rejects_writes_but_stays_readable(store):
+    await store.upsert_accumulate("leaderboard", {"wallet_address": "w1"}, score_update(10))
+    await store.archive_season(1)
+
+    with pytest.raises(SeasonArchived):
+        await store.upsert_accumulate("season:1", {"wallet_address": "w1"}, score_update(5))
+    with pytest.raises(SeasonArchived):
+        await store.upsert_accumulate("season:1", {"wallet_address": "w2"}, score_update(5))
+    _, errors = await store.bulk_upsert("season:1", [({"wallet_address": "w1"}, score_update(5))])
+    assert isinstance(errors[0], SeasonArchived)
+    assert (await store.find_one("season:1", {"wallet_address": "w1"}))["score"] == 10
+
+    await store.unarchive_season(1)
+    await store.upsert_accumulate("season:1", {"wallet_address": "w1"}, score_update(5))
+    assert (await store.find_one("season:1", {"wallet_address": "w1"}))["score"] == 15
+
+
+async def test_seasons_switch_once_and_keep_their_own_tables(store):
+    now = datetime.utcnow()
+    await store.load_seasons()
+    await store.upsert_accumulate("leaderboard", {"wallet_address": "w1"}, score_update(10))
+    await store.prepare_season(2)
+    assert await store.switch_season(1, 2, "archived", now) is True
+    assert await store.switch_season(1, 2, "archived", now) is False  # Compare-and-set: someone else switched
+    store.activate_season(2)
+
+    await store.upsert_accumulate("leaderboard", {"wallet_address": "w1"}, score_update(3))
+    assert (await store.find_one("leaderboard", {"wallet_address": "w1"}))["score"] == 3
+    assert (await store.find_one("season:1", {"wallet_address": "w1"}))["score"] == 10
+    seasons = await store.load_seasons()
+    assert (seasons["current"], seasons["seasons"]["1"]["status"], seasons["seasons"]["2"]["status"]) == (2, "archived", "active")
+
+    await store.drop_season(1)
+    assert (await store.load_seasons())["seasons"]["1"]["status"] == "dropped"
+
+
+async def test_reset_empties_the_active_season(store):
+    await store.upsert_accumulate("leaderboard", {"wallet_address": "w1"}, score_update(10))
+    await store.upsert_accumulate("windows", {"window_id": "daily:a", "wallet_address": "w1"}, {"$inc": {"score": 10}})
+    assert await store.reset() == 1
+    assert await store.find_one("leaderboard", {"wallet_address": "w1"}) is None
+    assert await store.top_k("windows", "score", 10, match={"window_id": "daily:a"}) == []
+    assert await store.upsert_accumulate("leaderboard", {"wallet_address": "w1"}, score_update(1)) is True
+
+
+async def test_sqlite_runs_in_wal_mode_and_migrates_once(tmp_path):
+    path = str(tmp_path / "leaderboard.db")
+    store = create_storage("sqlite", sqlite_path=path)
+    assert await store.setup() == [SCHEMA_VERSION]
+    await store.upsert_accumulate("leaderboard", {"wallet_address": "w1"}, score_update(10))
+    await store.close()
+
+    reopened = create_storage("sqlite", sqlite_path=path)
+    assert await reopened.setup() == []  # Already at SCHEMA_VERSION
+    assert (await reopened.find_one("leaderboard", {"wallet_address": "w1"}))["score"] == 10
+    await reopened.close()
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"leaderboard_rank", "leaderboard_rank_hard", "windows_rank", "runs_wallet"} <= indexes
+    finally:
+        conn.close()
+
+
+async def test_sqlite_archive_is_an_insert_trigger(tmp_path):
+    path = str(tmp_path / "leaderboard.db")
+    store = create_storage("sqlite", sqlite_path=path)
+    await store.archive_season(1)
+    conn = sqlite3.connect(path)
+    try:
+        triggers = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")]
+        assert triggers == ["leaderboard_archived"]
+        with pytest.raises(sqlite3.IntegrityError, match="season archived"):
+            conn.execute("INSERT INTO leaderboard (key, doc) VALUES ('k', '{}')")
+    finally:
+        conn.close()
+    await store.unarchive_season(1)
+    assert await store.upsert_accumulate("leaderboard", {"wallet_address": "w1"}, score_update(1)) is True
+    await store.close()
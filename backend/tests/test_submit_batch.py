@@ -0,0 +1,63 @@
+import pytest
+
+import server
+
+from conftest import make_entry, make_wallet
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_batch_reports_one_result_per_entry_in_order(client):
+    wallet, other = make_wallet(), make_wallet()
+    entries = [
+        make_entry(wallet, 100),
+        make_entry(wallet, 50, "hard"),
+        make_entry(other, 10),
+        make_entry(other, -5),
+        {"wallet_address": other},
+        make_entry(other, 10, "nightmare"),
+    ]
+    response = await client.post("/api/leaderboard/submit-batch", json={"entries": entries})
+    body = response.json()
+
+    assert response.status_code == 200
+    assert (body["accepted"], body["queued"], body["rejected"]) == (3, 0, 3)
+    assert [result["index"] for result in body["results"]] == list(range(len(entries)))
+    assert [result["status"] for result in body["results"]] == ["accepted"] * 3 + ["invalid"] * 3
+    assert body["results"][3]["detail"].startswith("score:")
+    assert body["results"][5]["detail"].startswith("difficulty:")
+
+
+async def test_runs_of_one_wallet_accumulate_like_single_submissions(client):
+    wallet = make_wallet()
+    await client.post("/api/leaderboard/submit-batch", json={"entries": [
+        make_entry(wallet, 100), make_entry(wallet, 50, "hard"), make_entry(wallet, 25)
+    ]})
+
+    rank = (await client.get(f"/api/leaderboard/rank/{wallet}")).json()
+    assert rank["score"] == 175
+    profile = (await client.get(f"/api/player/{wallet}")).json()["player"]
+    assert profile["total_games"] == 3
+    assert {difficulty: row["score"] for difficulty, row in profile["difficulties"].items()} == {"easy": 125, "hard": 50, "cursed": 0}
+    stats = (await client.get("/api/stats")).json()["stats"]
+    assert (stats["total_scores"], stats["unique_players"], stats["total_games"]) == (1, 1, 3)
+
+
+async def test_rate_limit_counts_every_run(client):
+    wallet = make_wallet()
+    limit = server.RATE_LIMIT_MAX_REQUESTS
+    response = await client.post("/api/leaderboard/submit-batch", json={
+        "entries": [make_entry(wallet, 1) for _ in range(limit + 2)]
+    })
+    statuses = [result["status"] for result in response.json()["results"]]
+    assert statuses == ["accepted"] * limit + ["rate_limited"] * 2
+    assert (await client.get(f"/api/leaderboard/rank/{wallet}")).json()["score"] == limit
+    assert (await client.post("/api/leaderboard/submit", json=make_entry(wallet, 1))).status_code == 429
+
+
+async def test_batch_size_is_bounded(client):
+    response = await client.post("/api/leaderboard/submit-batch", json={
+        "entries": [make_entry(make_wallet(), 1) for _ in range(server.SUBMIT_BATCH_MAX + 1)]
+    })
+    assert response.status_code == 422
+    assert (await client.post("/api/leaderboard/submit-batch", json={"entries": []})).status_code == 422
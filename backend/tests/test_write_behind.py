@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from server import LeaderboardEntry, RunHistoryWriter, WriteBehindBatcher, build_score_update
+from storage import SeasonArchived, create_storage
+
+from conftest import make_entry, make_wallet
+
+pytestmark = pytest.mark.anyio
+
+
+def score_update(wallet_address: str, score: int, difficulty: str = "easy") -> dict:
+    entry = LeaderboardEntry(**make_entry(wallet_address, score, difficulty))
+    return build_score_update(entry, datetime.utcnow(), "10.0.0.1")
+
+
+async def test_submissions_for_one_wallet_merge_into_one_operation():
+    store = create_storage("memory")
+    batcher = WriteBehindBatcher(store, "leaderboard", max_batch=100, max_delay_ms=5)
+    wallet, other = make_wallet(), make_wallet()
+
+    created = await asyncio.gather(
+        batcher.submit(wallet, {"wallet_address": wallet}, score_update(wallet, 10)),
+        batcher.submit(wallet, {"wallet_address": wallet}, score_update(wallet, 20, "hard")),
+        batcher.submit(other, {"wallet_address": other}, score_update(other, 5)),
+    )
+
+    assert created == [True, False, True]
+    assert batcher.stats["flushes"] == 1
+    assert batcher.stats["operations_written"] == 2
+    doc = await store.find_one("leaderboard", {"wallet_address": wallet})
+    assert (doc["score"], doc["total_games"], doc["scores"], doc["last_difficulty"]) == (30, 2, {"easy": 10, "hard": 20}, "hard")
+
+
+async def test_full_batch_flushes_without_waiting_for_the_timer():
+    store = create_storage("memory")
+    batcher = WriteBehindBatcher(store, "leaderboard", max_batch=2, max_delay_ms=60000)
+    wallets = [make_wallet(), make_wallet()]
+
+    await asyncio.wait_for(
+        asyncio.gather(*(batcher.submit(w, {"wallet_address": w}, score_update(w, 1)) for w in wallets)), timeout=1
+    )
+    assert batcher.stats["last_batch_size"] == 2
+
+
+async def test_failed_operation_fails_every_merged_submission():
+    store = create_storage("memory")
+    await store.archive_season(store.active_season)
+    batcher = WriteBehindBatcher(store, "leaderboard", max_batch=100, max_delay_ms=5)
+    wallet = make_wallet()
+
+    results = await asyncio.gather(
+        batcher.submit(wallet, {"wallet_address": wallet}, score_update(wallet, 10)),
+        batcher.submit(wallet, {"wallet_address": wallet}, score_update(wallet, 20)),
+        return_exceptions=True
+    )
+    assert all(isinstance(result, SeasonArchived) for result in results)
+    assert batcher.stats["failed_operations"] == 1
+
+
+async def test_close_flushes_pending_submissions():
+    store = create_storage("memory")
+    batcher = WriteBehindBatcher(store, "leaderboard", max_batch=100, max_delay_ms=60000)
+    wallet = make_wallet()
+
+    submission = asyncio.ensure_future(batcher.submit(wallet, {"wallet_address": wallet}, score_update(wallet, 7)))
+    await asyncio.sleep(0)
+    await batcher.close()
+    assert await submission is True
+    assert (await store.find_one("leaderboard", {"wallet_address": wallet}))["score"] == 7
+
+
+class SlowRunStore:
+    """insert_runs blocks until released, failing the first call if asked to"""
+
+    def __init__(self, fail_first: bool = False):
+        self.inserting = asyncio.Event()
+        self.release = asyncio.Event()
+        self.fail_first = fail_first
+        self.runs = []
+
+    async def insert_runs(self, batch):
+        self.inserting.set()
+        await self.release.wait()
+        if self.fail_first:
+            self.fail_first = False
+            raise ConnectionError("store down")
+        self.runs.extend(batch)
+        return 0
+
+
+@pytest.mark.parametrize("fail_first", [False, True])
+async def test_run_history_close_finishes_the_batch_in_flight(fail_first):
+    store = SlowRunStore(fail_first)
+    writer = RunHistoryWriter(store, batch_size=2, flush_interval=60, max_buffer=100)
+    writer.start()
+    for n in range(3):
+        writer.add({"n": n})
+    await store.inserting.wait()  # The loop is mid-insert with the first batch
+
+    closing = asyncio.ensure_future(writer.close())
+    await asyncio.sleep(0)
+    store.release.set()
+    await closing
+    assert sorted(run["n"] for run in store.runs) == [0, 1, 2]
+    assert writer.snapshot()["buffered"] == 0
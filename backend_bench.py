@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Load-testing and benchmark suite for the Degen Force Leaderboard API
+Drives the FastAPI app in-process over ASGI (no server, no MongoDB needed with
+STORAGE_ENGINE=memory) or a running server over a local socket, using named
+workload mixes. Reports req/s and p50/p95/p99 latency per endpoint as JSON so
+runs can be compared between commits.
+
+Examples:
+    python backend_bench.py                                   # all workloads, in-process, memory engine
+    python backend_bench.py --workload polling-storm --engine sqlite      # in a temporary database
+    python backend_bench.py --engine sqlite --db-path /tmp/bench.db     # keep the database for inspection
+    python backend_bench.py --mode socket --url http://localhost:8001 --output bench.json
+    python backend_bench.py --output new.json --compare old.json
+    python backend_bench.py --workload polling-storm > bench.json       # progress and summary go to stderr
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+DIFFICULTIES = ("easy", "hard", "cursed")
+BIOMES = ("Jungle", "Desert", "Tundra", "Volcano", "Void")
+
+# Named workload mixes: weighted request kinds plus how wallets are chosen
+WORKLOADS = {
+    "end-of-round-burst": {
+        "description": "A round ends: most of the player base submits at once while some refresh the board",
+        "mix": {"submit": 80, "leaderboard": 15, "rank": 5},
+        "wallets": "existing"
+    },
+    "polling-storm": {
+        "description": "Leaderboard polling storm: clients refresh the board (some with ETags), few writes",
+        "mix": {"leaderboard": 70, "leaderboard_etag": 15, "leaderboard_difficulty": 10, "submit": 5},
+        "wallets": "existing"
+    },
+    "many-new-wallets": {
+        "description": "Acquisition spike: every submission comes from a never-seen wallet",
+        "mix": {"submit": 90, "leaderboard": 10},
+        "wallets": "new"
+    },
+    "hot-wallet-contention": {
+        "description": "A handful of wallets submit concurrently (same-document write contention)",
+        "mix": {"submit": 85, "rank": 15},
+        "wallets": "hot"
+    }
+}
+HOT_WALLETS = 5
+
+
+def make_wallet(rng: random.Random) -> str:
+    return "Bench" + "".join(rng.choices(string.ascii_letters + string.digits, k=39))
+
+
+def make_entry(rng: random.Random, wallet_address: str) -> dict:
+    return {
+        "wallet_address": wallet_address,
+        "score": rng.randint(0, 5000),
+        "survival_time_seconds": rng.randint(10, 900),
+        "enemies_killed": rng.randint(0, 500),
+        "biome_reached": rng.choice(BIOMES),
+        "difficulty": rng.choice(DIFFICULTIES)
+    }
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class WorkloadRunner:
+    """Runs one workload with a fixed number of concurrent clients and records
+    per-endpoint latencies and status codes"""
+
+    def __init__(self, client: httpx.AsyncClient, name: str, seed_wallets, rng: random.Random):
+        self.client = client
+        self.name = name
+        self.workload = WORKLOADS[name]
+        self.seed_wallets = seed_wallets
+        self.hot_wallets = seed_wallets[:HOT_WALLETS]
+        self.rng = rng
+        self.etags = {}
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        kinds = self.workload["mix"]
+        self.kinds = list(kinds)
+        self.weights = [kinds[kind] for kind in self.kinds]
+
+    def pick_wallet(self) -> str:
+        mode = self.workload["wallets"]
+        if mode == "new":
+            return make_wallet(self.rng)
+        if mode == "hot":
+            return self.rng.choice(self.hot_wallets)
+        return self.rng.choice(self.seed_wallets)
+
+    def build_request(self):
+        """Return (endpoint label, method, url, kwargs)"""
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == "submit":
+            entry = make_entry(self.rng, self.pick_wallet())
+            return "POST /api/leaderboard/submit", "POST", "/api/leaderboard/submit", {"json": entry}
+        if kind == "rank":
+            wallet_address = self.pick_wallet()
+            return "GET /api/leaderboard/rank", "GET", f"/api/leaderboard/rank/{wallet_address}", {}
+        if kind == "leaderboard_difficulty":
+            difficulty = self.rng.choice(DIFFICULTIES)
+            return "GET /api/leaderboard?difficulty", "GET", f"/api/leaderboard?limit=100&difficulty={difficulty}", {}
+        limit = self.rng.choice((10, 100))
+        url = f"/api/leaderboard?limit={limit}"
+        if kind == "leaderboard_etag":
+            headers = {"If-None-Match": self.etags[url]} if url in self.etags else {}
+            return "GET /api/leaderboard (etag)", "GET", url, {"headers": headers}
+        return "GET /api/leaderboard", "GET", url, {}
+
+    async def worker(self, deadline: float, budget: list):
+        while budget[0] > 0 and time.perf_counter() < deadline:
+            budget[0] -= 1
+            label, method, url, kwargs = self.build_request()
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                status = str(response.status_code)
+                etag = response.headers.get("etag")
+                if etag:
+                    self.etags[url] = etag
+            except Exception as e:
+                status = type(e).__name__
+            self.latencies[label].append(time.perf_counter() - started)
+            self.statuses[label][status] += 1
+
+    async def run(self, concurrency: int, requests: int, duration: float) -> dict:
+        budget = [requests]
+        started = time.perf_counter()
+        deadline = started + duration if duration else float("inf")
+        await asyncio.gather(*[self.worker(deadline, budget) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        total = 0
+        errors = 0
+        for label, samples in sorted(self.latencies.items()):
+            samples.sort()
+            total += len(samples)
+            statuses = dict(self.statuses[label])
+            errors += sum(count for status, count in statuses.items() if not status.isdigit() or status.startswith("5"))
+            endpoints[label] = {
+                "count": len(samples),
+                "rps": round(len(samples) / elapsed, 1),
+                "p50_ms": round(percentile(samples, 50) * 1000, 3),
+                "p95_ms": round(percentile(samples, 95) * 1000, 3),
+                "p99_ms": round(percentile(samples, 99) * 1000, 3),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+                "max_ms": round(samples[-1] * 1000, 3),
+                "status": statuses
+            }
+        return {
+            "description": self.workload["description"],
+            "duration_s": round(elapsed, 3),
+            "requests": total,
+            "rps": round(total / elapsed, 1) if elapsed else 0.0,
+            "errors": errors,
+            "endpoints": endpoints
+        }
+
+
+@asynccontextmanager
+async def open_client(args):
+    """Yield an httpx client bound to the in-process app (ASGI) or a live server (socket)"""
+    if args.mode == "socket":
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+            yield client
+        return
+
+    os.environ.setdefault("STORAGE_ENGINE", args.engine)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")  # Keep per-request log lines out of the results
+    with tempfile.TemporaryDirectory(prefix="degen-bench-") as scratch:
+        # A fresh SQLite database per run, removed afterwards, unless --db-path (or SQLITE_PATH) names one
+        os.environ.setdefault("SQLITE_PATH", args.db_path or os.path.join(scratch, "leaderboard.db"))
+        sys.path.insert(0, BACKEND_DIR)
+        import server
+
+        if not args.keep_rate_limit:
+            # Measure the request path, not the limiters' 429s (every in-process request comes from one IP)
+            for limiter in (server.rate_limit_store, server.ip_rate_limit_store):
+                if limiter is not None:
+                    limiter.limit = 10 ** 9
+        transport = httpx.ASGITransport(app=server.app)
+        async with server.app.router.lifespan_context(server.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30) as client:
+                yield client
+
+
+async def seed_leaderboard(client: httpx.AsyncClient, wallets, rng: random.Random, concurrency: int):
+    """Give every seed wallet one submission so reads and ranks have data"""
+    queue = list(wallets)
+
+    async def worker():
+        while queue:
+            wallet_address = queue.pop()
+            await client.post("/api/leaderboard/submit", json=make_entry(rng, wallet_address))
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def print_summary(results: dict):
+    """Human-readable results on stderr (stdout carries only the JSON)"""
+    for name, result in results["workloads"].items():
+        print(f"\n📊 {name}: {result['rps']} req/s, {result['requests']} requests, {result['errors']} errors", file=sys.stderr)
+        for label, stats in result["endpoints"].items():
+            print(f"   {label:32} {stats['rps']:>9} req/s  p50 {stats['p50_ms']:>8} ms  "
+                  f"p95 {stats['p95_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  {stats['status']}", file=sys.stderr)
+
+
+def print_comparison(results: dict, baseline: dict):
+    """Print per-endpoint throughput and p99 changes against a previous run"""
+    print(f"\n🔍 Compared with {baseline['meta'].get('commit', '?')} ({baseline['meta'].get('timestamp', '?')})", file=sys.stderr)
+    for name, result in results["workloads"].items():
+        before = baseline.get("workloads", {}).get(name)
+        if not before:
+            continue
+        for label, stats in result["endpoints"].items():
+            old = before["endpoints"].get(label)
+            if not old or not old["rps"] or not old["p99_ms"]:
+                continue
+            rps_change = (stats["rps"] - old["rps"]) / old["rps"] * 100
+            p99_change = (stats["p99_ms"] - old["p99_ms"]) / old["p99_ms"] * 100
+            print(f"   {name:22} {label:32} req/s {rps_change:+7.1f}%  p99 {p99_change:+7.1f}%", file=sys.stderr)
+
+
+async def main(args) -> dict:
+    rng = random.Random(args.seed)
+    names = list(WORKLOADS) if args.workload == "all" else [args.workload]
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "commit": git_commit(),
+            "mode": args.mode,
+            "engine": args.engine if args.mode == "asgi" else None,
+            "url": args.url if args.mode == "socket" else None,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "duration": args.duration,
+            "seed_wallets": args.wallets,
+            "seed": args.seed,
+            "python": platform.python_version()
+        },
+        "workloads": {}
+    }
+
+    async with open_client(args) as client:
+        wallets = [make_wallet(rng) for _ in range(args.wallets)]
+        print(f"🌱 Seeding {len(wallets)} wallets ({args.mode})...", file=sys.stderr)
+        await seed_leaderboard(client, wallets, rng, args.concurrency)
+        for name in names:
+            print(f"🚀 Running {name}...", file=sys.stderr)
+            runner = WorkloadRunner(client, name, wallets, rng)
+            results["workloads"][name] = await runner.run(args.concurrency, args.requests, args.duration)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Degen Force leaderboard API")
+    parser.add_argument("--mode", choices=("asgi", "socket"), default="asgi",
+                        help="asgi: drive the app in-process; socket: hit a running server")
+    parser.add_argument("--url", default="http://localhost:8001", help="Server URL for --mode socket")
+    parser.add_argument("--engine", choices=("memory", "sqlite", "mongo"), default="memory",
+                        help="Storage engine for --mode asgi (STORAGE_ENGINE overrides)")
+    parser.add_argument("--db-path", help="SQLite database for --engine sqlite, kept after the run "
+                                          "(default: a temporary one; SQLITE_PATH overrides)")
+    parser.add_argument("--workload", choices=("all", *WORKLOADS), default="all")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per workload")
+    parser.add_argument("--duration", type=float, default=0, help="Stop a workload after N seconds (0: no limit)")
+    parser.add_argument("--wallets", type=int, default=1000, help="Wallets seeded before the workloads run")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for reproducible request streams")
+    parser.add_argument("--keep-rate-limit", action="store_true",
+                        help="Keep the per-wallet and per-IP submission limits in --mode asgi")
+    parser.add_argument("--output", help="Write the JSON results to this file (default: stdout)")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+    print_summary(results)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(results, indent=2))
@@ -25,7 +25,11 @@ class LeaderboardTester:
             "input_validation": {"passed": 0, "failed": 0, "details": []},
             "concurrent_load": {"passed": 0, "failed": 0, "details": []},
             "performance": {"passed": 0, "failed": 0, "details": []},
-            "stats_endpoint": {"passed": 0, "failed": 0, "details": []}
+            "stats_endpoint": {"passed": 0, "failed": 0, "details": []},
+            "rank_lookup": {"passed": 0, "failed": 0, "details": []},
+            "batch_submission": {"passed": 0, "failed": 0, "details": []},
+            "seasons": {"passed": 0, "failed": 0, "details": []},
+            "anomalies": {"passed": 0, "failed": 0, "details": []}
         }
         
     def log_result(self, category, passed, message):
@@ -185,6 +189,33 @@ class LeaderboardTester:
         except Exception as e:
             self.log_result("caching", False, f"Caching test failed: {str(e)}")
     
+    def test_etag_revalidation(self):
+        """Test 3b: ETag / If-None-Match revalidation of the leaderboard"""
+        print("\n🔍 Testing ETag Revalidation...")
+        
+        try:
+            response = requests.get(f"{API_URL}/leaderboard", timeout=10)
+            etag = response.headers.get("ETag")
+            self.log_result("caching", response.status_code == 200 and bool(etag),
+                          f"Leaderboard ETag: {etag}")
+            if not etag:
+                return
+            
+            response = requests.get(f"{API_URL}/leaderboard", headers={"If-None-Match": etag}, timeout=10)
+            self.log_result("caching", response.status_code == 304 and not response.content,
+                          f"Unchanged leaderboard revalidated: {response.status_code}")
+            
+            response = requests.get(f"{API_URL}/leaderboard", headers={"If-None-Match": 'W/"stale"'}, timeout=10)
+            self.log_result("caching", response.status_code == 200,
+                          f"Stale ETag gets the full body: {response.status_code}")
+            
+            response = requests.get(f"{API_URL}/leaderboard", headers={"Accept-Encoding": "gzip"}, timeout=10)
+            encoding = response.headers.get("Content-Encoding", "identity")
+            self.log_result("caching", response.status_code == 200 and encoding in ("gzip", "identity") and "leaderboard" in response.json(),
+                          f"Compressed leaderboard: {encoding}, {response.headers.get('Content-Length')} bytes")
+        except Exception as e:
+            self.log_result("caching", False, f"ETag test failed: {str(e)}")
+    
     def test_input_validation(self):
         """Test 4: Input validation"""
         print("\n🔍 Testing Input Validation...")
@@ -356,6 +387,163 @@ class LeaderboardTester:
         except Exception as e:
             self.log_result("stats_endpoint", False, f"Stats test failed: {str(e)}")
     
+    def test_admission_control(self):
+        """Test 7b: Admission control state and health checks outside it"""
+        print("\n🔍 Testing Admission Control...")
+        
+        try:
+            response = requests.get(f"{API_URL}/stats", timeout=10)
+            admission = response.json().get("stats", {}).get("admission", {})
+            if admission.get("enabled") is False:
+                self.log_result("performance", True, "Admission control disabled")
+                return
+            self.log_result("performance", all(route in admission for route in ("submit", "leaderboard", "player")),
+                          f"Admission limits: {list(admission.keys())}")
+            shed = sum(limit.get("shed_queue_full", 0) + limit.get("shed_deadline", 0) for limit in admission.values())
+            self.log_result("performance", True, f"Requests shed so far: {shed}")
+            
+            # Health checks are never limited, so they answer even when the API is shedding
+            response = requests.get(f"{API_URL}/health", timeout=5)
+            self.log_result("performance", response.status_code == 200,
+                          f"Health check outside admission control: {response.status_code}")
+        except Exception as e:
+            self.log_result("performance", False, f"Admission control test failed: {str(e)}")
+    
+    def test_journal_state(self):
+        """Test 7c: Store reachability and submission journal"""
+        print("\n🔍 Testing Submission Journal...")
+        
+        try:
+            response = requests.get(f"{API_URL}/stats", timeout=10)
+            journal = response.json().get("stats", {}).get("journal", {})
+            if journal.get("enabled") is False:
+                self.log_result("performance", True, "Submission journal disabled (JOURNAL_DIR not set)")
+                return
+            self.log_result("performance", journal.get("breaker", {}).get("state") == "closed",
+                          f"Store breaker: {journal.get('breaker', {}).get('state')}")
+            self.log_result("performance", journal.get("depth") == 0,
+                          f"Journal drained: depth {journal.get('depth')}, {journal.get('replayed')} replayed")
+        except Exception as e:
+            self.log_result("performance", False, f"Journal test failed: {str(e)}")
+    
+    def test_rank_lookup(self):
+        """Test 8: Wallet rank lookup"""
+        print("\n🔍 Testing Rank Lookup...")
+        
+        wallet_address = f"RankTest{int(time.time() * 1000)}"
+        try:
+            response = requests.post(f"{API_URL}/leaderboard/submit", json={
+                "wallet_address": wallet_address,
+                "score": 4321,
+                "survival_time_seconds": 90,
+                "enemies_killed": 25,
+                "biome_reached": "Test",
+                "difficulty": "hard"
+            }, timeout=10)
+            if response.status_code != 200:
+                self.log_result("rank_lookup", False, f"Rank test submission failed: {response.status_code}")
+                return
+            
+            response = requests.get(f"{API_URL}/leaderboard/rank/{wallet_address}", params={"around": 2}, timeout=10)
+            data = response.json()
+            self.log_result("rank_lookup", response.status_code == 200 and data.get("rank", 0) >= 1,
+                          f"Rank lookup: rank {data.get('rank')} of {data.get('total_players')}")
+            rows = data.get("around", [])
+            self.log_result("rank_lookup", any(row["wallet_address"] == wallet_address for row in rows) and len(rows) <= 5,
+                          f"Rank neighbours: {len(rows)} rows")
+            
+            response = requests.get(f"{API_URL}/leaderboard/rank/{wallet_address}", params={"difficulty": "hard"}, timeout=10)
+            self.log_result("rank_lookup", response.status_code == 200,
+                          f"Per-difficulty rank: {response.json().get('rank')}")
+            
+            response = requests.get(f"{API_URL}/leaderboard/rank/UnknownWallet{int(time.time() * 1000)}", timeout=10)
+            self.log_result("rank_lookup", response.status_code == 404,
+                          f"Unknown wallet rejected: {response.status_code}")
+        except Exception as e:
+            self.log_result("rank_lookup", False, f"Rank lookup test failed: {str(e)}")
+    
+    def test_batch_submission(self):
+        """Test 9: Batch submission with per-entry results"""
+        print("\n🔍 Testing Batch Submission...")
+        
+        wallet_address = f"BatchTest{int(time.time() * 1000)}"
+        run = {
+            "wallet_address": wallet_address,
+            "score": 100,
+            "survival_time_seconds": 60,
+            "enemies_killed": 10,
+            "biome_reached": "Test",
+            "difficulty": "easy"
+        }
+        entries = [run, {**run, "score": 50, "difficulty": "hard"}, {**run, "score": -1}]
+        try:
+            response = requests.post(f"{API_URL}/leaderboard/submit-batch", json={"entries": entries}, timeout=10)
+            if response.status_code != 200:
+                self.log_result("batch_submission", False, f"Batch submission failed: {response.status_code}")
+                return
+            data = response.json()
+            statuses = [result["status"] for result in data.get("results", [])]
+            self.log_result("batch_submission", statuses == ["accepted", "accepted", "invalid"],
+                          f"Per-entry results: {statuses}")
+            self.log_result("batch_submission", (data.get("accepted"), data.get("rejected")) == (2, 1),
+                          f"Batch counts: {data.get('accepted')} accepted, {data.get('rejected')} rejected")
+            
+            response = requests.get(f"{API_URL}/leaderboard/rank/{wallet_address}", timeout=10)
+            self.log_result("batch_submission", response.status_code == 200 and response.json().get("score") == 150,
+                          f"Batch runs accumulated: {response.json().get('score')}")
+        except Exception as e:
+            self.log_result("batch_submission", False, f"Batch submission test failed: {str(e)}")
+    
+    def test_seasons(self):
+        """Test 10: Season history and admin-only season endpoints"""
+        print("\n🔍 Testing Seasons...")
+        
+        try:
+            response = requests.get(f"{API_URL}/seasons", timeout=10)
+            data = response.json()
+            current = data.get("current")
+            self.log_result("seasons", response.status_code == 200 and isinstance(current, int),
+                          f"Season history: current season {current}, {len(data.get('seasons', []))} seasons")
+            
+            response = requests.get(f"{API_URL}/leaderboard", timeout=10)
+            self.log_result("seasons", response.headers.get("X-Leaderboard-Season") == str(current),
+                          f"Leaderboard season header: {response.headers.get('X-Leaderboard-Season')}")
+            
+            # Without the admin key neither a rollover nor a reset may touch the board
+            response = requests.post(f"{API_URL}/admin/season/rollover", timeout=10)
+            self.log_result("seasons", response.status_code == 403,
+                          f"Rollover without admin key rejected: {response.status_code}")
+            response = requests.delete(f"{API_URL}/leaderboard/reset", timeout=10)
+            self.log_result("seasons", response.status_code == 403,
+                          f"Reset without admin key rejected: {response.status_code}")
+        except Exception as e:
+            self.log_result("seasons", False, f"Seasons test failed: {str(e)}")
+    
+    def test_anomaly_review(self):
+        """Test 11: Anomaly review is admin-only and flagged wallets stay off the board"""
+        print("\n🔍 Testing Anomaly Review...")
+        
+        try:
+            response = requests.get(f"{API_URL}/admin/anomalies", timeout=10)
+            self.log_result("anomalies", response.status_code == 403,
+                          f"Review list without admin key rejected: {response.status_code}")
+            response = requests.post(f"{API_URL}/admin/anomalies/scan", timeout=10)
+            self.log_result("anomalies", response.status_code == 403,
+                          f"Scan without admin key rejected: {response.status_code}")
+            
+            response = requests.get(f"{API_URL}/stats", timeout=10)
+            anomalies = response.json().get("stats", {}).get("anomalies", {})
+            self.log_result("anomalies", "exclude" in anomalies,
+                          f"Anomaly state: exclude={anomalies.get('exclude')}, flagged={anomalies.get('flagged_wallets', 0)}")
+            
+            # Ranks on the board must be consecutive: flagged wallets are dropped before ranking
+            response = requests.get(f"{API_URL}/leaderboard", params={"limit": 100}, timeout=10)
+            ranks = [row["rank"] for row in response.json().get("leaderboard", [])]
+            self.log_result("anomalies", ranks == list(range(1, len(ranks) + 1)),
+                          f"Leaderboard ranks consecutive: {len(ranks)} rows")
+        except Exception as e:
+            self.log_result("anomalies", False, f"Anomaly review test failed: {str(e)}")
+    
     def run_all_tests(self):
         """Run comprehensive test suite"""
         print("🚀 Starting Comprehensive Leaderboard Testing...")
@@ -368,10 +556,17 @@ class LeaderboardTester:
         self.test_wallet_validation()
         self.test_rate_limiting()
         self.test_caching_system()
+        self.test_etag_revalidation()
         self.test_input_validation()
         self.test_concurrent_submissions()
         self.test_leaderboard_performance()
         self.test_stats_endpoint()
+        self.test_admission_control()
+        self.test_journal_state()
+        self.test_rank_lookup()
+        self.test_batch_submission()
+        self.test_seasons()
+        self.test_anomaly_review()
         
         total_time = time.time() - start_time
         